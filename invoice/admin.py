@@ -5,3 +5,7 @@ admin.site.register(Client)
 admin.site.register(Product)
 admin.site.register(Invoice)
 admin.site.register(Settings)
+admin.site.register(OutboundEmail)
+admin.site.register(StatCounter)
+admin.site.register(InvoiceSequence)
+admin.site.register(SearchDocument)
@@ -0,0 +1,319 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Subquery
+from django.db.models.fields.files import FieldFile
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from django_countries.fields import Country
+
+from .filters import filter_invoices
+from .models import Client, Invoice, Product
+from .pagination import InvalidCursor, KeysetPaginator
+from .totals import TOTAL_FIELDS
+
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Resource:
+    """
+    How one model is exposed by the API.
+
+    ``fields`` are the model's own columns; ``related`` maps a name to a
+    foreign key and the columns of the row it points to, which are
+    serialized as a nested object; ``embeds`` maps a name to the Resource
+    of child rows and their foreign key back to this model, shown with
+    ``?include=<name>``. ``versioned`` are columns that can change without
+    ``last_updated`` moving, which the validators therefore include.
+    """
+
+    def __init__(self, model, fields, related=None, embeds=None, filter=None, versioned=()):
+        self.model = model
+        self.fields = list(fields)
+        self.related = related or {}
+        self.embeds = embeds or {}
+        self.filter = filter
+        self.versioned = list(versioned)
+
+    def selected_fields(self, value):
+        """The names asked for with ``?fields=a,b`` (all by default); the slug is always included."""
+        if not value:
+            return self.fields + list(self.related)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields and name not in self.related]
+        if unknown:
+            raise ApiError('Unknown field(s): {}; choose from {}'.format(
+                ', '.join(unknown), ', '.join(self.fields + list(self.related))))
+        return ['slug'] + [name for name in names if name != 'slug']
+
+    def selected_embeds(self, value):
+        names = [name.strip() for name in (value or '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.embeds]
+        if unknown:
+            raise ApiError('Cannot include {}; choose from {}'.format(
+                ', '.join(unknown), ', '.join(self.embeds) or 'nothing'))
+        return names
+
+    def _keys(self):
+        # foreign keys stay loaded: Product's post_init handler reads invoice_id,
+        # which would cost a query per row if it were deferred
+        return ['id'] + [fk for fk, _fields in self.related.values()]
+
+    def versions(self, queryset, fields, embeds):
+        """
+        ``queryset`` reduced to what the response's validators are computed
+        from: the primary key, the ``versioned`` columns and the last_updated
+        stamps of every row the response would show. Embedded rows add their count, so that
+        deleting one changes the validator too.
+        """
+        annotations = {}
+        for name in fields:
+            if name in self.related:
+                annotations[f'{name}_stamp'] = F(f'{self.related[name][0]}__last_updated')
+        for name in embeds:
+            child, fk = self.embeds[name]
+            rows = child.model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk)
+            annotations[f'{name}_stamp'] = Subquery(rows.annotate(stamp=Max('last_updated')).values('stamp'))
+            annotations[f'{name}_count'] = Subquery(rows.annotate(count=Count('id')).values('count'))
+        return queryset.only(*self._keys(), 'last_updated', *self.versioned).annotate(**annotations)
+
+    def fetch(self, ids, fields, embeds):
+        """The rows ``ids``, in that order, loaded with only the columns the response shows."""
+        columns = self._keys() + [name for name in fields if name in self.fields]
+        queryset = self.model.objects.filter(pk__in=ids)
+        for name in fields:
+            if name in self.related:
+                fk, related_fields = self.related[name]
+                queryset = queryset.select_related(fk)
+                columns += [f'{fk}__{field}' for field in related_fields]
+        for name in embeds:
+            child, fk = self.embeds[name]
+            children = child.model.objects.only(*child.fields, fk).order_by('id')
+            queryset = queryset.prefetch_related(Prefetch(f'{child.model._meta.model_name}_set', queryset=children))
+        rows = {obj.pk: obj for obj in queryset.only(*columns)}
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def serialize(self, obj, fields, embeds=()):
+        data = {}
+        for name in fields:
+            if name in self.related:
+                fk, related_fields = self.related[name]
+                related = getattr(obj, fk)
+                data[name] = None if related is None else {field: _value(related, field) for field in related_fields}
+            else:
+                data[name] = _value(obj, name)
+        for name in embeds:
+            child, _fk = self.embeds[name]
+            data[name] = [child.serialize(row, child.fields)
+                          for row in getattr(obj, f'{child.model._meta.model_name}_set').all()]
+        return data
+
+
+# --- helper: JSON-ready values ---
+def _value(obj, name):
+    value = getattr(obj, name)
+    if isinstance(value, FieldFile):
+        return value.url if value else None
+    if isinstance(value, Country):
+        return value.code or None
+    return value
+
+
+# --- helper: filters per resource; bad values raise ApiError ---
+def _filter_invoices(queryset, params):
+    try:
+        return filter_invoices(
+            queryset,
+            status=params.getlist('status'),
+            due_from=params.get('due_from'),
+            due_to=params.get('due_to'),
+            created_from=params.get('created_from'),
+            created_to=params.get('created_to'),
+            client=params.get('client'),
+        )
+    except ValidationError:
+        raise ApiError('Dates must be given as YYYY-MM-DD')
+
+
+def _filter_clients(queryset, params):
+    if params.get('country'):
+        queryset = queryset.filter(country=params['country'].upper())
+    if params.get('email'):
+        queryset = queryset.filter(emailAddress__iexact=params['email'])
+    return queryset
+
+
+def _filter_products(queryset, params):
+    if params.get('invoice'):
+        queryset = queryset.filter(invoice__slug=params['invoice'])
+    if params.get('currency'):
+        queryset = queryset.filter(currency=params['currency'].upper())
+    return queryset
+
+
+PRODUCTS = Resource(
+    Product,
+    ['slug', 'title', 'description', 'quantity', 'price', 'currency', 'date_created', 'last_updated'],
+    related={'invoice': ('invoice', ['slug', 'number'])},
+    filter=_filter_products,
+)
+
+CLIENTS = Resource(
+    Client,
+    ['slug', 'clientName', 'addressLine1', 'country', 'state_or_province', 'postalCode', 'phoneNumber',
+     'emailAddress', 'taxNumber', 'clientLogo', 'date_created', 'last_updated'],
+    filter=_filter_clients,
+)
+
+INVOICES = Resource(
+    Invoice,
+    ['slug', 'number', 'title', 'status', 'dueDate', 'paymentTerms', 'notes', 'currency', 'subtotal', 'total',
+     'line_count', 'date_created', 'last_updated'],
+    related={'client': ('client', ['slug', 'clientName', 'emailAddress'])},
+    embeds={'products': (PRODUCTS, 'invoice')},
+    filter=_filter_invoices,
+    # kept by totals.recalculate_invoice_totals, which leaves last_updated alone
+    versioned=TOTAL_FIELDS,
+)
+
+
+# --- helper: responses ---
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    """login_required for API views: a 401 in JSON instead of a redirect to the login page."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _validators(request, rows, names):
+    """(ETag, Last-Modified timestamp) of a response showing ``rows``, from their versions alone."""
+    versions = [[row.pk] + [getattr(row, name) for name in names] for row in rows]
+    key = json.dumps([request.get_full_path(), versions], default=str, separators=(',', ':'))
+    etag = '"{}"'.format(hashlib.sha1(key.encode()).hexdigest())
+    stamps = [value for version in versions for value in version[1:] if hasattr(value, 'timestamp')]
+    return etag, int(max(stamps).timestamp()) if stamps else None
+
+
+def _respond(request, resource, single=False, **lookup):
+    """
+    A list (keyset-paginated, newest first) or single-row response for
+    ``resource``, in a fixed number of queries whatever the page size: one
+    for the rows' versions, then, unless the client's copy is current (304),
+    one for the rows and one per embedded relation.
+
+    Last-Modified does not move when a row is deleted, so clients should
+    revalidate with the ETag.
+    """
+    params = request.GET
+    try:
+        fields = resource.selected_fields(params.get('fields'))
+        embeds = resource.selected_embeds(params.get('include'))
+        queryset = resource.model.objects.filter(**lookup)
+        if not single and resource.filter:
+            queryset = resource.filter(queryset, params)
+        versions = resource.versions(queryset, fields, embeds)
+        page = None
+        if single:
+            rows = list(versions[:1])
+            if not rows:
+                raise ApiError('Not found', status=404)
+        else:
+            try:
+                limit = int(params.get('limit') or API_PAGE_SIZE)
+            except ValueError:
+                limit = 0
+            if not 1 <= limit <= API_MAX_PAGE_SIZE:
+                raise ApiError(f'limit must be between 1 and {API_MAX_PAGE_SIZE}')
+            try:
+                page = KeysetPaginator(versions, ordering=('-id',), per_page=limit).page(params.get('cursor'))
+            except InvalidCursor:
+                raise ApiError('Invalid cursor')
+            rows = page.object_list
+    except ApiError as e:
+        return _error(str(e), status=e.status)
+
+    stamp_names = ['last_updated'] + resource.versioned + [name for name in versions.query.annotations]
+    etag, last_modified = _validators(request, rows, stamp_names)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+
+    objects = resource.fetch([row.pk for row in rows], fields, embeds) if rows else []
+    data = [resource.serialize(obj, fields, embeds) for obj in objects]
+    if single:
+        payload = {'data': data[0]}
+    else:
+        payload = {'data': data, 'next': _page_url(request, page.next_cursor),
+                   'previous': _page_url(request, page.previous_cursor)}
+
+    response = JsonResponse(payload)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return '{}?{}'.format(request.path, params.urlencode())
+
+
+# --- views ---
+@require_GET
+@api_login_required
+def invoiceList(request):
+    return _respond(request, INVOICES)
+
+
+@require_GET
+@api_login_required
+def invoiceDetail(request, slug):
+    return _respond(request, INVOICES, single=True, slug=slug)
+
+
+@require_GET
+@api_login_required
+def clientList(request):
+    return _respond(request, CLIENTS)
+
+
+@require_GET
+@api_login_required
+def clientDetail(request, slug):
+    return _respond(request, CLIENTS, single=True, slug=slug)
+
+
+@require_GET
+@api_login_required
+def productList(request):
+    return _respond(request, PRODUCTS)
+
+
+@require_GET
+@api_login_required
+def productDetail(request, slug):
+    return _respond(request, PRODUCTS, single=True, slug=slug)
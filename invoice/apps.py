@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InvoiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoice'
+
+    def ready(self):
+        from . import metrics, signals  # noqa: F401
+        from .overdue import start_overdue_timer
+        start_overdue_timer()
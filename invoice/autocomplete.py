@@ -0,0 +1,66 @@
+import hashlib
+
+from django import forms
+from django.conf import settings as django_settings
+from django.core.cache import cache
+
+from .models import Client
+from .search import search
+
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+
+def autocomplete_timeout():
+    # seconds a suggestion list is reused, here and in the browser; a new client shows up after at most this long
+    return getattr(django_settings, 'CLIENT_AUTOCOMPLETE_TIMEOUT', 30)
+
+
+def client_suggestions(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Clients whose name or email address has words starting with those of
+    ``query``, best match first: [{id, slug, clientName, emailAddress}].
+
+    The lookup runs on the search index (see search.py), which is indexed
+    for prefixes, then loads the matching clients by primary key; two
+    queries, whatever the number of clients. Results are cached briefly
+    per query.
+    """
+    query = ' '.join(query.split()).lower()
+    if len(query) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    # hashed: cache backends such as memcached reject keys with spaces
+    key = 'client-autocomplete:{}:{}'.format(limit, hashlib.sha1(query.encode()).hexdigest())
+    results = cache.get(key)
+    if results is None:
+        ids = [hit['object_id'] for hit in search(query, kind='client', limit=limit)]
+        rows = {row['id']: row for row in
+                Client.objects.filter(pk__in=ids).values('id', 'slug', 'clientName', 'emailAddress')}
+        results = [rows[pk] for pk in ids if pk in rows]
+        cache.set(key, results, autocomplete_timeout())
+    return results
+
+
+class ClientPickerForm(forms.Form):
+    """
+    Sets an invoice's client from the id the autocomplete box fills in.
+
+    The client travels as a hidden input, so rendering the form never
+    lists the clients, and validating it is the one primary key lookup of
+    ModelChoiceField. A plain Form rather than a ModelForm, whose model
+    validation would look the client up a second time.
+    """
+    client = forms.ModelChoiceField(queryset=Client.objects.all(), widget=forms.HiddenInput,
+                                    error_messages={'invalid_choice': 'Choose a client from the suggestions.'})
+
+    def __init__(self, *args, instance, **kwargs):
+        self.instance = instance
+        kwargs.setdefault('initial', {'client': instance.client_id})
+        super().__init__(*args, **kwargs)
+
+    def save(self):
+        self.instance.client = self.cleaned_data['client']
+        self.instance.save()
+        return self.instance
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+
+import django
+from django.apps import apps
+
+from .documents import PDF_OPTIONS, document_context, get_settings_for_invoice, save_client_invoice
+from .models import Invoice, Product
+from .renderers import get_renderer
+
+
+def init_render_worker():
+    # spawn-based pools start from a bare interpreter
+    if not apps.ready:
+        django.setup()
+
+
+def render_invoice_file(invoice_id):
+    """
+    Render one invoice to MEDIA_ROOT/client_invoices in a pool process.
+    Returns (invoice id, pdf path, recipient, sender name, seconds spent).
+    """
+    started = time.perf_counter()
+    invoice = Invoice.objects.select_related('client').get(pk=invoice_id)
+    products = list(Product.objects.filter(invoice=invoice))
+    p_settings = get_settings_for_invoice(invoice)
+    if p_settings is None:
+        raise ValueError("Company settings not found. Please add settings in admin.")
+
+    file_content = get_renderer().render(document_context(invoice, products, p_settings), PDF_OPTIONS)
+    path = save_client_invoice(invoice, file_content)
+    to_email = invoice.client.emailAddress if invoice.client else None
+    return invoice_id, path, to_email, p_settings.companyName, time.perf_counter() - started
+
+
+class RateLimiter:
+    """Token bucket shared by the sender threads; ``rate`` messages per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """
+    Append-only JSON-lines record of invoices already emailed by a run, so an
+    interrupted run can be restarted without sending anything twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.done.add(json.loads(line)['invoice'])
+
+    def mark(self, invoice_id):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'invoice': invoice_id, 'sent_at': time.time()}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(invoice_id)
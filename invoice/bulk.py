@@ -0,0 +1,40 @@
+from django.db import connection as db_connection
+
+
+def insert_rows(model, columns, rows, page_size=1000):
+    """
+    INSERT ``rows`` (tuples of database-ready values, in ``columns`` order)
+    into ``model``'s table without building model instances or compiling
+    each value through the ORM, which is most of bulk_create's cost for
+    large batches. Values must already be adapted: a datetime through
+    ``connection.ops.adapt_datetimefield_value``, foreign keys as ids.
+    No signals are sent and primary keys are not returned.
+    """
+    qn = db_connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    names = ', '.join(qn(column) for column in columns)
+    with db_connection.cursor() as cursor:
+        if db_connection.vendor == 'postgresql':
+            from psycopg2.extras import execute_values
+            # one multi-row VALUES statement per page instead of a round trip per row
+            execute_values(cursor.cursor, f'INSERT INTO {table} ({names}) VALUES %s', rows, page_size=page_size)
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({placeholders})', rows)
+
+
+def delete_rows(model, ids, page_size=500):
+    """
+    DELETE the rows of ``model`` with primary keys ``ids``, a page of keys
+    per statement. Unlike ``QuerySet.delete()`` nothing is loaded and no
+    signals are sent, so the caller updates whatever the post_delete
+    handlers would have. Only for models no other table references.
+    """
+    ids = list(ids)
+    qn = db_connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk = qn(model._meta.pk.column)
+    with db_connection.cursor() as cursor:
+        for start in range(0, len(ids), page_size):
+            page = ids[start:start + page_size]
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(page))})", page)
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import threading
+
+from django.conf import settings as django_settings
+
+from .models import Settings
+
+
+class CompanySettingsProvider:
+    """
+    The Settings rows, with their bank_accounts prefetched, cached in this
+    process.
+
+    Invalidation across workers goes through a version stamp: a small file
+    (COMPANY_SETTINGS_STAMP) that is replaced whenever Settings or
+    BankDetail change (see signals.py). Each lookup compares the file's
+    inode and mtime with those seen at load time, a stat() call instead of
+    a query, and reloads when they differ. The stamp must be on storage all
+    the workers share, which MEDIA_ROOT already has to be.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.rows = None
+
+    def stamp_path(self):
+        return getattr(django_settings, 'COMPANY_SETTINGS_STAMP',
+                       os.path.join(django_settings.MEDIA_ROOT, '.company_settings_version'))
+
+    def current_version(self):
+        try:
+            st = os.stat(self.stamp_path())
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def all(self):
+        version = self.current_version()
+        rows = self.rows
+        if rows is None or version != self.version:
+            rows = list(Settings.objects.prefetch_related('bank_accounts').order_by('id'))
+            with self.lock:
+                self.rows, self.version = rows, version
+        return rows
+
+    def first(self):
+        rows = self.all()
+        return rows[0] if rows else None
+
+    def by_company_name(self, name):
+        return next((row for row in self.all() if row.companyName == name), None)
+
+    def invalidate(self):
+        """Drop this process's copy and replace the stamp so every other worker reloads too."""
+        with self.lock:
+            self.rows = None
+        path = self.stamp_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a new file (new inode) renamed over the old one, so readers never see a partial write
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.company_settings_')
+        os.close(fd)
+        os.replace(tmp, path)
+
+
+company_settings = CompanySettingsProvider()
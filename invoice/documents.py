@@ -0,0 +1,64 @@
+import os
+
+from django.conf import settings as django_settings
+
+from .company import company_settings
+
+
+# wkhtmltopdf options shared by every invoice document render
+PDF_OPTIONS = {
+    'encoding': 'UTF-8',
+    'enable-local-file-access': None,
+    'page-size': 'A4',
+    'custom-header': [('Accept-Encoding', 'gzip')],
+}
+
+
+# --- helper: get settings for an invoice (dynamic) ---
+def get_settings_for_invoice(invoice):
+    """
+    Attempt to find Settings linked to invoice.client.
+    Fall back to first Settings row, then None.
+
+    Served from the in-process cache (invoice/company.py), with bank_accounts
+    prefetched, so this costs no queries once warm.
+    """
+    if invoice and hasattr(invoice, 'client') and invoice.client:
+        # Use companyName field on Settings model instead of clientName
+        client_field = getattr(invoice.client, 'companyName', None)  # <-- adjust if Client model uses companyName
+        if client_field:
+            p_settings = company_settings.by_company_name(client_field)
+            if p_settings:
+                return p_settings
+
+    # fallback to first settings row
+    return company_settings.first()
+
+
+# --- helper: bank accounts keyed by lower-case currency, as the PDF template reads them ---
+def get_bank_details(p_settings):
+    return {bank.currency.lower(): bank for bank in p_settings.bank_accounts.all()}
+
+
+def document_context(invoice, products, p_settings):
+    """Context for invoice/pdf-template.html and the PDF renderers."""
+    return {
+        'invoice': invoice,
+        'products': products,
+        'p_settings': p_settings,
+        'bank_detail': get_bank_details(p_settings),
+        'invoiceTotal': "{:.2f}".format(invoice.total),
+    }
+
+
+def client_invoice_path(invoice):
+    """Where the emailed copy of an invoice PDF is kept."""
+    return os.path.join(django_settings.MEDIA_ROOT, 'client_invoices', '{}.pdf'.format(invoice.uniqueId))
+
+
+def save_client_invoice(invoice, file_content):
+    path = client_invoice_path(invoice)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(file_content)
+    return path
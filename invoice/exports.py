@@ -0,0 +1,251 @@
+import csv
+import json
+import logging
+import os
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from .documents import PDF_OPTIONS, client_invoice_path, document_context, get_settings_for_invoice
+from .models import Product
+from .pdf import PDFRenderError
+from .pdf_cache import get_pdf_cache, pdf_fingerprint
+from .renderers import get_renderer
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 100
+
+# columns of the CSV / JSON Lines export: name -> Invoice field path. The
+# totals are the ones the invoice keeps up to date from its line items.
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'number': 'number',
+    'title': 'title',
+    'status': 'status',
+    'client': 'client__clientName',
+    'client_email': 'client__emailAddress',
+    'client_phone': 'client__phoneNumber',
+    'client_tax_number': 'client__taxNumber',
+    'client_country': 'client__country',
+    'payment_terms': 'paymentTerms',
+    'due_date': 'dueDate',
+    'created': 'date_created',
+    'updated': 'last_updated',
+    'currency': 'currency',
+    'line_items': 'line_count',
+    'subtotal': 'subtotal',
+    'total': 'total',
+    'notes': 'notes',
+    'slug': 'slug',
+}
+
+DEFAULT_EXPORT_COLUMNS = ['number', 'title', 'client', 'client_email', 'status', 'created', 'due_date',
+                          'currency', 'line_items', 'subtotal', 'total']
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# rows are fetched from the database this many at a time
+ROW_CHUNK_SIZE = 2000
+# and sent on in pieces of about this many bytes
+ROW_FLUSH_BYTES = 64 * 1024
+
+
+class _ZipBuffer:
+    """Write-only sink for ZipFile; the bytes written so far are drained with ``pop()``."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back each formatted row."""
+
+    def write(self, value):
+        return value
+
+
+def export_columns(names=None):
+    """
+    Validate a list of export column names, or a comma-separated string.
+    Returns the default columns when none are given; ValueError on an
+    unknown name.
+    """
+    if isinstance(names, str):
+        names = names.split(',')
+    names = [name.strip() for name in names or [] if name.strip()]
+    unknown = [name for name in names if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError("Unknown column(s): {}; choose from {}".format(
+            ', '.join(unknown), ', '.join(EXPORT_COLUMNS)))
+    return names or list(DEFAULT_EXPORT_COLUMNS)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)  # exact; a float would round the amounts
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def iter_invoice_rows(queryset, columns=None, fmt='csv', chunk_size=ROW_CHUNK_SIZE):
+    """
+    Yield ``queryset`` as CSV or JSON Lines (``fmt``), one invoice per row
+    with its client's details and line item totals, encoded as UTF-8.
+
+    Rows come from a single joined values query read through
+    ``.iterator()``, ``chunk_size`` at a time (a server-side cursor on
+    PostgreSQL), so memory use stays flat however many invoices match. The
+    CSV header, or the first JSON line, is yielded on its own so the
+    response starts at once; after that rows are batched into pieces of
+    about ROW_FLUSH_BYTES.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt must be one of {', '.join(EXPORT_FORMATS)}")
+    columns = export_columns(columns)
+    rows = (queryset.order_by('id')
+            .values_list(*[EXPORT_COLUMNS[name] for name in columns])
+            .iterator(chunk_size=chunk_size))
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns).encode()
+
+        def line(row):
+            return writer.writerow([_csv_value(value) for value in row])
+    else:
+        def line(row):
+            return json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False) + '\n'
+
+    # JSON Lines has no header, so its first row goes out by itself instead
+    flush_at = 0 if fmt == 'jsonl' else ROW_FLUSH_BYTES
+    pending, size = [], 0
+    for row in rows:
+        text = line(row)
+        pending.append(text)
+        size += len(text)
+        if size >= flush_at:
+            yield ''.join(pending).encode()
+            pending, size, flush_at = [], 0, ROW_FLUSH_BYTES
+    if pending:
+        yield ''.join(pending).encode()
+
+
+def _entry_name(invoice, seen):
+    base = re.sub(r'[^A-Za-z0-9._-]+', '-', invoice.number or '').strip('-') or invoice.uniqueId or str(invoice.pk)
+    name = f'{base}.pdf'
+    n = 1
+    while name in seen:
+        n += 1
+        name = f'{base}-{n}.pdf'
+    seen.add(name)
+    return name
+
+
+def _fresh_client_invoice(invoice, products, p_settings):
+    """
+    The copy saved in client_invoices when the invoice was emailed, if nothing
+    the PDF shows has changed since it was written.
+    """
+    path = client_invoice_path(invoice)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    stamps = [invoice.last_updated, p_settings.last_updated]
+    if invoice.client is not None:
+        stamps.append(invoice.client.last_updated)
+    stamps.extend(product.last_updated for product in products)
+    if any(stamp is None or stamp.timestamp() > mtime for stamp in stamps):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def invoice_pdf(invoice, products, p_settings, renderer):
+    """
+    PDF bytes for one invoice, preferring already-rendered copies: the PDF
+    cache first, then a still-current client_invoices file, and only then a
+    fresh render (which is stored in the PDF cache).
+    """
+    pdf_cache = get_pdf_cache()
+    fingerprint = pdf_fingerprint(invoice, products, p_settings, renderer.version())
+    file_content = pdf_cache.get(invoice, fingerprint)
+    if file_content is None:
+        file_content = _fresh_client_invoice(invoice, products, p_settings)
+    if file_content is None:
+        file_content = renderer.render(document_context(invoice, products, p_settings), PDF_OPTIONS)
+        pdf_cache.put(invoice, fingerprint, file_content)
+    return file_content
+
+
+def iter_invoice_zip(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a ZIP archive of the PDFs for ``queryset`` piece by piece.
+
+    Invoices are loaded ``chunk_size`` at a time (with their clients and line
+    items) and each entry is yielded as soon as it is written, so memory use
+    does not grow with the size of the export. Entries are stored without
+    recompression since PDF streams are already compressed. Invoices that fail
+    to render are listed in an ``errors.txt`` entry at the end.
+    """
+    renderer = get_renderer()
+    buffer = _ZipBuffer()
+    settings_by_client = {}
+    seen = set()
+    errors = []
+
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    model = queryset.model
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for start in range(0, len(ids), chunk_size):
+            chunk = (model.objects.filter(pk__in=ids[start:start + chunk_size])
+                     .select_related('client').order_by('id'))
+            products_by_invoice = {}
+            for product in Product.objects.filter(invoice__in=chunk):
+                products_by_invoice.setdefault(product.invoice_id, []).append(product)
+
+            for invoice in chunk:
+                if invoice.client_id not in settings_by_client:
+                    settings_by_client[invoice.client_id] = get_settings_for_invoice(invoice)
+                p_settings = settings_by_client[invoice.client_id]
+                name = _entry_name(invoice, seen)
+                if p_settings is None:
+                    errors.append(f'{name}: company settings not found')
+                    continue
+                try:
+                    file_content = invoice_pdf(invoice, products_by_invoice.get(invoice.pk, []),
+                                               p_settings, renderer)
+                except PDFRenderError as e:
+                    logger.warning("zip export: invoice %s failed to render: %s", invoice.pk, e)
+                    errors.append(f'{name}: {e}')
+                    continue
+                archive.writestr(name, file_content)
+                yield buffer.pop()
+
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    yield buffer.pop()
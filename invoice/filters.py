@@ -0,0 +1,43 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+from .models import Invoice
+
+
+def _day_start(value):
+    """Midnight (local time) at the start of a YYYY-MM-DD date; ValidationError if malformed."""
+    day = models.DateField().to_python(value)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_invoices(queryset=None, status=None, due_from=None, due_to=None, client=None,
+                    created_from=None, created_to=None):
+    """
+    Narrow an Invoice queryset by the filters shared by the bulk commands,
+    exports and list views. ``status`` may be one value or a list;
+    ``client`` is a Client id or slug. The created range is inclusive of
+    both days and compares against day boundaries, so it can use an index
+    on date_created.
+    """
+    if queryset is None:
+        queryset = Invoice.objects.all()
+    if status:
+        statuses = [status] if isinstance(status, str) else list(status)
+        queryset = queryset.filter(status__in=statuses)
+    if due_from:
+        queryset = queryset.filter(dueDate__gte=due_from)
+    if due_to:
+        queryset = queryset.filter(dueDate__lte=due_to)
+    if created_from:
+        queryset = queryset.filter(date_created__gte=_day_start(created_from))
+    if created_to:
+        queryset = queryset.filter(date_created__lt=_day_start(created_to) + timedelta(days=1))
+    if client:
+        client = str(client)
+        if client.isdigit():
+            queryset = queryset.filter(client_id=int(client))
+        else:
+            queryset = queryset.filter(client__slug=client)
+    return queryset
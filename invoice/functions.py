@@ -1,9 +1,11 @@
 from django.core.mail import EmailMessage
 from django.conf import settings
 
+from .models import OutboundEmail
 
 
-def emailInvoiceClient(to_email, from_client, filepath):
+
+def buildInvoiceEmail(to_email, from_client, filepath, connection=None):
     from_email = settings.EMAIL_HOST_USER
     subject = '[Skolo] Invoice Notification'
     body = """
@@ -15,6 +17,16 @@ def emailInvoiceClient(to_email, from_client, filepath):
     Iboy Technology
     """.format(from_client)
 
-    message = EmailMessage(subject, body, from_email, [to_email])
+    message = EmailMessage(subject, body, from_email, [to_email], connection=connection)
     message.attach_file(filepath)
-    message.send()
+    return message
+
+
+def emailInvoiceClient(to_email, from_client, filepath):
+    buildInvoiceEmail(to_email, from_client, filepath).send()
+
+
+def queueInvoiceEmail(invoice, to_email, from_client, filepath):
+    # delivered by `python manage.py send_queued_emails`
+    return OutboundEmail.objects.create(invoice=invoice, to_email=to_email,
+                                        from_name=from_client, attachment=filepath)
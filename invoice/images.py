@@ -0,0 +1,124 @@
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+# name: (max width, max height, format). Logos are shown at a fixed height
+# (h-16, 64 px, ~17 mm in print) with the width following, so the boxes are
+# wide. 'print' is for PDFs, about 450 dpi at that height; 'thumb' is 2x the
+# page header and 'card' 2x the company settings preview.
+DERIVATIVES = {
+    'print': (900, 300, None),  # PNG if the logo has transparency, else JPEG
+    'thumb': (384, 128, 'WEBP'),
+    'card': (640, 480, 'WEBP'),
+}
+
+# bump to regenerate every derivative after changing the specs or encoder settings
+DERIVATIVE_VERSION = '1'
+
+_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_derived = {}
+_derived_lock = threading.Lock()
+
+
+def derivative_name(original_name, spec, fmt):
+    """
+    Storage name of the ``spec`` derivative of ``original_name``, encoded as
+    ``fmt``: next to the original, under derived/, keyed by the original's
+    name and the spec. Uploads never overwrite an existing name, so a new
+    logo gets new derivatives.
+    """
+    width, height, _fmt = DERIVATIVES[spec]
+    key = hashlib.sha1(f'{DERIVATIVE_VERSION}|{original_name}|{width}x{height}'.encode()).hexdigest()[:10]
+    folder, filename = posixpath.split(original_name)
+    stem = posixpath.splitext(filename)[0][:60]
+    return posixpath.join(folder, 'derived', f'{stem}-{spec}-{key}.{_EXTENSIONS[fmt]}')
+
+
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def render_derivative(data, spec):
+    """Resize and recompress image bytes for ``spec``. Returns (bytes, format)."""
+    width, height, fmt = DERIVATIVES[spec]
+    img = Image.open(io.BytesIO(data))
+    # JPEG can decode straight at a reduced scale, which is much cheaper for large photos
+    img.draft('RGB', (width * 2, height * 2))
+    img = ImageOps.exif_transpose(img)
+    alpha = _has_alpha(img)
+    img = img.convert('RGBA' if alpha else 'RGB')
+    img.thumbnail((width, height), Image.LANCZOS)
+
+    fmt = fmt or ('PNG' if alpha else 'JPEG')
+    out = io.BytesIO()
+    if fmt == 'PNG':
+        # a 256-colour palette is visually lossless for logos and a fraction of the size
+        img.quantize(colors=256, method=Image.FASTOCTREE).save(out, 'PNG', optimize=True)
+    elif fmt == 'JPEG':
+        img.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        img.save(out, 'WEBP', quality=80, method=4)
+    return out.getvalue(), fmt
+
+
+def _generate(field_file, spec):
+    storage = field_file.storage
+    # 'print' picks its format from the image, so look for either
+    formats = [DERIVATIVES[spec][2]] if DERIVATIVES[spec][2] else ['PNG', 'JPEG']
+    for fmt in formats:
+        name = derivative_name(field_file.name, spec, fmt)
+        if storage.exists(name):
+            return name
+
+    with field_file.open('rb') as f:
+        data = f.read()
+    content, fmt = render_derivative(data, spec)
+    name = derivative_name(field_file.name, spec, fmt)
+    saved = storage.save(name, ContentFile(content))
+    if saved != name:
+        # another process wrote it first; keep theirs
+        storage.delete(saved)
+    return name
+
+
+def logo_derivative(field_file, spec):
+    """
+    Storage name of the ``spec`` derivative of an uploaded image, generating
+    it on first use. Returns None when there is no file or it can't be
+    read as an image; callers then fall back to the original.
+    """
+    if not field_file:
+        return None
+    key = (field_file.name, spec)
+    name = _derived.get(key)
+    if name is None:
+        try:
+            name = _generate(field_file, spec)
+        except (OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning("could not build %s derivative of %s: %s", spec, field_file.name, e)
+            name = ''  # remembered, so a missing file is not retried on every render
+        with _derived_lock:
+            _derived[key] = name
+    return name or None
+
+
+def logo_url(field_file, spec):
+    """URL of the ``spec`` derivative, or of the original if it can't be built."""
+    if not field_file:
+        return ''
+    name = logo_derivative(field_file, spec)
+    return field_file.storage.url(name) if name else field_file.url
+
+
+def build_derivatives(field_file):
+    """Create every derivative of an uploaded image (on upload, or as a backfill)."""
+    return {spec: logo_derivative(field_file, spec) for spec in DERIVATIVES}
@@ -0,0 +1,355 @@
+import csv
+import io
+import os
+import re
+import time
+from uuid import uuid4
+
+from django.conf import settings as django_settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection as db_connection, transaction
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+from django_countries import countries
+
+from .bulk import insert_rows
+from .models import Client, Invoice, Product
+from .search import index_documents
+from .stats import CLIENTS, bump
+from .totals import refresh_invoices
+
+
+# importable columns per kind; matched to the file's header case-insensitively
+COLUMNS = {
+    'clients': ['clientName', 'addressLine1', 'country', 'state_or_province', 'postalCode',
+                'phoneNumber', 'emailAddress', 'taxNumber'],
+    # ``invoice`` is the invoice number the line item belongs to
+    'products': ['invoice', 'title', 'description', 'quantity', 'price', 'currency'],
+}
+
+MODELS = {'clients': Client, 'products': Product}
+
+
+class ImportResult:
+    def __init__(self, kind, dry_run):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# --- helper: reading files row by row ---
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers, e.g. phone numbers stored as 8.0e9
+    return str(value).strip()
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(fileobj):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl); or upload a CSV export")
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_records(fileobj, filename, kind):
+    """
+    Yield (line number, {column: text}) for each data row of a CSV or XLSX
+    file, streaming: the whole file is never held in memory. Unknown
+    columns are ignored.
+    """
+    rows = _xlsx_rows(fileobj) if filename.lower().endswith('.xlsx') else _csv_rows(fileobj)
+    header = next(rows, None)
+    if header is None:
+        return
+    known = {name.lower(): name for name in COLUMNS[kind]}
+    columns = [known.get(_cell(name).lower()) for name in header]
+    if not any(columns):
+        raise ValueError(f"No known columns in the header; expected some of: {', '.join(COLUMNS[kind])}")
+    for line, row in enumerate(rows, start=2):
+        values = [_cell(value) for value in row]
+        if not any(values):
+            continue
+        yield line, {name: value for name, value in zip(columns, values) if name}
+
+
+# --- helper: validation, per kind; returns (column values, errors) ---
+_COUNTRIES = None
+
+
+def _check_lengths(model, record, errors):
+    for name, value in record.items():
+        if name in ('invoice', 'country'):
+            continue  # looked up, not stored as given
+        max_length = getattr(model._meta.get_field(name), 'max_length', None)
+        if max_length and len(value) > max_length:
+            errors.append(f'{name} is longer than {max_length} characters')
+
+
+def _country_code(value):
+    global _COUNTRIES
+    if _COUNTRIES is None:
+        _COUNTRIES = {}
+        for code, name in countries:
+            _COUNTRIES[code.lower()] = code
+            _COUNTRIES[str(name).lower()] = code
+    return _COUNTRIES.get(value.lower())
+
+
+def _client(record):
+    errors = []
+    _check_lengths(Client, record, errors)
+    if not record.get('clientName'):
+        errors.append('clientName is required')
+    values = {name: record.get(name) or None for name in COLUMNS['clients']}
+    if values['emailAddress']:
+        try:
+            validate_email(values['emailAddress'])
+        except ValidationError:
+            errors.append(f'invalid emailAddress "{values["emailAddress"]}"')
+    if values['country']:
+        values['country'] = _country_code(record['country'])
+        if not values['country']:
+            errors.append(f'unknown country "{record["country"]}"')
+    values['clientLogo'] = Client._meta.get_field('clientLogo').get_default()
+    return values, errors
+
+
+def _number(record, name, errors):
+    value = record.get(name)
+    if not value:
+        return None
+    try:
+        number = float(value.replace(',', ''))
+    except ValueError:
+        errors.append(f'{name} "{value}" is not a number')
+        return None
+    try:
+        Product._meta.get_field(name).run_validators(number)
+    except ValidationError as e:
+        errors.append(f'{name} "{value}": {" ".join(e.messages)}')
+    return number
+
+
+def _product(record, invoices):
+    errors = []
+    _check_lengths(Product, record, errors)
+    if not record.get('title'):
+        errors.append('title is required')
+    invoice_id, invoice_slug = invoices.get(record.get('invoice'), (None, None))
+    if invoice_id is None:
+        errors.append(f'no invoice numbered "{record.get("invoice", "")}"')
+    currency = (record.get('currency') or 'NGN').upper()
+    if currency not in dict(Product.CURRENCY):
+        errors.append(f'unsupported currency "{currency}"')
+    values = {
+        'title': record.get('title') or None,
+        'description': record.get('description') or None,
+        'quantity': _number(record, 'quantity', errors),
+        'price': _number(record, 'price', errors),
+        'currency': currency,
+        'invoice_id': invoice_id,
+        'invoice_slug': invoice_slug,  # for the search document; not a column
+    }
+    return values, errors
+
+
+def _load_invoices(records):
+    """Invoice number -> (id, slug) for the numbers a batch of line items refers to."""
+    numbers = {record.get('invoice') for _line, record in records} - {None, ''}
+    # newest wins when numbers repeat
+    rows = Invoice.objects.filter(number__in=numbers).order_by('id').values_list('number', 'id', 'slug')
+    return {number: (pk, slug) for number, pk, slug in rows}
+
+
+# --- helper: what save() and the post_save signals would do, for a whole batch ---
+SLUG_SOURCE = {'clients': 'clientName', 'products': 'title'}
+
+# columns written per kind
+INSERT_COLUMNS = {
+    'clients': ['clientName', 'addressLine1', 'clientLogo', 'country', 'state_or_province', 'postalCode',
+                'phoneNumber', 'emailAddress', 'taxNumber', 'uniqueId', 'slug', 'date_created', 'last_updated'],
+    'products': ['title', 'description', 'quantity', 'price', 'currency', 'invoice_id',
+                 'uniqueId', 'slug', 'date_created', 'last_updated'],
+}
+
+
+def _existing_slugs(model, slugs):
+    # plain SQL: building a 2000-value ``slug__in`` filter costs more than running it
+    table, qn = model._meta.db_table, db_connection.ops.quote_name
+    with db_connection.cursor() as cursor:
+        cursor.execute(f"SELECT slug FROM {qn(table)} WHERE slug IN ({', '.join(['%s'] * len(slugs))})", slugs)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _prepare(rows, kind):
+    """
+    Set uniqueId, slug and the timestamps as ``save()`` does, for a batch
+    that skips it. Slugs that clash with the database or within the batch
+    get a fresh uniqueId; one query per round.
+    """
+    model, source = MODELS[kind], SLUG_SOURCE[kind]
+    # adapted once for the batch rather than once per row and column
+    stamp = db_connection.ops.adapt_datetimefield_value(timezone.localtime(timezone.now()))
+    pending = rows
+    taken = set()
+    while pending:
+        for values in pending:
+            values['uniqueId'] = uuid4().hex[-12:]
+            values['slug'] = slugify(f"{values[source]}-{values['uniqueId']}")
+            values['date_created'] = values['last_updated'] = stamp
+        clashes = _existing_slugs(model, [values['slug'] for values in pending])
+        retry = []
+        for values in pending:
+            if values['slug'] in clashes or values['slug'] in taken:
+                retry.append(values)
+            else:
+                taken.add(values['slug'])
+        pending = retry
+
+
+def _write(rows, kind):
+    """Insert a prepared batch, then update what the post_save signals would have."""
+    model, columns = MODELS[kind], INSERT_COLUMNS[kind]
+    with transaction.atomic():
+        last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        insert_rows(model, columns, [tuple(values[column] for column in columns) for values in rows])
+        # the new primary keys, for the search index; rows other writers added meanwhile are ignored
+        ids = dict(model.objects.filter(id__gt=last_id).values_list('slug', 'id'))
+        if kind == 'clients':
+            bump(CLIENTS, count=len(rows))
+            index_documents([('client', ids[values['slug']], values, None) for values in rows])
+        else:
+            refresh_invoices({values['invoice_id'] for values in rows})
+            index_documents([('product', ids[values['slug']], values, values['invoice_slug']) for values in rows])
+
+
+def import_records(fileobj, filename, kind, dry_run=False, batch_size=2000, error_report=None):
+    """
+    Import clients or line items (``kind``) from a CSV or XLSX file.
+
+    The file is read as a stream and handled ``batch_size`` rows at a time:
+    the rows are validated, the fields ``save()`` would fill in are set for
+    the whole batch, and the valid rows are inserted in one multi-row
+    statement per batch and transaction, together with the dashboard counters, invoice
+    totals and search index that the signals would otherwise keep. Invalid
+    rows are skipped and written to ``error_report`` (a text file object)
+    as CSV: line, errors, then the row's values. With ``dry_run`` nothing
+    is written to the database.
+    """
+    if kind not in COLUMNS:
+        raise ValueError(f"kind must be one of {', '.join(COLUMNS)}")
+    result = ImportResult(kind, dry_run)
+    report = csv.writer(error_report) if error_report is not None else None
+    if report:
+        report.writerow(['line', 'errors'] + COLUMNS[kind])
+    started = time.perf_counter()
+
+    def flush(records):
+        invoices = _load_invoices(records) if kind == 'products' else None
+        valid, accepted = [], []
+
+        def reject(line, record, errors):
+            result.errors += 1
+            if report:
+                report.writerow([line, '; '.join(errors)] + [record.get(name, '') for name in COLUMNS[kind]])
+
+        for line, record in records:
+            values, errors = _client(record) if kind == 'clients' else _product(record, invoices)
+            if errors:
+                reject(line, record, errors)
+            else:
+                valid.append(values)
+                accepted.append((line, record))
+        if valid and not dry_run:
+            _prepare(valid, kind)
+            try:
+                _write(valid, kind)
+            except ValidationError as e:
+                # the batch would take an invoice total past what it holds; none of it was written
+                for line, record in accepted:
+                    reject(line, record, e.messages)
+                return
+        result.created += len(valid)
+
+    batch = []
+    for line, record in iter_records(fileobj, filename, kind):
+        result.rows += 1
+        batch.append((line, record))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# --- helper: error reports of uploaded imports ---
+# They hold the rejected rows (client details included), so they live outside
+# MEDIA_ROOT under unguessable names, are only served to the user who uploaded
+# them (importErrorReport) and are deleted after IMPORT_REPORT_MAX_AGE seconds.
+REPORT_NAME = re.compile(r'^(\d+)-(clients|products)-[0-9a-f]{32}\.csv$')
+
+
+def error_report_path(name):
+    return os.path.join(django_settings.IMPORT_REPORT_DIR, name)
+
+
+def new_error_report(kind, user_id):
+    """A fresh report name for ``user_id``'s upload, after expiring the old reports."""
+    expire_error_reports()
+    os.makedirs(django_settings.IMPORT_REPORT_DIR, exist_ok=True)
+    return '{}-{}-{}.csv'.format(user_id, kind, uuid4().hex)
+
+
+def error_report_owner(name):
+    """The id of the user a report name belongs to, or None for anything that is not a report name."""
+    match = REPORT_NAME.match(name)
+    return int(match.group(1)) if match else None
+
+
+def expire_error_reports(max_age=None):
+    """Delete reports older than ``max_age`` seconds (IMPORT_REPORT_MAX_AGE). Returns how many went."""
+    if max_age is None:
+        max_age = django_settings.IMPORT_REPORT_MAX_AGE
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(django_settings.IMPORT_REPORT_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not REPORT_NAME.match(entry.name):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # another worker expired it first
+            pass
+    return removed
@@ -0,0 +1,147 @@
+from uuid import uuid4
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from .bulk import delete_rows
+from .models import Invoice, Product
+from .search import index_documents, remove_objects
+from .totals import TOTAL_FIELDS, refresh_invoices
+
+
+# the line item fields a batch may set, as on the build page's product form
+LINE_FIELDS = ['title', 'description', 'quantity', 'price', 'currency']
+
+MAX_LINE_OPERATIONS = 500
+
+
+class LineItemError(ValueError):
+    """
+    A batch that was not applied. ``errors`` maps an operation list
+    ('add', 'update', 'delete') to {position in that list: {field: [messages]}}.
+    """
+
+    def __init__(self, errors):
+        super().__init__('invalid line item operations')
+        self.errors = errors
+
+
+# --- helper: validating one operation against the model's own field rules ---
+def _clean(values, required=()):
+    cleaned, errors = {}, {}
+    if not isinstance(values, dict):
+        return cleaned, {'__all__': ['expected an object']}
+    for name, value in values.items():
+        if name == 'slug':
+            continue
+        if name not in LINE_FIELDS:
+            errors[name] = ['unknown field']
+            continue
+        if value == '':
+            value = None
+        try:
+            cleaned[name] = Product._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    for name in required:
+        if not cleaned.get(name):
+            errors.setdefault(name, ['This field is required.'])
+    return cleaned, errors
+
+
+def _new_line(invoice, values, now):
+    # what Product.save() fills in
+    unique_id = str(uuid4()).split('-')[4]
+    values.setdefault('currency', Product._meta.get_field('currency').get_default())
+    return Product(invoice=invoice, uniqueId=unique_id, slug=slugify(f"{values.get('title')}-{unique_id}"),
+                   date_created=now, last_updated=now, **values)
+
+
+def apply_line_operations(invoice, add=(), update=(), delete=()):
+    """
+    Add, change and remove any number of the line items of ``invoice`` at
+    once, all or nothing.
+
+    ``add`` is a list of {field: value}; ``update`` the same with the
+    line's ``slug``; ``delete`` a list of slugs. Every operation is
+    validated first and nothing is written if any fails (LineItemError),
+    or if the lines would add up to more than the invoice total holds
+    (ValueError).
+    The writes are one bulk INSERT, UPDATE and DELETE in a single
+    transaction, followed by one totals refresh and one search index
+    update, instead of the per-row save()s and signal handlers.
+    Returns the invoice's line items afterwards.
+    """
+    add, update, delete = list(add), list(update), list(delete)
+    if len(add) + len(update) + len(delete) > MAX_LINE_OPERATIONS:
+        raise ValueError(f'At most {MAX_LINE_OPERATIONS} line item operations per batch')
+
+    with transaction.atomic():
+        # one batch at a time per invoice (a no-op on SQLite, which locks the whole database)
+        Invoice.objects.select_for_update().filter(pk=invoice.pk).values_list('pk', flat=True).first()
+        slugs = [values.get('slug') for values in update if isinstance(values, dict)] + list(delete)
+        slugs = [slug for slug in slugs if isinstance(slug, str)]
+        existing = {line.slug: line for line in Product.objects.filter(invoice=invoice, slug__in=slugs)}
+
+        errors = {'add': {}, 'update': {}, 'delete': {}}
+        added, changed, removed, seen = [], [], [], set()
+        now = timezone.localtime(timezone.now())
+        for i, values in enumerate(add):
+            cleaned, problems = _clean(values, required=['title'])
+            if problems:
+                errors['add'][i] = problems
+            else:
+                added.append(_new_line(invoice, cleaned, now))
+        for i, values in enumerate(update):
+            cleaned, problems = _clean(values)
+            slug = values.get('slug') if isinstance(values, dict) else None
+            line = existing.get(slug) if isinstance(slug, str) else None
+            if line is None or line.pk in seen:
+                problems.setdefault('slug', ['no such line item on this invoice, or listed twice'])
+            if problems:
+                errors['update'][i] = problems
+                continue
+            seen.add(line.pk)
+            for name, value in cleaned.items():
+                setattr(line, name, value)
+            line.slug = slugify(f"{line.title}-{line.uniqueId}")
+            line.last_updated = now
+            changed.append(line)
+        for i, slug in enumerate(delete):
+            line = existing.get(slug) if isinstance(slug, str) else None
+            if line is None or line.pk in seen:
+                errors['delete'][i] = {'slug': ['no such line item on this invoice, or listed twice']}
+                continue
+            seen.add(line.pk)
+            removed.append(line.pk)
+
+        errors = {key: value for key, value in errors.items() if value}
+        if errors:
+            raise LineItemError(errors)
+
+        if added:
+            Product.objects.bulk_create(added, batch_size=500)
+            if added[0].pk is None:
+                # only PostgreSQL returns the new keys from a bulk insert
+                ids = dict(Product.objects.filter(slug__in=[line.slug for line in added]).values_list('slug', 'id'))
+                for line in added:
+                    line.pk = ids[line.slug]
+        if changed:
+            Product.objects.bulk_update(changed, LINE_FIELDS + ['slug', 'last_updated'], batch_size=500)
+        if removed:
+            delete_rows(Product, removed)
+
+        # what the post_save / post_delete handlers would have done, once for the batch
+        if added or changed or removed:
+            try:
+                refresh_invoices([invoice.pk])
+            except ValidationError as e:
+                # the lines are fine one by one but overflow the invoice total; the transaction undoes them
+                raise ValueError(' '.join(e.messages))
+            remove_objects('product', [line.pk for line in changed] + removed)
+            index_documents([('product', line.pk, vars(line), invoice.slug) for line in added + changed])
+
+    invoice.refresh_from_db(fields=TOTAL_FIELDS)
+    return list(Product.objects.filter(invoice=invoice).order_by('id'))
@@ -0,0 +1,118 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings as django_settings
+from django.core.mail import get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .functions import buildInvoiceEmail
+from .metrics import EMAIL_SECONDS, timed
+from .models import Invoice, OutboundEmail
+from .stats import apply_invoice_change, invoice_buckets
+
+
+logger = logging.getLogger(__name__)
+
+# statuses a delivered email moves on to EMAIL_SENT; OVERDUE and PAID invoices keep theirs
+SENDABLE_STATUSES = ('CURRENT',)
+
+
+def _setting(name, default):
+    return getattr(django_settings, name, default)
+
+
+def mark_invoice_sent(invoice_id):
+    """
+    Move the invoice to EMAIL_SENT if it is still CURRENT, with one UPDATE
+    rather than a save() of a possibly stale instance, and move its
+    dashboard counters with it. Returns whether the status changed.
+    """
+    with transaction.atomic():
+        before = invoice_buckets([invoice_id])
+        changed = Invoice.objects.filter(pk=invoice_id, status__in=SENDABLE_STATUSES).update(
+            status='EMAIL_SENT', last_updated=timezone.now())
+        if changed:
+            apply_invoice_change(before.get(invoice_id), invoice_buckets([invoice_id]).get(invoice_id))
+    return bool(changed)
+
+
+def claim_batch(batch_size):
+    """
+    Atomically move up to ``batch_size`` due PENDING jobs to SENDING and
+    return them. Jobs stuck in SENDING (a worker died mid-batch) are picked
+    up again once EMAIL_QUEUE_STALE_AFTER seconds have passed.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=_setting('EMAIL_QUEUE_STALE_AFTER', 600))
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(
+            Q(status='PENDING', next_attempt_at__lte=now) | Q(status='SENDING', last_updated__lt=stale_before)
+        ).order_by('next_attempt_at', 'id')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        jobs = list(due[:batch_size])
+        if jobs:
+            OutboundEmail.objects.filter(pk__in=[job.pk for job in jobs]).update(status='SENDING', last_updated=now)
+    return jobs
+
+
+def deliver_batch(jobs):
+    """
+    Send ``jobs`` over one SMTP session. Returns (sent, retried, failed).
+    """
+    max_attempts = _setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    retry_base = _setting('EMAIL_QUEUE_RETRY_BASE', 60)
+    sent = retried = failed = 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # nothing can go out this round: every job counts as one failed attempt
+        connection = None
+        open_error = e
+
+    try:
+        for job in jobs:
+            job.attempts += 1
+            try:
+                if connection is None:
+                    raise open_error
+                with timed(EMAIL_SECONDS):
+                    buildInvoiceEmail(job.to_email, job.from_name, job.attachment, connection=connection).send()
+            except Exception as e:
+                job.last_error = str(e)
+                if job.attempts >= max_attempts:
+                    job.status = 'FAILED'
+                    failed += 1
+                else:
+                    job.status = 'PENDING'
+                    job.next_attempt_at = timezone.now() + timedelta(seconds=retry_base * 2 ** (job.attempts - 1))
+                    retried += 1
+                logger.warning("invoice email %s to %s failed (attempt %d): %s",
+                               job.pk, job.to_email, job.attempts, e)
+                job.save()
+                continue
+
+            job.status = 'SENT'
+            job.sent_at = timezone.now()
+            job.last_error = None
+            job.save()
+            sent += 1
+            if job.invoice_id:
+                mark_invoice_sent(job.invoice_id)
+    finally:
+        if connection is not None:
+            connection.close()
+
+    return sent, retried, failed
+
+
+def process_queue(batch_size=50):
+    """Claim and deliver one batch. Returns (sent, retried, failed)."""
+    jobs = claim_batch(batch_size)
+    if not jobs:
+        return 0, 0, 0
+    return deliver_batch(jobs)
@@ -0,0 +1,391 @@
+"""
+Benchmark every route in invoice/urls.py on a seeded throwaway database.
+Each endpoint is requested --iterations times with the Django test client
+(in-process: no network or server overhead), after --warmup requests; the
+first warm-up request counts the queries. PDFs come from a stub renderer
+and mail goes to the locmem backend, so the numbers measure this code, not
+wkhtmltopdf or SMTP. Reports p50/p95/p99 latency, throughput and queries
+per endpoint; --json saves them, --baseline compares with a saved run and
+fails when an endpoint's latency (--metric, the median by default: the
+tail of a short run is mostly timer noise) grew by more than --threshold
+percent, or when it runs more queries than before. On a shared machine,
+--normalize divides out the run-wide drift (the median change of all
+endpoints) first, so only endpoints that slowed down relative to the rest fail.
+Usage: python manage.py bench_endpoints [--invoices 2000] [--iterations 30] [--json out.json] [--baseline base.json]
+"""
+
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, \
+    teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from invoice import pdf_cache, renderers, urls
+from invoice.models import Client, Invoice, Product, Settings
+from invoice.renderers import BaseRenderer
+from invoice.search import rebuild_index
+from invoice.sequences import create_invoice
+from invoice.stats import reconcile_stats
+from invoice.totals import recalculate_invoice_totals
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class StubRenderer(BaseRenderer):
+    """A renderer that costs nothing, so PDF endpoints are measured without the engine."""
+    name = 'stub'
+
+    def version(self):
+        return 'stub:1'
+
+    def render(self, context, options=None):
+        return b'%PDF-1.4\n% bench_endpoints stub\n%%EOF\n'
+
+
+class Endpoint:
+    """
+    One benchmarked request. ``path`` builds the URL for request ``i``;
+    ``data`` its GET parameters or POST body; ``setup`` prepares untimed
+    state (and may return the client to use); ``user`` is 'user', 'staff'
+    or None for an anonymous client.
+    """
+
+    def __init__(self, name, path, method='get', data=None, setup=None, user='user', status=200,
+                 content_type=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.setup = setup
+        self.user = user
+        self.status = status
+        self.content_type = content_type
+
+    @property
+    def key(self):
+        return f'{self.method.upper()} {self.name}'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every invoice endpoint (latency percentiles, throughput, queries) and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=2000, help='Invoices to seed')
+        parser.add_argument('--clients', type=int, default=100, help='Clients to seed')
+        parser.add_argument('--lines', type=int, default=3, help='Line items per invoice')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Untimed requests per endpoint first (at least 1, which counts the queries)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for reproducible datasets')
+        parser.add_argument('--only', nargs='+', help='Benchmark only these URL names')
+        parser.add_argument('--json', type=str, help='Write the results to this file (usable as a baseline)')
+        parser.add_argument('--baseline', type=str, help='Compare with the results saved in this file')
+        parser.add_argument('--metric', choices=['p50', 'p95', 'p99'], default='p50',
+                            help='Latency compared with the baseline')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Allowed latency growth over the baseline, in percent')
+        parser.add_argument('--min-delta-ms', type=float, default=2,
+                            help='Growth below this many ms is never a regression (timer noise)')
+        parser.add_argument('--normalize', action='store_true',
+                            help='Compare against the baseline scaled by the median change of all endpoints')
+
+    def handle(self, *args, **options):
+        options['warmup'] = max(1, options['warmup'])
+        endpoints = self.endpoints()
+        names = {endpoint.name for endpoint in endpoints}
+        uncovered = [pattern.name for pattern in urls.urlpatterns if pattern.name not in names]
+        if uncovered:
+            self.stdout.write(self.style.WARNING('No benchmark for: {}'.format(', '.join(uncovered))))
+        if options['only']:
+            unknown = set(options['only']) - names
+            if unknown:
+                raise CommandError('Unknown endpoint(s): {}'.format(', '.join(sorted(unknown))))
+            endpoints = [endpoint for endpoint in endpoints if endpoint.name in options['only']]
+
+        workdir = tempfile.mkdtemp()
+        overrides = {
+            'INVOICE_PDF_RENDERER': f'{__name__}.StubRenderer',
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'MEDIA_ROOT': workdir,
+            'PDF_CACHE_DIR': os.path.join(workdir, 'pdf_cache'),
+            'COMPANY_SETTINGS_STAMP': os.path.join(workdir, '.company_settings_version'),
+            'METRICS_TOKEN': '',
+            # the slow request log would only record the benchmark itself
+            'METRICS_SLOW_REQUEST_MS': 10 ** 9,
+            'METRICS_SLOW_QUERY_MS': 10 ** 9,
+        }
+        verbosity = options['verbosity']
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=max(0, verbosity - 1), autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                pdf_cache._cache = None
+                self.stdout.write(f'Seeding {options["invoices"]} invoices on {connection.vendor}...')
+                started = time.perf_counter()
+                ctx = self.seed(options)
+                self.stdout.write(f'   seeded in {time.perf_counter() - started:.1f}s')
+                results = {}
+                self.stdout.write(f'   {"endpoint":<36}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"req/s":>9}{"queries":>9}')
+                for endpoint in endpoints:
+                    results[endpoint.key] = self.measure(endpoint, ctx, options)
+                    self.report_line(endpoint.key, results[endpoint.key])
+                pdf_cache._cache = None
+                renderers._renderers.pop(f'{__name__}.StubRenderer', None)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=max(0, verbosity - 1))
+            teardown_test_environment()
+
+        run = {
+            'meta': {
+                'invoices': options['invoices'],
+                'clients': options['clients'],
+                'lines': options['lines'],
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'created': timezone.now().isoformat(),
+            },
+            'endpoints': results,
+        }
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(run, f, indent=2)
+            self.stdout.write(f'Results written to {options["json"]}')
+
+        failures = [name for name, result in results.items() if result['errors']]
+        if failures:
+            raise CommandError('Unexpected responses from: {}'.format(', '.join(failures)))
+        if options['baseline']:
+            self.compare(run, options)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Benchmarked {len(results)} endpoints'))
+
+    # --- helper: dataset (bulk inserts, then the denormalized columns, counters and search index) ---
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        today = date.today()
+
+        Settings(companyName='Bench Ltd', emailAddress='billing@bench.test').save()
+        user = User.objects.create_user('bench', password='bench-password')
+        staff = User.objects.create_user('bench-staff', password='bench-password', is_staff=True)
+
+        Client.objects.bulk_create([
+            Client(clientName=f'Client {i}', emailAddress=f'client{i}@bench.test', uniqueId=f'c{i}',
+                   slug=f'client-{i}', date_created=now, last_updated=now)
+            for i in range(options['clients'])
+        ], batch_size=1000)
+        client_ids = list(Client.objects.values_list('id', flat=True))
+
+        statuses = [value for value, _label in Invoice.STATUS]
+        Invoice.objects.bulk_create([
+            Invoice(title=f'Invoice {i}', number=f'INV-{i:07d}', status=rng.choice(statuses),
+                    dueDate=today + timedelta(days=rng.randrange(-365, 60)), client_id=rng.choice(client_ids),
+                    uniqueId=f'i{i}', slug=f'inv-{i}', date_created=now, last_updated=now)
+            for i in range(options['invoices'])
+        ], batch_size=2000)
+        invoice_ids = list(Invoice.objects.values_list('id', flat=True))
+
+        currencies = [value for value, _label in Product.CURRENCY]
+        Product.objects.bulk_create([
+            Product(title=f'Item {j}', quantity=rng.randrange(1, 10), price=rng.randrange(100, 10000),
+                    currency=rng.choice(currencies), invoice_id=invoice_id, uniqueId=f'p{invoice_id}-{j}',
+                    slug=f'p-{invoice_id}-{j}', date_created=now, last_updated=now)
+            for invoice_id in invoice_ids for j in range(options['lines'])
+        ], batch_size=5000)
+
+        for start in range(0, len(invoice_ids), 2000):
+            recalculate_invoice_totals(invoice_ids[start:start + 2000])
+        reconcile_stats()
+        rebuild_index()
+
+        # every request of an endpoint gets a different invoice, so no cache answers for it
+        requests = options['warmup'] + options['iterations']
+        slugs = list(Invoice.objects.values_list('slug', flat=True))
+        return {
+            'rng': rng,
+            'user': user,
+            'staff': staff,
+            'client_ids': client_ids,
+            'client_slugs': list(Client.objects.values_list('slug', flat=True)),
+            'invoices': [rng.choice(slugs) for _ in range(requests)],
+            'products': list(Product.objects.filter(invoice__slug__in=slugs[:requests])
+                             .values_list('slug', flat=True)[:requests]) or [''],
+        }
+
+    def endpoints(self):
+        def invoice(name):
+            return lambda ctx, i: reverse(name, args=[ctx['invoices'][i]])
+
+        def fresh_invoice(ctx, i):
+            ctx['fresh'] = create_invoice(client_id=ctx['rng'].choice(ctx['client_ids'])).slug
+
+        def logged_in(ctx, i):
+            client = TestClient()
+            client.force_login(ctx['user'])
+            return client
+
+        def upload(ctx, i):
+            rows = '\n'.join(f'Imported {i}-{n},1 Road,NG,Lagos,100001,0800,imp{i}-{n}@bench.test,'
+                             for n in range(50))
+            header = 'clientName,addressLine1,country,state_or_province,postalCode,phoneNumber,emailAddress,taxNumber'
+            return {'kind': 'clients', 'dry_run': '1',
+                    'file': SimpleUploadedFile('clients.csv', f'{header}\n{rows}\n'.encode(), 'text/csv')}
+
+        def line_batch(ctx, i):
+            return json.dumps({'add': [{'title': f'Bench {n}', 'quantity': 2, 'price': 50, 'currency': 'USD'}
+                                       for n in range(5)]})
+
+        def one_client(ctx, i):
+            return {'client': ctx['client_slugs'][i % len(ctx['client_slugs'])]}
+
+        return [
+            Endpoint('login', lambda ctx, i: reverse('login'), user=None),
+            Endpoint('login', lambda ctx, i: reverse('login'), method='post', user=None, status=302,
+                     data=lambda ctx, i: {'username': 'bench', 'password': 'bench-password'}),
+            Endpoint('logout', lambda ctx, i: reverse('logout'), setup=logged_in, status=302),
+            Endpoint('dashboard', lambda ctx, i: reverse('dashboard')),
+            Endpoint('invoices', lambda ctx, i: reverse('invoices')),
+            Endpoint('products', lambda ctx, i: reverse('products')),
+            Endpoint('clients', lambda ctx, i: reverse('clients')),
+            Endpoint('clients', lambda ctx, i: reverse('clients'), method='post', status=302,
+                     data=lambda ctx, i: {'clientName': f'New client {i}', 'emailAddress': f'new{i}@bench.test'}),
+            Endpoint('import-records', lambda ctx, i: reverse('import-records'), method='post', data=upload,
+                     status=302),
+            Endpoint('client-autocomplete', lambda ctx, i: reverse('client-autocomplete'),
+                     data=lambda ctx, i: {'q': f'client {i}'}),
+            Endpoint('search', lambda ctx, i: reverse('search'), data=lambda ctx, i: {'q': f'invoice {i}'}),
+            Endpoint('create-invoice', lambda ctx, i: reverse('create-invoice'), status=302),
+            Endpoint('create-build-invoice', invoice('create-build-invoice')),
+            Endpoint('create-build-invoice', invoice('create-build-invoice'), method='post', status=302,
+                     data=lambda ctx, i: {'title': 'Bench', 'quantity': 1, 'price': 10, 'currency': 'USD'}),
+            Endpoint('invoice-lines', invoice('invoice-lines'), method='post', data=line_batch,
+                     content_type='application/json'),
+            Endpoint('delete-invoice', lambda ctx, i: reverse('delete-invoice', args=[ctx['fresh']]),
+                     setup=fresh_invoice, status=302),
+            Endpoint('view-pdf-invoice', invoice('view-pdf-invoice')),
+            Endpoint('view-document-invoice', invoice('view-document-invoice')),
+            Endpoint('email-document-invoice', invoice('email-document-invoice'), status=302),
+            Endpoint('view-document-invoice-async', invoice('view-document-invoice-async')),
+            Endpoint('email-document-invoice-async', invoice('email-document-invoice-async'), status=302),
+            Endpoint('export-invoices-zip', lambda ctx, i: reverse('export-invoices-zip'), data=one_client),
+            Endpoint('export-invoices-csv', lambda ctx, i: reverse('export-invoices-csv')),
+            Endpoint('export-invoices-jsonl', lambda ctx, i: reverse('export-invoices-jsonl')),
+            Endpoint('api-invoices', lambda ctx, i: reverse('api-invoices'), data=lambda ctx, i: {'include': 'products'}),
+            Endpoint('api-invoice', invoice('api-invoice')),
+            Endpoint('api-clients', lambda ctx, i: reverse('api-clients')),
+            Endpoint('api-client', lambda ctx, i: reverse('api-client', args=[ctx['client_slugs'][i % len(ctx['client_slugs'])]])),
+            Endpoint('api-products', lambda ctx, i: reverse('api-products')),
+            Endpoint('api-product', lambda ctx, i: reverse('api-product', args=[ctx['products'][i % len(ctx['products'])]])),
+            Endpoint('metrics', lambda ctx, i: reverse('metrics'), user='staff'),
+            Endpoint('company-settings', lambda ctx, i: reverse('company-settings')),
+        ]
+
+    def measure(self, endpoint, ctx, options):
+        gc.collect()  # the previous endpoint's garbage is not this one's cost
+        client = TestClient()
+        if endpoint.user:
+            client.force_login(ctx[endpoint.user])
+        latencies, errors, queries = [], [], None
+        for i in range(options['warmup'] + options['iterations']):
+            request_client = (endpoint.setup(ctx, i) if endpoint.setup else None) or client
+            path = endpoint.path(ctx, i)
+            data = endpoint.data(ctx, i) if endpoint.data else None
+            kwargs = {'content_type': endpoint.content_type} if endpoint.content_type else {}
+            if i == 0:
+                with CaptureQueriesContext(connection) as captured:
+                    response = self.request(request_client, endpoint, path, data, kwargs)
+                queries = len(captured)
+            else:
+                started = time.perf_counter()
+                response = self.request(request_client, endpoint, path, data, kwargs)
+                if i >= options['warmup']:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != endpoint.status:
+                errors.append(f'{endpoint.method.upper()} {path}: {response.status_code}')
+
+        total = sum(latencies)
+        return {
+            'requests': len(latencies),
+            'p50_ms': _percentile(latencies, 50),
+            'p95_ms': _percentile(latencies, 95),
+            'p99_ms': _percentile(latencies, 99),
+            'mean_ms': total / len(latencies) if latencies else 0.0,
+            'rps': len(latencies) / (total / 1000) if total else 0.0,
+            'queries': queries,
+            'errors': len(errors),
+            'first_errors': errors[:3],
+        }
+
+    def request(self, client, endpoint, path, data, kwargs):
+        response = getattr(client, endpoint.method)(path, data, **kwargs)
+        if response.streaming:
+            # the body is produced as it is read: that is part of the request
+            b''.join(response.streaming_content)
+        return response
+
+    def report_line(self, key, result):
+        self.stdout.write(f'   {key:<36}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                          f'{result["p99_ms"]:>9.2f}{result["rps"]:>9.0f}{result["queries"]:>9}'
+                          + (f'  {result["errors"]} errors' if result['errors'] else ''))
+
+    def compare(self, run, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        volumes = ('invoices', 'clients', 'lines', 'database')
+        if any(baseline['meta'].get(key) != run['meta'][key] for key in volumes):
+            self.stdout.write(self.style.WARNING('The baseline was run with different data ({}); comparing anyway'.format(
+                ', '.join(f'{key}={baseline["meta"].get(key)}' for key in volumes))))
+
+        metric = f'{options["metric"]}_ms'
+        drift = 1.0
+        if options['normalize']:
+            ratios = [result[metric] / baseline['endpoints'][key][metric] for key, result in run['endpoints'].items()
+                      if baseline['endpoints'].get(key, {}).get(metric)]
+            drift = statistics.median(ratios) if ratios else 1.0
+            self.stdout.write(f'Run-wide drift against the baseline: {(drift - 1) * 100:+.0f}% (divided out)')
+        regressions = []
+        self.stdout.write(f'\n{"endpoint":<36}{"base " + options["metric"]:>10}{options["metric"]:>10}'
+                          f'{"change":>9}{"queries":>12}')
+        for key, result in run['endpoints'].items():
+            before = baseline['endpoints'].get(key)
+            if before is None:
+                self.stdout.write(f'{key:<36}{"-":>10}{result[metric]:>10.2f}{"new":>9}{result["queries"]:>12}')
+                continue
+            expected = before[metric] * drift
+            change = (result[metric] / expected - 1) * 100 if expected else 0.0
+            slower = change > options['threshold'] and result[metric] - expected > options['min_delta_ms']
+            more_queries = (result['queries'] or 0) > (before['queries'] or 0)
+            if slower or more_queries:
+                regressions.append(key)
+            line = (f'{key:<36}{before[metric]:>10.2f}{result[metric]:>10.2f}{change:>+8.0f}%'
+                    f'{before["queries"]:>6} ->{result["queries"]:>3}')
+            self.stdout.write(self.style.ERROR(line) if slower or more_queries else line)
+
+        if regressions:
+            raise CommandError('{} endpoint(s) regressed against {}: {}'.format(
+                len(regressions), options['baseline'], ', '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS(f'✓ No regressions against {options["baseline"]} '
+                                             f'(threshold {options["threshold"]:.0f}% {options["metric"]})'))
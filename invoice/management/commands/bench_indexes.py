@@ -0,0 +1,164 @@
+"""
+Seed a throwaway database with a large synthetic dataset and compare query
+plans and latencies of the invoice access paths without and with the
+Invoice indexes. Runs against a test database on whichever engine
+DATABASES['default'] points at (SQLite or PostgreSQL); real data is never touched.
+Usage: python manage.py bench_indexes [--invoices 50000] [--clients 500] [--repeat 20] [--json out.json]
+"""
+
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from invoice.models import Client, Invoice, Product
+from invoice.pagination import keyset_filter
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the invoice query paths with and without the Invoice indexes on a seeded test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=50000, help='Invoices to seed')
+        parser.add_argument('--clients', type=int, default=500, help='Clients to seed')
+        parser.add_argument('--lines', type=int, default=3, help='Line items per invoice')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for reproducible datasets')
+        parser.add_argument('--json', type=str, help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=max(0, verbosity - 1), autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f'Seeding {options["invoices"]} invoices on {connection.vendor}...')
+            started = time.perf_counter()
+            probes = self.seed(options)
+            self.stdout.write(f'   seeded in {time.perf_counter() - started:.1f}s')
+
+            queries = self.queries(probes)
+            indexes = list(Invoice._meta.indexes)
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(Invoice, index)
+            self.analyze()
+            before = self.measure(queries, options['repeat'])
+
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Invoice, index)
+            self.analyze()
+            after = self.measure(queries, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=max(0, verbosity - 1))
+
+        self.report(before, after)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump({'vendor': connection.vendor, 'invoices': options['invoices'],
+                           'before': before, 'after': after}, f, indent=2)
+            self.stdout.write(f'   results written to {options["json"]}')
+
+    # --- helper: synthetic dataset (bulk inserts, so no signals or save() hooks) ---
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        today = date.today()
+
+        Client.objects.bulk_create([
+            Client(clientName=f'Client {i}', uniqueId=f'c{i}', slug=f'client-{i}', date_created=now, last_updated=now)
+            for i in range(options['clients'])
+        ], batch_size=1000)
+        client_ids = list(Client.objects.values_list('id', flat=True))
+
+        statuses = [value for value, _label in Invoice.STATUS]
+        batch = []
+        for i in range(options['invoices']):
+            created = now - timedelta(seconds=rng.randrange(0, 2 * 365 * 86400))
+            batch.append(Invoice(
+                title=f'Invoice {i}', number=f'INV-{i:07d}', status=rng.choice(statuses),
+                dueDate=today + timedelta(days=rng.randrange(-365, 60)), client_id=rng.choice(client_ids),
+                uniqueId=f'i{i}', slug=f'inv-{i}', date_created=created, last_updated=created,
+            ))
+            if len(batch) == 2000:
+                Invoice.objects.bulk_create(batch)
+                batch = []
+        Invoice.objects.bulk_create(batch)
+
+        invoice_ids = list(Invoice.objects.values_list('id', flat=True))
+        batch = []
+        for invoice_id in invoice_ids:
+            for j in range(options['lines']):
+                batch.append(Product(title='Item', quantity=rng.randrange(1, 10), price=rng.randrange(100, 10000),
+                                     invoice_id=invoice_id, uniqueId=f'p{invoice_id}-{j}', slug=f'p-{invoice_id}-{j}',
+                                     date_created=now, last_updated=now))
+            if len(batch) >= 6000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+
+        middle = Invoice.objects.order_by('-date_created', '-id')[len(invoice_ids) // 2]
+        return {
+            'number': f'INV-{rng.randrange(options["invoices"]):07d}',
+            'client_id': rng.choice(client_ids),
+            'invoice_id': rng.choice(invoice_ids),
+            'cursor': (middle.date_created, middle.id),
+            'today': today,
+        }
+
+    def queries(self, probes):
+        created, pk = probes['cursor']
+        return {
+            # createInvoice / lookups by invoice number
+            'number lookup': lambda: Invoice.objects.filter(number=probes['number']),
+            # overdue sweep: unpaid invoices past their due date
+            'status + due date': lambda: Invoice.objects.filter(status='CURRENT', dueDate__lt=probes['today'])
+            .values_list('id', flat=True),
+            # per-client history, newest first
+            'client, newest first': lambda: Invoice.objects.filter(client_id=probes['client_id'])
+            .order_by('-date_created')[:50],
+            # invoice list, first page and a deep keyset page
+            'list first page': lambda: Invoice.objects.order_by('-date_created', '-id')[:50],
+            'list deep page': lambda: Invoice.objects.filter(keyset_filter(['date_created', 'id'], [created, pk]))
+            .order_by('-date_created', '-id')[:50],
+            # build/PDF views: line items of one invoice
+            'invoice line items': lambda: Product.objects.filter(invoice_id=probes['invoice_id']),
+        }
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            plan = build().explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'plan': plan,
+                'median_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(sorted(timings)[max(0, int(len(timings) * 0.95) - 1)], 3),
+            }
+        return results
+
+    def report(self, before, after):
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 70))
+        self.stdout.write(f'{"query":<24}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+        for name in before:
+            b, a = before[name]['median_ms'], after[name]['median_ms']
+            speedup = f'{b / a:.1f}x' if a else '-'
+            self.stdout.write(f'{name:<24}{b:>12.3f}{a:>12.3f}{speedup:>10}')
+        for name in before:
+            self.stdout.write(f'\n{name}')
+            self.stdout.write('   before: ' + before[name]['plan'].replace('\n', '\n           '))
+            self.stdout.write('   after:  ' + after[name]['plan'].replace('\n', '\n           '))
+        self.stdout.write(self.style.SUCCESS('\n✓ Index benchmark complete'))
@@ -0,0 +1,93 @@
+"""
+Compare throughput and memory of the invoice PDF renderers.
+Usage: python manage.py bench_pdf_renderers --iterations 20 --lines 30
+"""
+
+import json
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from invoice.models import BankDetail, Client, Invoice, Product, Settings
+from invoice.pdf import PDFRenderError
+from invoice.renderers import RENDERERS, get_renderer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the configured PDF renderers (pdfkit vs reportlab) on a synthetic invoice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Renders per engine')
+        parser.add_argument('--lines', type=int, default=30, help='Line items on the synthetic invoice')
+        parser.add_argument('--engines', nargs='+', default=list(RENDERERS), help='Renderers to compare')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def build_context(self, lines):
+        # unsaved instances: the benchmark never touches the database
+        p_settings = Settings(companyName='Bench Ltd', addressLine1='1 Bench Street', country='NG',
+                              emailAddress='billing@bench.test', phoneNumber='+2340000000', taxNumber='TAX-1')
+        client = Client(clientName='Bench Client', addressLine1='2 Client Road', country='GB',
+                        emailAddress='client@bench.test', phoneNumber='+440000000')
+        invoice = Invoice(number='INV-BENCH', title='Benchmark', client=client, dueDate=timezone.now().date(),
+                          date_created=timezone.now(), uniqueId='bench', notes='Thank you\nPayment within 14 days')
+        products = [Product(title=f'Item {i}', description='Consulting', quantity=i % 5 + 1,
+                            price=100.0 + i, currency='NGN') for i in range(lines)]
+        banks = {c.lower(): BankDetail(bank_name='Bench Bank', account_name='Bench Ltd',
+                                       account_number='0123456789', currency=c) for c in ('NGN', 'USD', 'GBP')}
+        return {
+            'invoice': invoice,
+            'products': products,
+            'p_settings': p_settings,
+            'bank_detail': banks,
+            'invoiceTotal': "{:.2f}".format(sum(p.quantity * p.price for p in products)),
+        }
+
+    def bench(self, renderer, context, iterations):
+        options = {'encoding': 'UTF-8', 'enable-local-file-access': None, 'page-size': 'A4'}
+        renderer.render(context, options)  # warm up
+
+        started = time.perf_counter()
+        size = 0
+        for _ in range(iterations):
+            size = len(renderer.render(context, options))
+        elapsed = time.perf_counter() - started
+
+        # memory is measured on a separate render: tracing skews the timings
+        tracemalloc.start()
+        renderer.render(context, options)
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'engine': renderer.name,
+            'iterations': iterations,
+            'seconds': round(elapsed, 3),
+            'renders_per_sec': round(iterations / elapsed, 2),
+            'ms_per_render': round(elapsed * 1000 / iterations, 1),
+            'python_peak_kb': peak // 1024,
+            'child_max_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            'pdf_bytes': size,
+        }
+
+    def handle(self, *args, **options):
+        context = self.build_context(options['lines'])
+        results = []
+        for name in options['engines']:
+            try:
+                results.append(self.bench(get_renderer(name), context, options['iterations']))
+            except PDFRenderError as e:
+                self.stdout.write(self.style.WARNING(f'Skipping {name}: {e}'))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{options['lines']} line items, {options['iterations']} renders per engine\n")
+        self.stdout.write(f"{'engine':<12}{'renders/s':>12}{'ms/render':>12}{'py peak KB':>12}"
+                          f"{'child RSS KB':>14}{'PDF bytes':>12}")
+        for r in results:
+            self.stdout.write(f"{r['engine']:<12}{r['renders_per_sec']:>12}{r['ms_per_render']:>12}"
+                              f"{r['python_peak_kb']:>12}{r['child_max_rss_kb']:>14}{r['pdf_bytes']:>12}")
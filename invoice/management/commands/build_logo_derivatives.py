@@ -0,0 +1,36 @@
+"""
+Build the resized logo derivatives for existing clients and company settings.
+They are otherwise built on first use; this moves that cost out of the first requests.
+Usage: python manage.py build_logo_derivatives
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoice.images import DERIVATIVES, build_derivatives
+from invoice.models import Client, Settings
+
+
+class Command(BaseCommand):
+    help = 'Create the print and web derivatives of every uploaded client and company logo'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        logos = [row.companyLogo for row in Settings.objects.only('id', 'companyLogo')]
+        logos += [row.clientLogo for row in Client.objects.only('id', 'clientLogo')]
+
+        built = failed = 0
+        # clients often share the default logo; build each file once
+        unique = {logo.name: logo for logo in logos if logo}
+        for name, logo in sorted(unique.items()):
+            results = build_derivatives(logo)
+            if all(results.values()):
+                built += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'   {name}: could not be read as an image'))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Logos processed in {elapsed:.2f}s: {built} with {len(DERIVATIVES)} derivatives each, {failed} failed'))
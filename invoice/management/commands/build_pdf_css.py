@@ -0,0 +1,309 @@
+"""
+Compile the Tailwind utility classes used by the invoice document templates
+into a static, minified stylesheet, so PDFs render without the Tailwind CDN.
+Usage: python manage.py build_pdf_css [--check]
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+TEMPLATES = [
+    'invoice/pdf-template.html',
+    'invoice/invoice-template.html',
+]
+OUTPUT = os.path.join('assets', 'css', 'invoice-pdf.min.css')
+
+# classes defined by the templates' own <style> blocks, or not Tailwind utilities
+IGNORED = {'avoid-break', 'no-print', 'num', 'grid-row'}
+
+PALETTE = {
+    'black': '#000000',
+    'white': '#ffffff',
+    'brand-black': '#0a0a0a',
+    'brand-panel': '#0d1117',
+    'brand-ink': '#e5e7eb',
+}
+_SHADES = {
+    'slate': ['#f8fafc', '#f1f5f9', '#e2e8f0', '#cbd5e1', '#94a3b8', '#64748b',
+              '#475569', '#334155', '#1e293b', '#0f172a', '#020617'],
+    'emerald': ['#ecfdf5', '#d1fae5', '#a7f3d0', '#6ee7b7', '#34d399', '#10b981',
+                '#059669', '#047857', '#065f46', '#064e3b', '#022c22'],
+    'blue': ['#eff6ff', '#dbeafe', '#bfdbfe', '#93c5fd', '#60a5fa', '#3b82f6',
+             '#2563eb', '#1d4ed8', '#1e40af', '#1e3a8a', '#172554'],
+    'fuchsia': ['#fdf4ff', '#fae8ff', '#f5d0fe', '#f0abfc', '#e879f9', '#d946ef',
+                '#c026d3', '#a21caf', '#86198f', '#701a75', '#4a044e'],
+}
+for _name, _values in _SHADES.items():
+    for _shade, _hex in zip([50, 100, 200, 300, 400, 500, 600, 700, 800, 900, 950], _values):
+        PALETTE[f'{_name}-{_shade}'] = _hex
+
+SCREENS = {'sm': '640px', 'md': '768px', 'lg': '1024px'}
+PSEUDO = {'hover': ':hover', 'focus': ':focus', 'odd': ':nth-child(odd)', 'even': ':nth-child(even)'}
+
+FONT_SIZES = {
+    'xs': ('0.75rem', '1rem'),
+    'sm': ('0.875rem', '1.25rem'),
+    'base': ('1rem', '1.5rem'),
+    'lg': ('1.125rem', '1.75rem'),
+    'xl': ('1.25rem', '1.75rem'),
+    '2xl': ('1.5rem', '2rem'),
+}
+MAX_WIDTHS = {'xl': '36rem', '2xl': '42rem', '3xl': '48rem', '4xl': '56rem', '5xl': '64rem'}
+RADII = {'': '0.25rem', 'md': '0.375rem', 'lg': '0.5rem', 'xl': '0.75rem', '2xl': '1rem', 'full': '9999px'}
+
+STATIC = {
+    'block': 'display:block',
+    'inline-block': 'display:inline-block',
+    'flex': 'display:-webkit-box;display:-webkit-flex;display:flex',
+    'inline-flex': 'display:-webkit-inline-box;display:-webkit-inline-flex;display:inline-flex',
+    'grid': 'display:grid',
+    'flex-wrap': '-webkit-flex-wrap:wrap;flex-wrap:wrap',
+    'items-center': '-webkit-box-align:center;-webkit-align-items:center;align-items:center',
+    'items-start': '-webkit-box-align:start;-webkit-align-items:flex-start;align-items:flex-start',
+    'justify-between': '-webkit-box-pack:justify;-webkit-justify-content:space-between;justify-content:space-between',
+    'align-top': 'vertical-align:top',
+    'overflow-hidden': 'overflow:hidden',
+    'object-contain': 'object-fit:contain',
+    'sticky': 'position:-webkit-sticky;position:sticky',
+    'top-0': 'top:0px',
+    'z-10': 'z-index:10',
+    'border': 'border-width:1px',
+    'border-t': 'border-top-width:1px',
+    'border-b': 'border-bottom-width:1px',
+    'border-collapse': 'border-collapse:collapse',
+    'mx-auto': 'margin-left:auto;margin-right:auto',
+    'w-auto': 'width:auto',
+    'w-full': 'width:100%',
+    'text-left': 'text-align:left',
+    'text-right': 'text-align:right',
+    'uppercase': 'text-transform:uppercase',
+    'whitespace-nowrap': 'white-space:nowrap',
+    'whitespace-pre-line': 'white-space:pre-line',
+    'font-medium': 'font-weight:500',
+    'font-semibold': 'font-weight:600',
+    'font-bold': 'font-weight:700',
+    'font-mono': 'font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,"Liberation Mono","Courier New",monospace',
+    'tracking-tight': 'letter-spacing:-0.025em',
+    'tracking-wider': 'letter-spacing:0.05em',
+    'leading-6': 'line-height:1.5rem',
+    'list-disc': 'list-style-type:disc',
+    'list-inside': 'list-style-position:inside',
+    'antialiased': '-webkit-font-smoothing:antialiased;-moz-osx-font-smoothing:grayscale',
+    'backdrop-blur': '-webkit-backdrop-filter:blur(8px);backdrop-filter:blur(8px)',
+    'shadow-sm': 'box-shadow:0 1px 2px 0 rgba(0,0,0,0.05)',
+    'shadow-lg': 'box-shadow:0 10px 15px -3px rgba(0,0,0,0.1),0 4px 6px -4px rgba(0,0,0,0.1)',
+    'outline-none': 'outline:2px solid transparent;outline-offset:2px',
+    'divide-y': ('> :not([hidden]) ~ :not([hidden])', 'border-top-width:1px;border-bottom-width:0px'),
+}
+
+SPACING_PROPS = {
+    'p': ['padding'], 'px': ['padding-left', 'padding-right'], 'py': ['padding-top', 'padding-bottom'],
+    'pt': ['padding-top'], 'pb': ['padding-bottom'],
+    'm': ['margin'], 'mx': ['margin-left', 'margin-right'], 'my': ['margin-top', 'margin-bottom'],
+    'mt': ['margin-top'], 'mb': ['margin-bottom'],
+    'gap': ['gap'], 'h': ['height'], 'w': ['width'],
+}
+
+PREFLIGHT = (
+    '*,::before,::after{box-sizing:border-box;border:0 solid #e5e7eb}'
+    'html{line-height:1.5;-webkit-text-size-adjust:100%;'
+    'font-family:ui-sans-serif,system-ui,-apple-system,"Segoe UI",Roboto,"Helvetica Neue",Arial,sans-serif}'
+    'body{margin:0;line-height:inherit}'
+    'h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}'
+    'h1,h2,h3,h4,h5,h6,p,dl,dd,figure,blockquote{margin:0}'
+    'ol,ul{list-style:none;margin:0;padding:0}'
+    'table{text-indent:0;border-color:inherit;border-collapse:collapse}'
+    'th{text-align:inherit}'
+    'img,svg{display:block;vertical-align:middle}'
+    'img{max-width:100%;height:auto}'
+    'button{font-family:inherit;font-size:100%;line-height:inherit;color:inherit;margin:0;padding:0;'
+    'background-color:transparent;background-image:none;cursor:pointer}'
+)
+
+
+def spacing(value):
+    if value == '0':
+        return '0px'
+    try:
+        return f"{float(value) * 0.25:g}rem"
+    except ValueError:
+        return None
+
+
+def color(value):
+    """'emerald-900/40' -> 'rgba(6,78,59,0.4)' (rgba keeps old WebKit happy)."""
+    name, _, alpha = value.partition('/')
+    hexcode = PALETTE.get(name)
+    if hexcode is None:
+        return None
+    if not alpha:
+        return hexcode
+    r, g, b = (int(hexcode[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r},{g},{b},{int(alpha) / 100:g})"
+
+
+def declarations(utility):
+    """
+    Return (selector suffix, declarations) for a bare utility (no variants),
+    or None when it is not supported.
+    """
+    if utility in STATIC:
+        rule = STATIC[utility]
+        return rule if isinstance(rule, tuple) else ('', rule)
+
+    m = re.fullmatch(r'(p|px|py|pt|pb|m|mx|my|mt|mb|gap|h|w)-(\d+(?:\.5)?)', utility)
+    if m:
+        size = spacing(m.group(2))
+        return '', ';'.join(f'{prop}:{size}' for prop in SPACING_PROPS[m.group(1)])
+
+    m = re.fullmatch(r'space-y-(\d+(?:\.5)?)', utility)
+    if m:
+        return '> :not([hidden]) ~ :not([hidden])', f'margin-top:{spacing(m.group(1))}'
+
+    m = re.fullmatch(r'grid-cols-(\d+)', utility)
+    if m:
+        return '', f'grid-template-columns:repeat({m.group(1)},minmax(0,1fr))'
+
+    m = re.fullmatch(r'max-w-(\w+)', utility)
+    if m and m.group(1) in MAX_WIDTHS:
+        return '', f'max-width:{MAX_WIDTHS[m.group(1)]}'
+
+    m = re.fullmatch(r'rounded(?:-(\w+))?', utility)
+    if m and (m.group(1) or '') in RADII:
+        return '', f'border-radius:{RADII[m.group(1) or ""]}'
+
+    m = re.fullmatch(r'text-\[(\d+px)\]', utility)
+    if m:
+        return '', f'font-size:{m.group(1)}'
+
+    m = re.fullmatch(r'text-(\w+)', utility)
+    if m and m.group(1) in FONT_SIZES:
+        size, leading = FONT_SIZES[m.group(1)]
+        return '', f'font-size:{size};line-height:{leading}'
+
+    m = re.fullmatch(r'ring-(\d)', utility)
+    if m:
+        return '', (f'box-shadow:0 0 0 {m.group(1)}px var(--tw-ring-color,rgba(59,130,246,0.5))')
+
+    m = re.fullmatch(r'(text|bg|border|divide|ring)-(.+)', utility)
+    if m:
+        value = color(m.group(2))
+        if value is None:
+            return None
+        kind = m.group(1)
+        if kind == 'text':
+            return '', f'color:{value}'
+        if kind == 'bg':
+            return '', f'background-color:{value}'
+        if kind == 'border':
+            return '', f'border-color:{value}'
+        if kind == 'ring':
+            return '', f'--tw-ring-color:{value}'
+        return '> :not([hidden]) ~ :not([hidden])', f'border-color:{value}'
+
+    return None
+
+
+def escape_class(name):
+    return re.sub(r'([^a-zA-Z0-9_-])', r'\\\1', name)
+
+
+def compile_class(name):
+    """Return (media query or '', css rule) for a class, or None if unsupported."""
+    *variants, utility = name.split(':')
+    decl = declarations(utility)
+    if decl is None:
+        return None
+    suffix, body = decl
+
+    media = ''
+    pseudo = ''
+    for variant in variants:
+        if variant in SCREENS:
+            media = SCREENS[variant]
+        elif variant in PSEUDO:
+            pseudo += PSEUDO[variant]
+        else:
+            return None
+
+    selector = f'.{escape_class(name)}{pseudo}'
+    if suffix:
+        selector = f'{selector} {suffix}'
+    return media, f'{selector}{{{body}}}'
+
+
+def collect_classes(sources):
+    classes = []
+    seen = set()
+    for source in sources:
+        for attr in re.finditer(r'class="([^"]*)"', source):
+            for name in attr.group(1).split():
+                if '{' in name or '%' in name or name in seen:
+                    continue
+                seen.add(name)
+                classes.append(name)
+    return classes
+
+
+def build_stylesheet(classes):
+    """Preflight, then base utilities, then each breakpoint in ascending order."""
+    base, screens, unsupported = [], {}, []
+    # shorthands first so e.g. px-6 still wins over p-4, as in Tailwind's own ordering
+    shorthand = re.compile(r'^(?:\w+:)*(?:p|m|border|rounded)(?:-[\d.]+)?$')
+    classes = sorted(classes, key=lambda name: 0 if shorthand.match(name) else 1)
+    for name in classes:
+        if name.split(':')[-1] in IGNORED:
+            continue
+        compiled = compile_class(name)
+        if compiled is None:
+            unsupported.append(name)
+            continue
+        media, rule = compiled
+        (screens.setdefault(media, []) if media else base).append(rule)
+
+    css = [PREFLIGHT] + base
+    for width in sorted(screens, key=lambda w: int(w[:-2])):
+        css.append(f'@media (min-width:{width}){{{"".join(screens[width])}}}')
+    return ''.join(css) + '\n', unsupported
+
+
+class Command(BaseCommand):
+    help = 'Build the offline stylesheet used by the invoice PDF templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if the committed stylesheet is out of date instead of writing it')
+
+    def handle(self, *args, **options):
+        template_dir = settings.TEMPLATES[0]['DIRS'][0]
+        sources = []
+        for name in TEMPLATES:
+            with open(os.path.join(template_dir, name), encoding='utf-8') as f:
+                sources.append(f.read())
+
+        classes = collect_classes(sources)
+        css, unsupported = build_stylesheet(classes)
+        for name in unsupported:
+            self.stdout.write(self.style.WARNING(f'Unsupported utility class skipped: {name}'))
+
+        output = os.path.join(settings.STATICFILES_DIRS[0], OUTPUT)
+        if options['check']:
+            try:
+                with open(output, encoding='utf-8') as f:
+                    current = f.read()
+            except FileNotFoundError:
+                current = None
+            if current != css:
+                raise CommandError(f'{output} is out of date, run: python manage.py build_pdf_css')
+            self.stdout.write(self.style.SUCCESS(f'✓ {output} is up to date'))
+            return
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(css)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(classes)} classes from {len(TEMPLATES)} templates → {output} ({len(css)} bytes)'))
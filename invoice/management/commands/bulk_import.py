@@ -0,0 +1,41 @@
+"""
+Import clients or invoice line items from a CSV or XLSX file in batches.
+Line items name their invoice by number in an "invoice" column.
+Usage: python manage.py bulk_import clients|products <file> [--dry-run] [--batch-size 2000] [--errors errors.csv]
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice.imports import COLUMNS, import_records
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import clients or line items from CSV/XLSX, with validation and an error report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(COLUMNS), help='What the rows are')
+        parser.add_argument('path', type=str, help='CSV or XLSX file with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows validated and inserted per batch')
+        parser.add_argument('--errors', type=str, help='Write rejected rows here (default: <file>.errors.csv)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        report_path = options['errors'] or os.path.splitext(path)[0] + '.errors.csv'
+        try:
+            with open(path, 'rb') as f, open(report_path, 'w', newline='', encoding='utf-8') as report:
+                result = import_records(f, path, options['kind'], dry_run=options['dry_run'],
+                                        batch_size=options['batch_size'], error_report=report)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if not result.errors:
+            os.remove(report_path)
+        verb = 'would import' if result.dry_run else 'imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {result.rows} rows in {result.seconds:.2f}s ({result.rows_per_second:,.0f} rows/s): '
+            f'{verb} {result.created} {result.kind}, {result.errors} rejected'))
+        if result.errors:
+            self.stdout.write(f'   Rejected rows: {report_path}')
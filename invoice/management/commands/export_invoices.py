@@ -0,0 +1,59 @@
+"""
+Stream a filtered set of invoices, with client details and totals, as CSV or JSON Lines.
+Usage: python manage.py export_invoices --format jsonl --created-from 2026-01-01 --columns number,client,total --output 2026.jsonl
+"""
+
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice.exports import EXPORT_COLUMNS, EXPORT_FORMATS, export_columns, iter_invoice_rows
+from invoice.filters import filter_invoices
+
+
+class Command(BaseCommand):
+    help = 'Export invoices, selected by status, date range or client, as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help='Output format')
+        parser.add_argument('--columns', type=str,
+                            help='Comma-separated columns, from: {}'.format(', '.join(EXPORT_COLUMNS)))
+        parser.add_argument('--status', nargs='+', help='Invoice statuses to include')
+        parser.add_argument('--due-from', type=str, help='Earliest due date (YYYY-MM-DD)')
+        parser.add_argument('--due-to', type=str, help='Latest due date (YYYY-MM-DD)')
+        parser.add_argument('--created-from', type=str, help='Earliest creation date (YYYY-MM-DD)')
+        parser.add_argument('--created-to', type=str, help='Latest creation date (YYYY-MM-DD)')
+        parser.add_argument('--client', type=str, help='Client id or slug')
+        parser.add_argument('--output', type=str, default='-', help='File to write; - for standard output')
+
+    def handle(self, *args, **options):
+        try:
+            columns = export_columns(options['columns'])
+            invoices = filter_invoices(status=options['status'], due_from=options['due_from'],
+                                       due_to=options['due_to'], created_from=options['created_from'],
+                                       created_to=options['created_to'], client=options['client'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except ValidationError:
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+
+        to_stdout = options['output'] == '-'
+        out = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        started = time.perf_counter()
+        size = 0
+        try:
+            for piece in iter_invoice_rows(invoices, columns, options['format']):
+                out.write(piece)
+                size += len(piece)
+        finally:
+            if to_stdout:
+                out.flush()
+            else:
+                out.close()
+        elapsed = time.perf_counter() - started
+
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Wrote {options["output"]} ({size / 1024:.0f} KiB) in {elapsed:.2f}s'))
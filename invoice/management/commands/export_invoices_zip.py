@@ -0,0 +1,44 @@
+"""
+Write the PDFs of a filtered set of invoices into one ZIP archive.
+Usage: python manage.py export_invoices_zip --due-from 2026-07-01 --due-to 2026-09-30 --output q3.zip
+"""
+
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice.exports import iter_invoice_zip
+from invoice.filters import filter_invoices
+
+
+class Command(BaseCommand):
+    help = 'Export invoice PDFs, selected by status, due date range or client, as a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='+', help='Invoice statuses to include')
+        parser.add_argument('--due-from', type=str, help='Earliest due date (YYYY-MM-DD)')
+        parser.add_argument('--due-to', type=str, help='Latest due date (YYYY-MM-DD)')
+        parser.add_argument('--client', type=str, help='Client id or slug')
+        parser.add_argument('--output', type=str, default='invoices.zip', help='Path of the ZIP file to write')
+
+    def handle(self, *args, **options):
+        try:
+            invoices = filter_invoices(status=options['status'], due_from=options['due_from'],
+                                       due_to=options['due_to'], client=options['client'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except ValidationError:
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+        count = invoices.count()
+        self.stdout.write(f'Exporting {count} invoices to {options["output"]}...')
+
+        started = time.perf_counter()
+        with open(options['output'], 'wb') as f:
+            for piece in iter_invoice_zip(invoices):
+                f.write(piece)
+        elapsed = time.perf_counter() - started
+
+        size = os.path.getsize(options['output'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {count} invoices ({size / 1024:.0f} KiB) in {elapsed:.2f}s'))
@@ -0,0 +1,173 @@
+"""
+Concurrent request-shaped load test of the configured database mode.
+Each thread loops over "requests": a list page, an invoice with its line
+items, and (for a share of them) a new invoice with a line item. Connections
+are recycled between requests as Django does, so the cost of connecting,
+or the pool's savings, shows up in the numbers.
+Runs against a throwaway test database; --compare re-runs itself under each mode.
+Usage: python manage.py load_test_db [--threads 8] [--seconds 10] [--write-ratio 0.3] [--compare]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.utils import timezone
+
+from invoice.models import Client, Invoice, Product
+from invoice.pagination import KeysetPaginator
+from invoice.sequences import create_invoice
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Load-test the database configuration (SQLite plain/tuned, PostgreSQL direct/pooled)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of the timed run')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of requests that create an invoice')
+        parser.add_argument('--seed-invoices', type=int, default=2000, help='Invoices in the dataset before the run')
+        parser.add_argument('--json', type=str, help='Write the result to this file')
+        parser.add_argument('--compare', action='store_true',
+                            help='Run once per mode available for this database and print a comparison')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(options)
+
+        result = self.run(options)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {result["mode"]}: {result["requests"]} requests in {result["seconds"]:.1f}s '
+            f'= {result["rps"]:.0f} req/s, p50 {result["p50_ms"]:.1f} ms, p95 {result["p95_ms"]:.1f} ms, '
+            f'{result["errors"]} errors'))
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(result, f, indent=2)
+
+    def mode(self):
+        engine = settings.DATABASES['default']['ENGINE']
+        if engine == 'invoicing.db.postgresql':
+            return 'postgresql pooled' if settings.DATABASES['default'].get('POOL') else 'postgresql direct'
+        if engine == 'invoicing.db.sqlite3':
+            return 'sqlite tuned'
+        return f'{connection.vendor} plain'
+
+    def run(self, options):
+        db = settings.DATABASES['default']
+        old_name = db['NAME']
+        if connection.vendor == 'sqlite':
+            # an on-disk file: the journal mode and fsync behaviour are what is being measured
+            db.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.mkdtemp(), 'load_test.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['seed_invoices'])
+            connections.close_all()
+            return self.hammer(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    # --- helper: baseline dataset (bulk inserts) ---
+    def seed(self, count):
+        now = timezone.now()
+        Client.objects.bulk_create([Client(clientName=f'Client {i}', uniqueId=f'c{i}', slug=f'client-{i}',
+                                           date_created=now, last_updated=now) for i in range(50)])
+        client_ids = list(Client.objects.values_list('id', flat=True))
+        Invoice.objects.bulk_create([
+            Invoice(number=f'SEED-{i}', client_id=client_ids[i % len(client_ids)], uniqueId=f'i{i}',
+                    slug=f'seed-{i}', date_created=now, last_updated=now) for i in range(count)
+        ], batch_size=1000)
+
+    def hammer(self, options):
+        invoice_ids = list(Invoice.objects.values_list('id', flat=True))
+        connections.close_all()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def worker(seed):
+            rng = random.Random(seed)
+            mine = []
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                close_old_connections()  # request_started
+                try:
+                    list(KeysetPaginator(Invoice.objects.select_related('client'), per_page=20).page())
+                    invoice = Invoice.objects.get(pk=rng.choice(invoice_ids))
+                    list(Product.objects.filter(invoice=invoice))
+                    if rng.random() < options['write_ratio']:
+                        new_invoice = create_invoice(client_id=invoice.client_id)
+                        Product.objects.create(title='Item', quantity=1, price=rng.randrange(100, 1000),
+                                               invoice=new_invoice)
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                finally:
+                    close_old_connections()  # request_finished
+                mine.append((time.perf_counter() - started) * 1000)
+            connections.close_all()
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'mode': self.mode(),
+            'threads': options['threads'],
+            'seconds': elapsed,
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed if elapsed else 0,
+            'p50_ms': _percentile(latencies, 50),
+            'p95_ms': _percentile(latencies, 95),
+            'errors': len(errors),
+            'first_errors': errors[:3],
+        }
+
+    def compare(self, options):
+        if settings.DATABASES['default']['ENGINE'] == 'invoicing.db.postgresql':
+            modes = {'postgresql direct': {'DATABASE_POOL_SIZE': '0'},
+                     'postgresql pooled': {'DATABASE_POOL_SIZE': str(max(options['threads'], 4))}}
+        else:
+            modes = {'sqlite plain': {'SQLITE_TUNED': '0'}, 'sqlite tuned': {'SQLITE_TUNED': '1'}}
+
+        results = []
+        for name, env in modes.items():
+            self.stdout.write(f'Running {name}...')
+            out = os.path.join(tempfile.mkdtemp(), 'result.json')
+            args = [sys.executable, sys.argv[0], 'load_test_db', '--threads', str(options['threads']),
+                    '--seconds', str(options['seconds']), '--write-ratio', str(options['write_ratio']),
+                    '--seed-invoices', str(options['seed_invoices']), '--json', out]
+            subprocess.run(args, env={**os.environ, **env}, check=True, stdout=subprocess.DEVNULL)
+            with open(out) as f:
+                results.append(json.load(f))
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 70))
+        self.stdout.write(f'{"mode":<20}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"errors":>10}')
+        for r in results:
+            self.stdout.write(f'{r["mode"]:<20}{r["rps"]:>10.0f}{r["p50_ms"]:>10.1f}{r["p95_ms"]:>10.1f}{r["errors"]:>10}')
+        base = results[0]['rps']
+        if base:
+            self.stdout.write(self.style.SUCCESS(f'✓ {results[-1]["mode"]} vs {results[0]["mode"]}: '
+                                                 f'{results[-1]["rps"] / base:.2f}x throughput'))
@@ -0,0 +1,182 @@
+"""
+Load test of the invoice PDF view, served the WSGI way (a pool of request
+threads, each held for the whole render) against the ASGI way (one event
+loop, viewDocumentInvoiceAsync, converters as asyncio subprocesses).
+wkhtmltopdf is replaced by a stand-in that takes --render-ms per document,
+so the numbers measure request handling rather than the converter; every
+request asks for a different invoice, so the PDF cache never answers.
+Runs against a throwaway test database.
+Usage: python manage.py load_test_pdf [--requests 64] [--concurrency 16] [--threads 4] [--render-ms 300]
+"""
+
+import asyncio
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client as TestClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from invoice import pdf, pdf_cache
+from invoice.models import Client, Invoice, Product, Settings
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI (sync view, request threads) and ASGI (async view, event loop) PDF throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=64, help='PDF requests per run')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clients requesting at once')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='WSGI request threads (a gunicorn gthread worker with --threads)')
+        parser.add_argument('--converters', type=int, default=8,
+                            help='Converters running at once, on both sides')
+        parser.add_argument('--render-ms', type=int, default=300, help='Time the stand-in converter takes per PDF')
+        parser.add_argument('--json', type=str, help='Write the results to this file')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp()
+        db = settings.DATABASES['default']
+        old_name = db['NAME']
+        if connection.vendor == 'sqlite':
+            # on disk, so the request threads and the ASGI sync thread share it
+            db.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'load_test.sqlite3')
+        overrides = {
+            'WKHTMLTOPDF_CMD': self.fake_converter(workdir, options['render_ms']),
+            'INVOICE_PDF_RENDERER': 'pdfkit',
+            'PDF_CACHE_DIR': os.path.join(workdir, 'pdf_cache'),
+            'COMPANY_SETTINGS_STAMP': os.path.join(workdir, '.company_settings_version'),
+            'PDF_RENDER_WORKERS': options['converters'],
+            'PDF_ASYNC_RENDER_LIMIT': options['converters'],
+            # everything waits its turn: rejected requests would flatter either side
+            'PDF_RENDER_QUEUE_SIZE': options['requests'],
+            'PDF_RENDER_SUBMIT_TIMEOUT': 600,
+            'ALLOWED_HOSTS': ['*'],
+        }
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                self.reset_render_state()
+                slugs = self.seed(options['requests'] * 2)
+                results = [
+                    self.run_wsgi(slugs[:options['requests']], options),
+                    self.run_asgi(slugs[options['requests']:], options),
+                ]
+                self.reset_render_state()
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 70))
+        self.stdout.write(f'{"server":<34}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"errors":>9}')
+        for r in results:
+            self.stdout.write(f'{r["server"]:<34}{r["rps"]:>9.1f}{r["p50_ms"]:>9.0f}{r["p95_ms"]:>9.0f}{r["errors"]:>9}')
+        wsgi, asgi = results
+        if wsgi['rps']:
+            self.stdout.write(self.style.SUCCESS(f'✓ ASGI vs WSGI: {asgi["rps"] / wsgi["rps"]:.2f}x throughput '
+                                                 f'at {options["concurrency"]} concurrent clients'))
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    # --- helper: stand-in wkhtmltopdf (reads the page, waits, writes a PDF) ---
+    def fake_converter(self, workdir, render_ms):
+        path = os.path.join(workdir, 'wkhtmltopdf')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\ncat > /dev/null\nsleep {:.3f}\nprintf "%%PDF-1.4 load test\\n"\n'.format(render_ms / 1000))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        return path
+
+    def reset_render_state(self):
+        # the converter pool, its configuration and the PDF cache are built from settings on first use
+        pdf._service = None
+        pdf._async_configuration = None
+        pdf_cache._cache = None
+
+    def seed(self, count):
+        Settings(companyName='Load Test Ltd', emailAddress='billing@load.test').save()
+        client = Client.objects.create(clientName='Load Test Client', emailAddress='client@load.test')
+        now = timezone.now()
+        Invoice.objects.bulk_create([
+            Invoice(number=f'LOAD-{i}', title='Load test', client=client, uniqueId=f'load{i}', slug=f'load-{i}',
+                    date_created=now, last_updated=now) for i in range(count)
+        ], batch_size=1000)
+        invoices = list(Invoice.objects.order_by('id'))
+        Product.objects.bulk_create([
+            Product(title='Item', quantity=1, price=100, currency='USD', invoice=invoice, uniqueId=f'p{invoice.pk}',
+                    slug=f'item-{invoice.pk}', date_created=now, last_updated=now) for invoice in invoices
+        ])
+        connections.close_all()
+        return [invoice.slug for invoice in invoices]
+
+    def summary(self, server, latencies, errors, elapsed):
+        return {
+            'server': server,
+            'seconds': elapsed,
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed if elapsed else 0,
+            'p50_ms': _percentile(latencies, 50),
+            'p95_ms': _percentile(latencies, 95),
+            'errors': len(errors),
+            'first_errors': errors[:3],
+        }
+
+    def run_wsgi(self, slugs, options):
+        self.stdout.write(f'WSGI: {len(slugs)} requests, {options["threads"]} request threads...')
+        latencies, errors = [], []
+
+        server_threads = threading.Semaphore(options['threads'])
+
+        def request(slug):
+            # a client waits for a free request thread, as in the server's backlog
+            started = time.perf_counter()
+            with server_threads:
+                response = TestClient().get(reverse('view-document-invoice', args=[slug]))
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200 or response['Content-Type'] != 'application/pdf':
+                errors.append(f'{slug}: {response.status_code}')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as clients:
+            list(clients.map(request, slugs))
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return self.summary(f'WSGI ({options["threads"]} threads)', latencies, errors, elapsed)
+
+    def run_asgi(self, slugs, options):
+        self.stdout.write(f'ASGI: {len(slugs)} requests, {options["concurrency"]} at once on one event loop...')
+        latencies, errors = [], []
+
+        async def request(client, slug, limit):
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(reverse('view-document-invoice-async', args=[slug]))
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200 or response['Content-Type'] != 'application/pdf':
+                    errors.append(f'{slug}: {response.status_code}')
+
+        async def run():
+            client, limit = AsyncClient(), asyncio.Semaphore(options['concurrency'])
+            await asyncio.gather(*(request(client, slug, limit) for slug in slugs))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return self.summary('ASGI (1 event loop)', latencies, errors, elapsed)
@@ -0,0 +1,24 @@
+"""
+Rebuild the full-text search index from the client, invoice and line item tables.
+Migration 0009 builds the index; run this whenever the index and the tables may have drifted.
+Usage: python manage.py rebuild_search_index [--chunk-size 2000]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoice.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the SearchDocument rows (and so the FTS index) for all clients, invoices and line items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows read and inserted per batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_index(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ Search index rebuilt: {written} documents in {elapsed:.2f}s'))
@@ -0,0 +1,40 @@
+"""
+Recount the dashboard statistics from the tables and repair any drift.
+Usage: python manage.py reconcile_stats [--dry-run] [--every 3600]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoice.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the StatCounter rows behind the dashboard with the invoice and client tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running, reconciling every N seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.reconcile(options['dry_run'])
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
+
+    def reconcile(self, dry_run):
+        started = time.perf_counter()
+        drift = reconcile_stats(dry_run=dry_run)
+        elapsed = time.perf_counter() - started
+
+        for (metric, status, currency), have, want in drift:
+            bucket = ' '.join(part for part in (metric, status, currency) if part)
+            self.stdout.write(f'   {bucket}: stored {have[0]} / {have[1]}, actual {want[0]} / {want[1]}')
+        verb = 'found' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'✓ Stats reconciled in {elapsed:.2f}s: {verb} {len(drift)} drifted counters'))
@@ -0,0 +1,156 @@
+"""
+Render and email a batch of invoices: PDFs in a process pool, delivery over a
+few reused SMTP connections, with a resumable checkpoint.
+Usage: python manage.py run_invoice_batch --status CURRENT --due-to 2026-01-31 --run-name jan-2026
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection as db_connection, connections
+from django.utils import timezone
+
+from invoice.batch import Checkpoint, RateLimiter, init_render_worker, render_invoice_file
+from invoice.filters import filter_invoices
+from invoice.functions import buildInvoiceEmail
+from invoice.mailer import mark_invoice_sent
+from invoice.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = 'Render and email invoices in bulk, selected by status, due date range or client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='+', default=['CURRENT'], help='Invoice statuses to include')
+        parser.add_argument('--due-from', type=str, help='Earliest due date (YYYY-MM-DD)')
+        parser.add_argument('--due-to', type=str, help='Latest due date (YYYY-MM-DD)')
+        parser.add_argument('--client', type=str, help='Client id or slug')
+        parser.add_argument('--run-name', type=str, default=None,
+                            help='Checkpoint name; re-use it to resume an interrupted run')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Render processes')
+        parser.add_argument('--connections', type=int, default=2, help='Concurrent SMTP connections')
+        parser.add_argument('--rate', type=float, default=0, help='Max messages per second (0 = unlimited)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be processed')
+
+    def handle(self, *args, **options):
+        try:
+            invoices = filter_invoices(status=options['status'], due_from=options['due_from'],
+                                       due_to=options['due_to'], client=options['client'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except ValidationError:
+            raise CommandError('Dates must be given as YYYY-MM-DD')
+        invoices = invoices.filter(client__emailAddress__isnull=False).exclude(client__emailAddress='')
+
+        run_name = options['run_name'] or timezone.now().strftime('run-%Y%m%d-%H%M%S')
+        checkpoint = Checkpoint(os.path.join(settings.MEDIA_ROOT, 'invoice_runs', f'{run_name}.jsonl'))
+        ids = [pk for pk in invoices.order_by('id').values_list('id', flat=True) if pk not in checkpoint.done]
+
+        self.stdout.write(f'Run "{run_name}": {len(ids)} invoices to send '
+                          f'({len(checkpoint.done)} already sent by this run)')
+        if options['dry_run'] or not ids:
+            return
+
+        self.sent = 0
+        self.errors = []
+        self.send_seconds = 0.0
+        self.lock = threading.Lock()
+        render_seconds = 0.0
+        limiter = RateLimiter(options['rate'])
+        outbox = queue.Queue(maxsize=options['connections'] * 10)
+
+        senders = [threading.Thread(target=self.sender, args=(outbox, limiter, checkpoint), daemon=True)
+                   for _ in range(max(1, options['connections']))]
+
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        mp_context = multiprocessing.get_context('fork' if os.name == 'posix' else 'spawn')
+
+        started = time.perf_counter()
+        rendered_at = started
+        try:
+            with ProcessPoolExecutor(max_workers=max(1, options['workers']), mp_context=mp_context,
+                                     initializer=init_render_worker) as pool:
+                futures = {pool.submit(render_invoice_file, pk): pk for pk in ids}
+                # the pool forks its workers on the first submit; only start threads after that
+                for t in senders:
+                    t.start()
+                for future in as_completed(futures):
+                    try:
+                        invoice_id, path, to_email, from_name, seconds = future.result()
+                    except Exception as e:
+                        self.errors.append((futures[future], f'render: {e}'))
+                        continue
+                    render_seconds += seconds
+                    outbox.put((invoice_id, path, to_email, from_name))
+                rendered_at = time.perf_counter()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted; finishing queued sends, re-run to resume'))
+        finally:
+            if not senders[0].ident:
+                for t in senders:
+                    t.start()
+            for _ in senders:
+                outbox.put(None)
+            for t in senders:
+                t.join()
+        finished = time.perf_counter()
+
+        rendered = len(ids) - sum(1 for _pk, err in self.errors if err.startswith('render'))
+        total = finished - started
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 50))
+        self.stdout.write(self.style.SUCCESS(f'✓ Sent {self.sent} of {len(ids)} invoices in {total:.2f}s '
+                                             f'({self.sent / total if total else 0:.1f} invoices/sec)'))
+        self.stdout.write(f'   Render stage: {rendered_at - started:.2f}s wall, '
+                          f'{render_seconds / rendered * 1000 if rendered else 0:.0f} ms/invoice '
+                          f'across {options["workers"]} processes')
+        self.stdout.write(f'   Send stage:   {finished - rendered_at:.2f}s after the last render, '
+                          f'{self.send_seconds / self.sent * 1000 if self.sent else 0:.0f} ms/message '
+                          f'across {len(senders)} connections')
+        for invoice_id, error in self.errors:
+            self.stdout.write(self.style.ERROR(f'   ✗ invoice {invoice_id}: {error}'))
+        if self.errors:
+            raise CommandError(f'{len(self.errors)} invoices failed; re-run with --run-name {run_name} to retry')
+
+    def sender(self, outbox, limiter, checkpoint):
+        connection = get_connection()
+        try:
+            while True:
+                item = outbox.get()
+                if item is None:
+                    break
+                invoice_id, path, to_email, from_name = item
+                limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    buildInvoiceEmail(to_email, from_name, path, connection=connection).send()
+                except Exception as e:
+                    with self.lock:
+                        self.errors.append((invoice_id, f'send: {e}'))
+                    # start the next message on a fresh session
+                    connection.close()
+                    continue
+                checkpoint.mark(invoice_id)
+                with self.lock:
+                    self.sent += 1
+                    self.send_seconds += time.perf_counter() - started
+
+                try:
+                    OutboundEmail.objects.create(invoice_id=invoice_id, to_email=to_email, from_name=from_name,
+                                                 attachment=path, status='SENT', attempts=1, sent_at=timezone.now())
+                    mark_invoice_sent(invoice_id)
+                except Exception as e:
+                    # already delivered and checkpointed, so a re-run will not send it again
+                    with self.lock:
+                        self.errors.append((invoice_id, f'sent, but recording it failed: {e}'))
+        finally:
+            connection.close()
+            db_connection.close()
@@ -0,0 +1,38 @@
+"""
+Deliver queued invoice emails in batches over a shared SMTP connection.
+Usage: python manage.py send_queued_emails [--once] [--batch-size 50] [--sleep 5]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoice.mailer import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Run the outbound invoice email worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages sent per SMTP session')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        totals = [0, 0, 0]
+        try:
+            while True:
+                sent, retried, failed = process_queue(options['batch_size'])
+                for i, n in enumerate((sent, retried, failed)):
+                    totals[i] += n
+                if sent or retried or failed:
+                    self.stdout.write(f'sent {sent}, retrying {retried}, failed {failed}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Email worker finished: {totals[0]} sent, {totals[1]} retrying, {totals[2]} failed'))
@@ -0,0 +1,40 @@
+"""
+Mark invoices that are past due as OVERDUE, in chunked set-based updates.
+Usage: python manage.py sweep_overdue [--chunk-size 5000] [--date 2026-10-17] [--dry-run] [--every 3600]
+"""
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice.overdue import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Move CURRENT/EMAIL_SENT invoices past their due date (or payment terms) to OVERDUE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Invoices updated per statement')
+        parser.add_argument('--date', type=str, help='Sweep as of this date (YYYY-MM-DD, default today)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the invoices that would change')
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running, sweeping every N seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f'Invalid --date: {options["date"]}')
+
+        try:
+            while True:
+                changed, elapsed = sweep_overdue(today=today, chunk_size=options['chunk_size'],
+                                                 dry_run=options['dry_run'])
+                verb = 'would be marked' if options['dry_run'] else 'marked'
+                self.stdout.write(self.style.SUCCESS(f'✓ {changed} invoices {verb} OVERDUE in {elapsed:.2f}s'))
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,62 @@
+"""
+Recompute the denormalized invoice totals from the line items and report drift.
+Usage: python manage.py sync_invoice_totals [--verify] [--batch-size 1000]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoice.models import Invoice
+from invoice.totals import TOTAL_FIELDS, compute_invoice_totals
+
+
+class Command(BaseCommand):
+    help = 'Backfill Invoice subtotal/total/currency/line_count, or with --verify only report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift without writing')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Invoices per batch')
+        parser.add_argument('--show', type=int, default=10, help='How many drifted invoices to list')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = 0
+        drifted = []
+        started = time.perf_counter()
+
+        last_id = 0
+        while True:
+            # walk the table by primary key so each batch is an index range scan
+            batch = list(Invoice.objects.filter(pk__gt=last_id).order_by('pk')
+                         .values('pk', 'number', *TOTAL_FIELDS)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]['pk']
+            checked += len(batch)
+
+            expected = compute_invoice_totals(row['pk'] for row in batch)
+            fixes = []
+            for row in batch:
+                want = expected[row['pk']]
+                if any(row[field] != want[field] for field in TOTAL_FIELDS):
+                    drifted.append((row, want))
+                    fixes.append(Invoice(pk=row['pk'], **want))
+            if fixes and not options['verify']:
+                Invoice.objects.bulk_update(fixes, TOTAL_FIELDS, batch_size=batch_size)
+
+        elapsed = time.perf_counter() - started
+        for row, want in drifted[:options['show']]:
+            self.stdout.write(f'   {row["number"] or row["pk"]}: '
+                              f'stored {row["total"]} {row["currency"] or ""} / {row["line_count"]} lines, '
+                              f'actual {want["total"]} {want["currency"] or ""} / {want["line_count"]} lines')
+
+        rate = checked / elapsed if elapsed else 0
+        if options['verify']:
+            summary = f'Checked {checked} invoices in {elapsed:.2f}s ({rate:.0f}/s): {len(drifted)} drifted'
+            if drifted:
+                raise CommandError(summary)
+            self.stdout.write(self.style.SUCCESS(f'✓ {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Checked {checked} invoices in {elapsed:.2f}s ({rate:.0f}/s), '
+                                                 f'fixed {len(drifted)}'))
@@ -0,0 +1,305 @@
+import asyncio
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings as django_settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils.crypto import constant_time_compare
+
+
+slow_log = logging.getLogger('invoice.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _setting(name, default):
+    return getattr(django_settings, name, default)
+
+
+# --- helper: in-process metrics, in the Prometheus text format ---
+class Metric:
+    """
+    One metric family: a value per combination of label values. Updates
+    take a lock held for a dict lookup and an addition, cheap enough to
+    leave on everywhere.
+
+    The values are per process: with several workers, each one reports its
+    own (scrape them individually, or sum them in the query).
+    """
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = ('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                   for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted((values, list(data)) for values, data in self._series.items())
+        for values, data in series:
+            lines.extend(self._sample_lines(values, data))
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # per series: a count per bucket (not cumulative), then the total count and sum
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._series.get(labels)
+            if data is None:
+                data = self._series[labels] = [0] * len(self.buckets) + [0, 0.0]
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += 1
+            data[-1] += value
+
+    def _sample_lines(self, values, data):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, data):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{self._label_text(values, [("le", bound)])} {cumulative}')
+        lines.append(f'{self.name}_bucket{self._label_text(values, [("le", "+Inf")])} {data[-2]}')
+        lines.append(f'{self.name}_sum{self._label_text(values)} {data[-1]:.6f}')
+        lines.append(f'{self.name}_count{self._label_text(values)} {data[-2]}')
+        return lines
+
+
+class CollectedMetric(Metric):
+    """
+    A gauge or counter kept by some other object and read at scrape time:
+    ``collect()`` returns {label values: number}.
+    """
+
+    def __init__(self, name, help, kind, collect, labels=()):
+        self.kind = kind
+        self.collect = collect
+        super().__init__(name, help, labels)
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{self._label_text(values)} {value}')
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram('invoice_request_duration_seconds',
+                            'Time to build the response, by URL name.', ['view', 'method', 'status'])
+REQUEST_QUERIES = Histogram('invoice_request_db_queries', 'Database queries per request, by URL name.', ['view'],
+                            buckets=QUERY_COUNT_BUCKETS)
+QUERY_SECONDS = Histogram('invoice_db_query_duration_seconds',
+                          'Database query time, by the URL name of the request running it.', ['view'],
+                          buckets=QUERY_BUCKETS)
+TEMPLATE_SECONDS = Histogram('invoice_template_render_seconds', 'Template render time, by template.', ['template'])
+PDF_SECONDS = Histogram('invoice_pdf_render_seconds', 'PDF render time, by engine and outcome.', ['engine', 'outcome'])
+PDF_JOB_SECONDS = Histogram('invoice_pdf_render_job_seconds',
+                            'Time a pooled PDF render job spent waiting for a worker and converting, by stage.',
+                            ['stage'])
+EMAIL_SECONDS = Histogram('invoice_email_send_seconds', 'Time to send one invoice email, by outcome.', ['outcome'])
+
+
+def render_metrics():
+    return '\n'.join(line for metric in REGISTRY for line in metric.exposition()) + '\n'
+
+
+@contextmanager
+def timed(histogram, *labels):
+    """Observe the time the block takes, labelled ``labels`` plus 'ok' or 'error'."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        histogram.observe(time.perf_counter() - started, *labels, outcome)
+
+
+# --- helper: the request being handled, for the query hook ---
+class _RequestStats:
+    __slots__ = ('request', 'queries')
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+
+    @property
+    def view(self):
+        # resolved before the view runs; requests no URL matched share one label
+        match = getattr(self.request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or 'unnamed'
+
+
+# a context variable rather than a thread local: under ASGI it follows the
+# request into the threads sync_to_async runs the ORM in
+_current = contextvars.ContextVar('invoice_request_stats', default=None)
+
+
+def _observe_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        QUERY_SECONDS.observe(elapsed, stats.view)
+        if elapsed * 1000 >= _setting('METRICS_SLOW_QUERY_MS', 250):
+            slow_log.warning('slow query', extra={'fields': {
+                'event': 'slow_query', 'view': stats.view, 'duration_ms': round(elapsed * 1000, 1),
+                'sql': sql[:2000], 'many': many,
+            }})
+
+
+def install_query_hook(sender=None, connection=None, **kwargs):
+    """Time the queries of every database connection, as it is opened (connection_created)."""
+    if _observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe_query)
+
+
+connection_created.connect(install_query_hook, dispatch_uid='invoice.metrics.install_query_hook')
+
+
+class MetricsMiddleware:
+    """
+    Records each request's latency and query count under its URL name
+    (``invoice/urls.py``), and logs requests slower than
+    METRICS_SLOW_REQUEST_MS. Put first in MIDDLEWARE so the timing covers
+    the other middleware. Works under WSGI and ASGI; the time a streamed
+    body takes after the response is returned is not included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _setting('METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._async_mode = asyncio.iscoroutinefunction(get_response)
+        if self._async_mode:
+            # tells Django this middleware returns a coroutine (as MiddlewareMixin does)
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self._async_mode:
+            return self.__acall__(request)
+        stats, token, started = self._start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(stats, token, started, response)
+
+    async def __acall__(self, request):
+        stats, token, started = self._start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(stats, token, started, response)
+
+    def _start(self, request):
+        stats = _RequestStats(request)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, stats, token, started, response):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        request, view = stats.request, stats.view
+        status = f'{response.status_code // 100}xx' if response is not None else 'error'
+        REQUEST_SECONDS.observe(elapsed, view, request.method, status)
+        REQUEST_QUERIES.observe(stats.queries, view)
+        if elapsed * 1000 >= _setting('METRICS_SLOW_REQUEST_MS', 1000):
+            slow_log.warning('slow request', extra={'fields': {
+                'event': 'slow_request', 'view': view, 'method': request.method, 'path': request.path,
+                'status': response.status_code if response is not None else None,
+                'duration_ms': round(elapsed * 1000, 1), 'queries': stats.queries,
+            }})
+
+
+# --- helper: template render timing, as a template backend ---
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_SECONDS.observe(time.perf_counter() - started, self.template.origin.template_name or '<string>')
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each render() of a top-level template."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's ``fields`` extra."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def metricsEndpoint(request):
+    """
+    The metrics in the Prometheus text format, for staff users and, when
+    METRICS_TOKEN is set, scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = _setting('METRICS_TOKEN', '')
+    token_ok = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    allowed = token_ok or (request.user.is_authenticated and request.user.is_staff)
+    if not allowed:
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.6 on 2026-10-17 18:41
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_totals(apps, schema_editor):
+    # the same computation as invoice.totals, against the historical models
+    Invoice = apps.get_model('invoice', 'Invoice')
+    Product = apps.get_model('invoice', 'Product')
+    totals = {}
+    for invoice_id, quantity, price, currency in (Product.objects.filter(invoice__isnull=False)
+                                                  .order_by('invoice_id', 'id')
+                                                  .values_list('invoice_id', 'quantity', 'price', 'currency')):
+        row = totals.setdefault(invoice_id, {'amount': 0.0, 'currency': None, 'line_count': 0})
+        if quantity is not None and price is not None:
+            row['amount'] += quantity * price
+        if currency:
+            row['currency'] = currency
+        row['line_count'] += 1
+
+    invoices = []
+    for invoice_id, row in totals.items():
+        amount = Decimal(str(row['amount'])).quantize(Decimal('0.01'))
+        invoices.append(Invoice(pk=invoice_id, subtotal=amount, total=amount,
+                                currency=row['currency'], line_count=row['line_count']))
+    Invoice.objects.bulk_update(invoices, ['subtotal', 'total', 'currency', 'line_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0004_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='currency',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
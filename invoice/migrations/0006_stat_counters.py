@@ -0,0 +1,49 @@
+# Generated by Django 3.2.6 on 2026-10-17 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+def seed_counters(apps, schema_editor):
+    # the same buckets as invoice.stats.compute_stats, against the historical models
+    Client = apps.get_model('invoice', 'Client')
+    Invoice = apps.get_model('invoice', 'Invoice')
+    StatCounter = apps.get_model('invoice', 'StatCounter')
+    now = timezone.now()
+    counters = {('clients', '', ''): [Client.objects.count(), 0]}
+    for row in Invoice.objects.values('status', 'currency').annotate(n=Count('id'), amount=Sum('total')).order_by():
+        counter = counters.setdefault(('invoices', row['status'], row['currency'] or ''), [0, 0])
+        counter[0] += row['n']
+        counter[1] += row['amount'] or 0
+    StatCounter.objects.bulk_create([
+        StatCounter(metric=metric, status=status, currency=currency, count=count, amount=amount, last_updated=now)
+        for (metric, status, currency), (count, amount) in counters.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0005_invoice_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=30)),
+                ('status', models.CharField(blank=True, default='', max_length=100)),
+                ('currency', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statcounter',
+            constraint=models.UniqueConstraint(fields=('metric', 'status', 'currency'), name='stat_counter_bucket'),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 3.2.6 on 2026-10-17 18:50
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# The full-text index lives outside the ORM: an external-content FTS5 table
+# kept in step by triggers on SQLite, a generated tsvector column with GIN
+# indexes on PostgreSQL (12+). The existing rows are indexed by backfill_documents;
+# `manage.py rebuild_search_index` recreates the index later if it drifts.
+SQLITE_SQL = [
+    """CREATE VIRTUAL TABLE invoice_search_fts USING fts5(
+        title, body, content='invoice_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER invoice_search_fts_ai AFTER INSERT ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_ad AFTER DELETE ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_au AFTER UPDATE ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ai",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ad",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_au",
+    "DROP TABLE IF EXISTS invoice_search_fts",
+]
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE invoice_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED""",
+    "CREATE INDEX invoice_searchdocument_vector_idx ON invoice_searchdocument USING gin (search_vector)",
+    "CREATE INDEX invoice_searchdocument_title_trgm_idx ON invoice_searchdocument USING gin (title gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS invoice_searchdocument_title_trgm_idx",
+    "DROP INDEX IF EXISTS invoice_searchdocument_vector_idx",
+    "ALTER TABLE invoice_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def backfill_documents(apps, schema_editor):
+    # the same documents as invoice.search.document_values, against the historical models
+    Client = apps.get_model('invoice', 'Client')
+    Invoice = apps.get_model('invoice', 'Invoice')
+    Product = apps.get_model('invoice', 'Product')
+    SearchDocument = apps.get_model('invoice', 'SearchDocument')
+    now = timezone.now()
+    sources = [
+        ('client', Client.objects.values_list('id', 'clientName', 'emailAddress', 'taxNumber'),
+         lambda name, email, tax: (name or '', _join(email, tax), None)),
+        ('invoice', Invoice.objects.values_list('id', 'number', 'title', 'notes', 'slug'),
+         lambda number, title, notes, slug: (_join(number, title), notes or '', slug)),
+        ('product', Product.objects.values_list('id', 'title', 'description', 'invoice__slug'),
+         lambda title, description, slug: (title or '', description or '', slug)),
+    ]
+    for kind, rows, document in sources:
+        batch = []
+        for pk, *fields in rows.order_by('pk').iterator(chunk_size=2000):
+            title, body, slug = document(*fields)
+            # stamped, so the FTS5 triggers index each row as it is inserted
+            batch.append(SearchDocument(kind=kind, object_id=pk, title=title[:300], body=body, slug=slug,
+                                        last_updated=now))
+            if len(batch) >= 2000:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0008_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('client', 'client'), ('invoice', 'invoice'), ('product', 'product')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(blank=True, default='', max_length=300)),
+                ('body', models.TextField(blank=True, default='')),
+                ('slug', models.CharField(blank=True, max_length=500, null=True)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_object'),
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_SQL, 'postgresql': POSTGRES_SQL}),
+            _run({'sqlite': SQLITE_REVERSE_SQL, 'postgresql': POSTGRES_REVERSE_SQL}),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
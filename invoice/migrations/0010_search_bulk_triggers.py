@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+# SearchDocument rows inserted with last_updated NULL are skipped by the FTS5
+# triggers: bulk paths (invoice/search.py index_documents) insert a batch
+# that way, index it with one INSERT ... SELECT, which is several times
+# faster than a trigger firing per row, and then stamp it.
+TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ai",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ad",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_au",
+    """CREATE TRIGGER invoice_search_fts_ai AFTER INSERT ON invoice_searchdocument
+    WHEN new.last_updated IS NOT NULL BEGIN
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_ad AFTER DELETE ON invoice_searchdocument
+    WHEN old.last_updated IS NOT NULL BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_au AFTER UPDATE ON invoice_searchdocument
+    WHEN old.last_updated IS NOT NULL BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ai",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_ad",
+    "DROP TRIGGER IF EXISTS invoice_search_fts_au",
+    """CREATE TRIGGER invoice_search_fts_ai AFTER INSERT ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_ad AFTER DELETE ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER invoice_search_fts_au AFTER UPDATE ON invoice_searchdocument BEGIN
+        INSERT INTO invoice_search_fts(invoice_search_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO invoice_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in statements:
+                schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0009_search_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(TRIGGERS_SQL), _run(REVERSE_SQL)),
+    ]
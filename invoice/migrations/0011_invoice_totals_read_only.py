@@ -0,0 +1,44 @@
+# Generated by Django 3.2.6 on 2026-10-17 19:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0010_search_bulk_triggers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='currency',
+            field=models.CharField(blank=True, editable=False, max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-999999), django.core.validators.MaxValueValidator(999999)]),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='quantity',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-1000000), django.core.validators.MaxValueValidator(1000000)]),
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import F, Sum
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 from uuid import uuid4
@@ -36,7 +41,9 @@ class Client(models.Model):
             self.uniqueId = str(uuid4()).split('-')[4]
         self.slug = slugify(f"{self.clientName}-{self.uniqueId}")
         self.last_updated = timezone.localtime(timezone.now())
-        super().save(*args, **kwargs)
+        # signal handlers (totals, stats) run inside the same transaction as the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Invoice(models.Model):
@@ -60,6 +67,16 @@ class Invoice(models.Model):
     status = models.CharField(choices=STATUS, default='CURRENT', max_length=100)
     notes = models.TextField(null=True, blank=True)
 
+    # Totals, denormalized from the line items (see invoice/totals.py and invoice/signals.py).
+    # Only the line item handlers write them; save() leaves them out of its UPDATE.
+    TOTAL_FIELDS = ('subtotal', 'total', 'currency', 'line_count')
+    # the largest amount subtotal/total hold; line items adding up to more are rejected (see invoice/totals.py)
+    MAX_TOTAL = Decimal('999999999999.99')
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    currency = models.CharField(null=True, blank=True, max_length=10, editable=False)
+    line_count = models.PositiveIntegerField(default=0, editable=False)
+
     # RELATED fields
     client = models.ForeignKey(Client, blank=True, null=True, on_delete=models.SET_NULL)
 
@@ -69,6 +86,15 @@ class Invoice(models.Model):
     date_created = models.DateTimeField(blank=True, null=True)
     last_updated = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        # matched to the access paths; `python manage.py bench_indexes` shows the plans with and without them
+        indexes = [
+            models.Index(fields=['status', 'dueDate'], name='invoice_status_due_idx'),
+            models.Index(fields=['client', 'date_created'], name='invoice_client_created_idx'),
+            models.Index(fields=['number'], name='invoice_number_idx'),
+            models.Index(fields=['date_created', 'id'], name='invoice_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Invoice {self.number} - {self.status}"
 
@@ -79,7 +105,13 @@ class Invoice(models.Model):
             self.uniqueId = str(uuid4()).split('-')[4]
         self.slug = slugify(f"{self.number}-{self.uniqueId}")
         self.last_updated = timezone.localtime(timezone.now())
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # an instance loaded before a line item changed must not write its stale totals back
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.TOTAL_FIELDS]
+        # signal handlers (totals, stats) run inside the same transaction as the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Product(models.Model):
@@ -92,8 +124,15 @@ class Product(models.Model):
 
     title = models.CharField(null=True, blank=True, max_length=100)
     description = models.TextField(null=True, blank=True)
-    quantity = models.FloatField(null=True, blank=True)
-    price = models.FloatField(null=True, blank=True)
+    # bounded so that one line's amount always fits Invoice.total; a line that would take
+    # the invoice's sum past Invoice.MAX_TOTAL is rejected by clean() and the totals refresh
+    MAX_QUANTITY = 1_000_000
+    MAX_PRICE = 999_999
+
+    quantity = models.FloatField(null=True, blank=True,
+                                 validators=[MinValueValidator(-MAX_QUANTITY), MaxValueValidator(MAX_QUANTITY)])
+    price = models.FloatField(null=True, blank=True,
+                              validators=[MinValueValidator(-MAX_PRICE), MaxValueValidator(MAX_PRICE)])
     currency = models.CharField(choices=CURRENCY, default='NGN', max_length=10)
 
     # Related Fields
@@ -108,6 +147,15 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.title} ({self.currency})"
 
+    def clean(self):
+        if not (self.invoice_id and self.quantity and self.price):
+            return
+        others = (Product.objects.filter(invoice_id=self.invoice_id).exclude(pk=self.pk)
+                  .aggregate(amount=Sum(F('quantity') * F('price'), output_field=models.FloatField()))['amount'])
+        if abs((others or 0) + self.quantity * self.price) > Invoice.MAX_TOTAL:
+            raise ValidationError('This line would take the invoice total past %(max)s.',
+                                  code='total_overflow', params={'max': Invoice.MAX_TOTAL})
+
     def save(self, *args, **kwargs):
         if self.date_created is None:
             self.date_created = timezone.localtime(timezone.now())
@@ -115,7 +163,9 @@ class Product(models.Model):
             self.uniqueId = str(uuid4()).split('-')[4]
         self.slug = slugify(f"{self.title}-{self.uniqueId}")
         self.last_updated = timezone.localtime(timezone.now())
-        super().save(*args, **kwargs)
+        # signal handlers (totals, stats) run inside the same transaction as the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 
@@ -165,4 +215,108 @@ class BankDetail(models.Model):
     currency = models.CharField(max_length=10, choices=CURRENCY_CHOICES)
 
     def __str__(self):
-        return f"{self.company.companyName} - {self.currency} ({self.bank_name})"
\ No newline at end of file
+        return f"{self.company.companyName} - {self.currency} ({self.bank_name})"
+
+class OutboundEmail(models.Model):
+    STATUS = [
+        ('PENDING', 'PENDING'),
+        ('SENDING', 'SENDING'),
+        ('SENT', 'SENT'),
+        ('FAILED', 'FAILED'),
+    ]
+
+    to_email = models.EmailField(max_length=100)
+    from_name = models.CharField(null=True, blank=True, max_length=200)
+    attachment = models.CharField(null=True, blank=True, max_length=500)
+    status = models.CharField(choices=STATUS, default='PENDING', max_length=20)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(null=True, blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    # Related Fields
+    invoice = models.ForeignKey(Invoice, blank=True, null=True, on_delete=models.CASCADE, related_name='emails')
+
+    # Utility fields
+    date_created = models.DateTimeField(blank=True, null=True)
+    last_updated = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        if self.date_created is None:
+            self.date_created = timezone.localtime(timezone.now())
+        if self.next_attempt_at is None:
+            self.next_attempt_at = self.date_created
+        self.last_updated = timezone.localtime(timezone.now())
+        super().save(*args, **kwargs)
+
+
+class StatCounter(models.Model):
+    """
+    Running totals behind the dashboard, one row per (metric, status, currency)
+    bucket. Maintained by the signal handlers in invoice/signals.py and
+    repaired by `python manage.py reconcile_stats`.
+    """
+    metric = models.CharField(max_length=30)
+    status = models.CharField(blank=True, default='', max_length=100)
+    currency = models.CharField(blank=True, default='', max_length=10)
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # Utility fields
+    last_updated = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'status', 'currency'], name='stat_counter_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.status} {self.currency}: {self.count} / {self.amount}"
+
+
+class InvoiceSequence(models.Model):
+    """Last invoice number handed out for each year (see invoice/sequences.py)."""
+    year = models.PositiveIntegerField(unique=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per client, invoice and line item, indexed by SQLite
+    FTS5 or a PostgreSQL tsvector + trigram index (see invoice/search.py).
+    """
+    KINDS = [
+        ('client', 'client'),
+        ('invoice', 'invoice'),
+        ('product', 'product'),
+    ]
+
+    kind = models.CharField(choices=KINDS, max_length=10)
+    object_id = models.BigIntegerField()
+    title = models.CharField(blank=True, default='', max_length=300)
+    body = models.TextField(blank=True, default='')
+    # slug of the invoice a result links to (the invoice itself, or a line item's invoice)
+    slug = models.CharField(null=True, blank=True, max_length=500)
+
+    # Utility fields
+    # NULL only mid-way through a bulk insert: the SQLite FTS triggers skip such rows
+    last_updated = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
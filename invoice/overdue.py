@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings as django_settings
+from django.db import connection as db_connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Invoice
+from .stats import INVOICES, bump
+
+
+logger = logging.getLogger(__name__)
+
+# statuses an invoice can go overdue from
+SWEEP_STATUSES = ('CURRENT', 'EMAIL_SENT')
+
+# payment terms as days after the invoice date, for invoices without a dueDate
+TERM_DAYS = {'14 days': 14, '30 days': 30, '60 days': 60}
+
+
+def overdue_querysets(today):
+    """
+    Querysets of the invoices that are overdue on ``today``: one for those
+    with a dueDate, and one per payment term for those without, whose due
+    date is their creation date plus the term.
+    """
+    candidates = Invoice.objects.filter(status__in=SWEEP_STATUSES)
+    querysets = [candidates.filter(dueDate__lt=today)]
+    for term, days in TERM_DAYS.items():
+        # created before midnight (local time) at the start of today - days
+        cutoff = timezone.make_aware(datetime.combine(today - timedelta(days=days), datetime.min.time()))
+        querysets.append(candidates.filter(dueDate__isnull=True, paymentTerms=term, date_created__lt=cutoff))
+    return querysets
+
+
+def _sweep_chunk(queryset, chunk_size, now):
+    with transaction.atomic():
+        ids = queryset.order_by().values_list('id', flat=True)
+        if db_connection.features.has_select_for_update_skip_locked:
+            ids = ids.select_for_update(skip_locked=True)
+        ids = list(ids[:chunk_size])
+        if not ids:
+            return 0
+
+        # move the dashboard counters with the rows, in the same transaction
+        buckets = (Invoice.objects.filter(pk__in=ids).values('status', 'currency')
+                   .annotate(n=Count('id'), amount=Sum('total')).order_by())
+        for row in buckets:
+            amount = row['amount'] or 0
+            bump(INVOICES, row['status'], row['currency'] or '', -row['n'], -amount)
+            bump(INVOICES, 'OVERDUE', row['currency'] or '', row['n'], amount)
+
+        return Invoice.objects.filter(pk__in=ids, status__in=SWEEP_STATUSES).update(
+            status='OVERDUE', last_updated=now)
+
+
+def sweep_overdue(today=None, chunk_size=5000, dry_run=False):
+    """
+    Move every CURRENT/EMAIL_SENT invoice that is past due to OVERDUE.
+
+    Rows are changed with set-based UPDATEs of ``chunk_size`` ids at a
+    time, each chunk in its own short transaction, rather than one save()
+    per invoice. Running it again changes nothing until more invoices fall
+    due. Returns (rows changed, seconds taken); with ``dry_run`` the rows
+    are only counted.
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    started = time.perf_counter()
+    changed = 0
+    for queryset in overdue_querysets(today):
+        if dry_run:
+            changed += queryset.count()
+            continue
+        while True:
+            n = _sweep_chunk(queryset, chunk_size, now)
+            if not n:
+                break
+            changed += n
+    return changed, time.perf_counter() - started
+
+
+# --- helper: optional in-process timer (OVERDUE_SWEEP_INTERVAL seconds, 0 = off) ---
+_timer = None
+
+
+def _run_timer(interval):
+    global _timer
+    try:
+        changed, elapsed = sweep_overdue()
+        if changed:
+            logger.info("overdue sweep: %d invoices marked OVERDUE in %.2fs", changed, elapsed)
+    except Exception:
+        logger.exception("overdue sweep failed")
+    finally:
+        _timer = threading.Timer(interval, _run_timer, args=(interval,))
+        _timer.daemon = True
+        _timer.start()
+
+
+def start_overdue_timer(interval=None):
+    """Start sweeping every ``interval`` seconds in a background thread of this process."""
+    global _timer
+    interval = interval or getattr(django_settings, 'OVERDUE_SWEEP_INTERVAL', 0)
+    if not interval or _timer is not None:
+        return
+    _timer = threading.Timer(interval, _run_timer, args=(interval,))
+    _timer.daemon = True
+    _timer.start()
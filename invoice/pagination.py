@@ -0,0 +1,155 @@
+import base64
+import json
+
+from django.db import connection as db_connection
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    payload = {'v': [None if v is None else str(v) for v in values]}
+    if reverse:
+        payload['r'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (values as strings, reverse)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        return list(payload['v']), bool(payload.get('r'))
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def keyset_filter(fields, values, descending=True):
+    """
+    Rows strictly after ``values`` in the ordering over ``fields``: the
+    expansion of ``(a, b) < (:a, :b)``. The extra bound on the leading
+    column is redundant, but it lets the planner seek on the
+    (a, b) index instead of scanning it.
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, name in enumerate(fields):
+        term = Q(**{f'{name}__{lookup}': values[i]})
+        for prev, value in zip(fields[:i], values[:i]):
+            term &= Q(**{prev: value})
+        condition |= term
+    if len(fields) > 1:
+        condition &= Q(**{f'{fields[0]}__{lookup}e': values[0]})
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor ("keyset") pagination over ``ordering``, which must be unique
+    overall (end it with the primary key) and all in the same direction,
+    e.g. ('-date_created', '-id').
+
+    Each page is fetched with a ``WHERE (a, b) < (:a, :b) ORDER BY a, b
+    LIMIT n`` style query, so the cost of a page does not depend on how deep
+    into the list it is, unlike OFFSET. The ordering columns must not be
+    NULL.
+    """
+
+    def __init__(self, queryset, ordering=('-date_created', '-id'), per_page=50):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+        if any(name.startswith('-') != self.descending for name in ordering):
+            raise ValueError("keyset ordering columns must share one direction")
+
+    def _order(self, reverse):
+        descending = self.descending != reverse
+        return [('-' if descending else '') + name for name in self.fields]
+
+    def _after(self, values, reverse):
+        """Filter for the rows that come after ``values`` in the (possibly reversed) ordering."""
+        return keyset_filter(self.fields, values, descending=self.descending != reverse)
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def _parse(self, raw_values):
+        if len(raw_values) != len(self.fields):
+            raise InvalidCursor("cursor does not match the ordering")
+        model = self.queryset.model
+        try:
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(self.fields, raw_values)]
+        except Exception as e:
+            raise InvalidCursor(str(e))
+
+    def page(self, cursor=None):
+        """
+        The page after ``cursor`` (or before it, for a "previous" cursor);
+        the first page when ``cursor`` is empty.
+        """
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            raw_values, reverse = decode_cursor(cursor)
+            queryset = queryset.filter(self._after(self._parse(raw_values), reverse))
+
+        rows = list(queryset.order_by(*self._order(reverse))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = encode_cursor(self._values(rows[-1]))
+            if cursor and (has_more or not reverse):
+                previous_cursor = encode_cursor(self._values(rows[0]), reverse=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def approximate_count(queryset, cap=10000):
+    """
+    A cheap row count for display: returns (count, exact).
+
+    An unfiltered queryset on PostgreSQL uses the planner's estimate from
+    pg_class; otherwise rows are counted up to ``cap`` and the count is
+    reported as inexact ("10000+") beyond that.
+    """
+    if not queryset.query.where and db_connection.vendor == 'postgresql':
+        with db_connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > cap:
+            return row[0], False
+
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
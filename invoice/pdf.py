@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import pdfkit
+from django.conf import settings as django_settings
+
+from .metrics import PDF_JOB_SECONDS, CollectedMetric
+
+
+logger = logging.getLogger(__name__)
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+class WkhtmltopdfNotFound(PDFRenderError):
+    pass
+
+
+class RenderQueueFull(PDFRenderError):
+    pass
+
+
+class RenderTimeout(PDFRenderError):
+    pass
+
+
+# --- helper: find wkhtmltopdf executable (cross-platform) ---
+def find_wkhtmltopdf():
+    # 1) explicit setting in settings.py
+    cmd_from_settings = getattr(django_settings, "WKHTMLTOPDF_CMD", None)
+    if cmd_from_settings:
+        if os.path.exists(cmd_from_settings):
+            return cmd_from_settings
+
+    # 2) look on PATH
+    wk = shutil.which("wkhtmltopdf")
+    if wk:
+        return wk
+
+    # 3) common windows default
+    if platform.system() == "Windows":
+        common = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+        if os.path.exists(common):
+            return common
+
+    # not found
+    return None
+
+
+class _RenderJob:
+    __slots__ = ('html', 'options', 'timeout', 'future', 'enqueued_at')
+
+    def __init__(self, html, options, timeout):
+        self.html = html
+        self.options = options
+        self.timeout = timeout
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class PDFRenderService:
+    """
+    Long-lived pool of render workers fed from a bounded job queue.
+
+    wkhtmltopdf has no server mode, so each job still runs one converter
+    process; the pool keeps the resolved binary/configuration and the worker
+    threads warm, caps how many converters run at once, pushes back when the
+    queue is full and kills any converter that exceeds its timeout.
+    """
+
+    def __init__(self, workers=2, queue_size=20, timeout=30, submit_timeout=2, wkhtmltopdf=None):
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.submit_timeout = submit_timeout
+        self.wkhtmltopdf = wkhtmltopdf or find_wkhtmltopdf()
+        if not self.wkhtmltopdf:
+            raise WkhtmltopdfNotFound(
+                "wkhtmltopdf not found. Install wkhtmltopdf and/or set WKHTMLTOPDF_CMD in settings.py.")
+        self.configuration = pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf)
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._threads = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f'pdf-render-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, html, options=None, timeout=None):
+        """Queue ``html`` for rendering and return a Future resolving to PDF bytes."""
+        job = _RenderJob(html, dict(options or {}), timeout or self.timeout)
+        try:
+            self._queue.put(job, timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise RenderQueueFull("PDF render queue is full, try again shortly.")
+        return job.future
+
+    def render(self, html, options=None, timeout=None):
+        """Render ``html`` and block until the PDF bytes are ready."""
+        timeout = timeout or self.timeout
+        future = self.submit(html, options, timeout)
+        # worst case: every job ahead of us in the queue runs to its timeout
+        backlog = self._queue.maxsize / self.workers + 1
+        try:
+            return future.result(timeout=timeout * backlog + self.submit_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RenderTimeout(f"PDF render did not finish within {timeout}s")
+
+    def stats(self):
+        """Worker and queue counters, exported as metrics (see the collectors below)."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'busy': self._busy,
+                'queue_depth': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+            }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if not job.future.set_running_or_notify_cancel():
+                self._queue.task_done()
+                continue
+            with self._lock:
+                self._busy += 1
+            started = time.monotonic()
+            PDF_JOB_SECONDS.observe(started - job.enqueued_at, 'queued')
+            try:
+                result = self._convert(job)
+            except Exception as e:
+                with self._lock:
+                    self._failed += 1
+                    if isinstance(e, RenderTimeout):
+                        self._timed_out += 1
+                job.future.set_exception(e)
+            else:
+                with self._lock:
+                    self._completed += 1
+                job.future.set_result(result)
+            finally:
+                finished = time.monotonic()
+                PDF_JOB_SECONDS.observe(finished - started, 'convert')
+                with self._lock:
+                    self._busy -= 1
+                logger.info("pdf render took %.3fs (queued %.3fs, queue depth %d)",
+                            finished - started, started - job.enqueued_at, self._queue.qsize())
+                self._queue.task_done()
+
+    def _convert(self, job):
+        args, source, env = _converter_command(job.html, job.options, self.configuration)
+        try:
+            proc = subprocess.run(args, input=source, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  timeout=job.timeout, env=env)
+        except subprocess.TimeoutExpired:
+            raise RenderTimeout(f"PDF render exceeded {job.timeout}s")
+        return _converter_output(proc.returncode, proc.stdout, proc.stderr)
+
+
+# --- helper: one wkhtmltopdf run, shared by the worker pool and the asyncio path ---
+def _converter_command(html, options, configuration):
+    """(argv, stdin bytes, environment) of a wkhtmltopdf run that reads ``html`` from stdin."""
+    kit = pdfkit.PDFKit(html, 'string', options=options, configuration=configuration)
+    return kit.command(), kit.source.to_s().encode('utf-8'), kit.environ
+
+
+def _converter_output(returncode, stdout, stderr):
+    if returncode != 0 and not stdout.startswith(b'%PDF'):
+        raise PDFRenderError(stderr.decode('utf-8', errors='replace').strip()
+                             or f"wkhtmltopdf exited with code {returncode}")
+    return stdout
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Return the process-wide render service, starting it on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PDFRenderService(
+                    workers=getattr(django_settings, 'PDF_RENDER_WORKERS', 2),
+                    queue_size=getattr(django_settings, 'PDF_RENDER_QUEUE_SIZE', 20),
+                    timeout=getattr(django_settings, 'PDF_RENDER_TIMEOUT', 30),
+                    submit_timeout=getattr(django_settings, 'PDF_RENDER_SUBMIT_TIMEOUT', 2),
+                )
+    return _service
+
+
+def render_pdf(html, options=None, timeout=None):
+    return get_render_service().render(html, options, timeout)
+
+
+# --- helper: the render service's counters as metrics; none until the service has started ---
+def _service_gauge(name):
+    def collect():
+        return {(): _service.stats()[name]} if _service is not None else {}
+    return collect
+
+
+def _service_jobs():
+    if _service is None:
+        return {}
+    stats = _service.stats()
+    return {(outcome,): stats[outcome] for outcome in ('completed', 'failed', 'rejected', 'timed_out')}
+
+
+CollectedMetric('invoice_pdf_render_queue_depth', 'PDF render jobs waiting for a worker.', 'gauge',
+                _service_gauge('queue_depth'))
+CollectedMetric('invoice_pdf_render_queue_size', 'PDF render jobs the queue holds before refusing more.', 'gauge',
+                _service_gauge('queue_size'))
+CollectedMetric('invoice_pdf_render_busy_workers', 'PDF render workers converting a job.', 'gauge',
+                _service_gauge('busy'))
+CollectedMetric('invoice_pdf_render_jobs_total', 'Pooled PDF render jobs by outcome (timed_out also counts as failed).',
+                'counter', _service_jobs, ['outcome'])
+
+
+# --- asyncio rendering, for the async views under ASGI ---
+_async_limits = weakref.WeakKeyDictionary()
+_async_configuration = None
+
+
+def _async_limit():
+    # asyncio primitives belong to one event loop, so there is a limiter per loop
+    loop = asyncio.get_running_loop()
+    limit = _async_limits.get(loop)
+    if limit is None:
+        limit = _async_limits[loop] = asyncio.Semaphore(getattr(django_settings, 'PDF_ASYNC_RENDER_LIMIT', 4))
+    return limit
+
+
+def _configuration():
+    global _async_configuration
+    if _async_configuration is None:
+        wkhtmltopdf = find_wkhtmltopdf()
+        if not wkhtmltopdf:
+            raise WkhtmltopdfNotFound(
+                "wkhtmltopdf not found. Install wkhtmltopdf and/or set WKHTMLTOPDF_CMD in settings.py.")
+        _async_configuration = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+    return _async_configuration
+
+
+async def render_pdf_async(html, options=None, timeout=None):
+    """
+    Render ``html`` with wkhtmltopdf as an asyncio subprocess, so the event
+    loop serves other requests while the converter runs.
+
+    At most PDF_ASYNC_RENDER_LIMIT converters run at once per event loop;
+    a render that can't start within PDF_RENDER_SUBMIT_TIMEOUT raises
+    RenderQueueFull, like the worker pool. The converter is killed when it
+    exceeds its timeout or when the awaiting task is cancelled, e.g.
+    because the client disconnected.
+    """
+    timeout = timeout or getattr(django_settings, 'PDF_RENDER_TIMEOUT', 30)
+    limit = _async_limit()
+    try:
+        await asyncio.wait_for(limit.acquire(), getattr(django_settings, 'PDF_RENDER_SUBMIT_TIMEOUT', 2))
+    except asyncio.TimeoutError:
+        raise RenderQueueFull("PDF render queue is full, try again shortly.")
+    started = time.monotonic()
+    try:
+        args, source, env = _converter_command(html, dict(options or {}), _configuration())
+        proc = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE, env=env)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(source), timeout)
+        except asyncio.TimeoutError:
+            raise RenderTimeout(f"PDF render exceeded {timeout}s")
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return _converter_output(proc.returncode, stdout, stderr)
+    finally:
+        limit.release()
+        logger.info("async pdf render took %.3fs", time.monotonic() - started)
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import mimetypes
+import threading
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+
+from .images import logo_derivative
+
+
+STYLESHEET = 'assets/css/invoice-pdf.min.css'
+
+_logo_cache = {}
+_logo_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def pdf_stylesheet():
+    """The compiled stylesheet (see ``manage.py build_pdf_css``), read once per process."""
+    path = finders.find(STYLESHEET)
+    if not path:
+        return ''
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def pdf_stylesheet_version():
+    return hashlib.sha256(pdf_stylesheet().encode('utf-8')).hexdigest()[:16]
+
+
+def logo_data_uri(p_settings):
+    """
+    The company logo as a ``data:`` URI, so wkhtmltopdf never has to resolve
+    a URL. Uses the print-size derivative (the original when it can't be
+    built). Cached per Settings row and ``last_updated`` stamp.
+    """
+    logo = getattr(p_settings, 'companyLogo', None)
+    if not logo:
+        return ''
+    key = (p_settings.pk, p_settings.last_updated, logo.name)
+    uri = _logo_cache.get(key)
+    if uri is None:
+        name = logo_derivative(logo, 'print') or logo.name
+        try:
+            with logo.storage.open(name, 'rb') as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return ''
+        mime = mimetypes.guess_type(name)[0] or 'image/png'
+        uri = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        with _logo_lock:
+            # one entry per Settings row: drop versions superseded by an edit
+            for stale in [k for k in _logo_cache if k[0] == p_settings.pk]:
+                del _logo_cache[stale]
+            _logo_cache[key] = uri
+    return uri
+
+
+def pdf_assets(p_settings):
+    """Template context entries that make the PDF templates self-contained."""
+    return {
+        'pdf_css': pdf_stylesheet(),
+        'logo_data_uri': logo_data_uri(p_settings),
+    }
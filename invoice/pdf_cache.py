@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings as django_settings
+from django.template.loader import get_template
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the render options/pipeline change in a way the template hash can't see
+RENDER_VERSION = '2'
+
+
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """Hash of the template source, computed once per process."""
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+def _stamp(value):
+    return value.isoformat() if value else ''
+
+
+def pdf_fingerprint(invoice, products, p_settings, renderer_version):
+    """
+    Content address for a rendered invoice PDF.
+
+    Every input the PDF template reads is represented by its primary key and
+    ``last_updated`` stamp (bank details have no stamp, so their values are
+    hashed directly), so any edit produces a new fingerprint.
+    ``renderer_version`` identifies the engine and its template/layout.
+    """
+    h = hashlib.sha256()
+    h.update(f"render:{RENDER_VERSION}|{renderer_version}|".encode())
+    h.update(f"inv:{invoice.pk}:{_stamp(invoice.last_updated)}|".encode())
+    client = invoice.client
+    if client is not None:
+        h.update(f"cli:{client.pk}:{_stamp(client.last_updated)}|".encode())
+    for product in products:
+        h.update(f"prd:{product.pk}:{_stamp(product.last_updated)}|".encode())
+    if p_settings is not None:
+        h.update(f"set:{p_settings.pk}:{_stamp(p_settings.last_updated)}|".encode())
+        for bank in p_settings.bank_accounts.all():
+            h.update(f"bnk:{bank.pk}:{bank.bank_name}:{bank.account_name}:"
+                     f"{bank.account_number}:{bank.currency}|".encode())
+    return h.hexdigest()
+
+
+class PDFCache:
+    """
+    Size-bounded on-disk store of rendered PDFs.
+
+    Files are named ``<invoice uniqueId>-<fingerprint>.pdf``; storing a new
+    version of an invoice removes its older versions, and when the store grows
+    past ``max_bytes`` the least recently read files (by mtime, refreshed on
+    every hit) are evicted.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, invoice, fingerprint):
+        return os.path.join(self.root, f"{invoice.uniqueId}-{fingerprint}.pdf")
+
+    def get(self, invoice, fingerprint):
+        path = self._path(invoice, fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, invoice, fingerprint, data):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(invoice, fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.invalidate(invoice, keep=fingerprint)
+        self.evict()
+
+    def invalidate(self, invoice, keep=None):
+        """Remove cached versions of ``invoice`` other than ``keep``."""
+        prefix = f"{invoice.uniqueId}-"
+        keep_name = f"{prefix}{keep}.pdf" if keep else None
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.name.endswith('.pdf') and entry.name != keep_name:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        with self._lock:
+            files = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            files.sort()
+            for _mtime, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            logger.info("pdf cache evicted down to %d bytes", total)
+
+
+_cache = None
+
+
+def get_pdf_cache():
+    global _cache
+    if _cache is None:
+        _cache = PDFCache(
+            root=getattr(django_settings, 'PDF_CACHE_DIR', os.path.join(django_settings.MEDIA_ROOT, 'pdf_cache')),
+            max_bytes=getattr(django_settings, 'PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        )
+    return _cache
@@ -0,0 +1,279 @@
+import io
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
+from django.template.loader import get_template
+from django.utils.module_loading import import_string
+from xml.sax.saxutils import escape
+
+from .images import logo_derivative
+from .metrics import PDF_SECONDS, timed
+from .pdf import render_pdf, render_pdf_async, PDFRenderError
+from .pdf_assets import pdf_assets, pdf_stylesheet_version
+from .pdf_cache import template_version
+
+
+class BaseRenderer:
+    """
+    Turns an invoice document context into PDF bytes.
+
+    The context is the one the views already build for
+    ``invoice/pdf-template.html``: invoice, products, p_settings,
+    bank_detail and invoiceTotal.
+    """
+    name = None
+
+    def version(self):
+        """Changes whenever the output for the same context would change."""
+        raise NotImplementedError
+
+    def render(self, context, options=None):
+        raise NotImplementedError
+
+    async def render_async(self, context, options=None):
+        """render() for async views; by default in a worker thread, off the event loop."""
+        return await sync_to_async(self.render, thread_sensitive=False)(context, options)
+
+
+class PdfkitRenderer(BaseRenderer):
+    """
+    HTML template rendered by wkhtmltopdf through the shared worker pool.
+    The stylesheet and logo are inlined, so rendering needs no network.
+    """
+    name = 'pdfkit'
+    template_name = 'invoice/pdf-template.html'
+
+    def version(self):
+        return f"{self.name}:{template_version(self.template_name)}:{pdf_stylesheet_version()}"
+
+    def html(self, context):
+        context = {**context, **pdf_assets(context['p_settings'])}
+        return get_template(self.template_name).render(context)
+
+    def render(self, context, options=None):
+        with timed(PDF_SECONDS, self.name):
+            return render_pdf(self.html(context), options)
+
+    async def render_async(self, context, options=None):
+        # the template is quick and may touch the ORM, so it runs on the sync thread;
+        # the converter is the wait, and that runs as an asyncio subprocess
+        with timed(PDF_SECONDS, self.name):
+            html = await sync_to_async(self.html)(context)
+            return await render_pdf_async(html, options)
+
+
+class ReportLabRenderer(BaseRenderer):
+    """
+    Draws the pdf-template.html layout directly with ReportLab, in-process:
+    header, from/bill-to blocks, line items with total, bank details, notes.
+    """
+    name = 'reportlab'
+    # bump when the drawing code below changes
+    layout_version = '1'
+
+    def version(self):
+        return f"{self.name}:{self.layout_version}"
+
+    def render(self, context, options=None):
+        try:
+            with timed(PDF_SECONDS, self.name):
+                return self._render(context)
+        except PDFRenderError:
+            raise
+        except Exception as e:
+            raise PDFRenderError(f"ReportLab render failed: {e}") from e
+
+    def _render(self, context):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib.units import mm
+        from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+        slate900 = colors.HexColor('#0f172a')
+        slate600 = colors.HexColor('#475569')
+        slate500 = colors.HexColor('#64748b')
+        slate200 = colors.HexColor('#e2e8f0')
+        slate50 = colors.HexColor('#f8fafc')
+
+        base = ParagraphStyle('base', fontName='Helvetica', fontSize=9, leading=12, textColor=slate900)
+        muted = ParagraphStyle('muted', parent=base, textColor=slate500)
+        label = ParagraphStyle('label', parent=base, fontName='Helvetica-Bold', fontSize=7,
+                               leading=10, textColor=slate500)
+        strong = ParagraphStyle('strong', parent=base, fontName='Helvetica-Bold')
+        title = ParagraphStyle('title', parent=base, fontName='Helvetica-Bold', fontSize=18, leading=22)
+        right = ParagraphStyle('right', parent=base, alignment=2)
+        right_label = ParagraphStyle('right_label', parent=label, alignment=2)
+        right_strong = ParagraphStyle('right_strong', parent=strong, alignment=2)
+
+        def text(value, style=base):
+            return Paragraph(escape('' if value is None else str(value)), style)
+
+        invoice = context['invoice']
+        products = context['products']
+        p_settings = context['p_settings']
+        client = invoice.client
+        company_name = getattr(p_settings, 'companyName', None) or 'Iboy Technology'
+
+        buf = io.BytesIO()
+        doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=22 * mm, rightMargin=22 * mm,
+                                topMargin=22 * mm, bottomMargin=22 * mm,
+                                title=f"{company_name} — Invoice #{invoice.number}")
+        width = doc.width
+        story = []
+
+        # Header
+        heading = [text('Invoice', title), text(f"#{invoice.number}", muted)]
+        logo = getattr(p_settings, 'companyLogo', None)
+        logo_cell = ''
+        if logo:
+            try:
+                path = logo.storage.path(logo_derivative(logo, 'print') or logo.name)
+                logo_cell = Image(path, width=16 * mm, height=16 * mm, kind='proportional')
+            except (OSError, ValueError, NotImplementedError):
+                logo_cell = ''
+        dates = [
+            text('CREATED', right_label),
+            text(invoice.date_created.strftime('%b %d, %Y') if invoice.date_created else '', right_strong),
+            Spacer(1, 4),
+            text('DUE', right_label),
+            text(invoice.dueDate or '', right_strong),
+        ]
+        header = Table([[logo_cell, heading, dates]], colWidths=[20 * mm, width * 0.5, None])
+        header.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, slate200),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ]))
+        story += [header, Spacer(1, 8 * mm)]
+
+        # From / Bill To
+        def party(heading_text, name, obj):
+            rows = [text(heading_text, label), text(name, strong)]
+            if obj is not None:
+                rows += [
+                    text(obj.addressLine1),
+                    text(', '.join(x for x in [obj.state_or_province, obj.postalCode] if x)),
+                    text(obj.country.name if obj.country else ''),
+                    Spacer(1, 4),
+                    text(f"Email: {obj.emailAddress or ''}"),
+                    text(f"Phone: {obj.phoneNumber or ''}"),
+                ]
+                if obj.taxNumber:
+                    rows.append(text(f"Tax #: {obj.taxNumber}"))
+            return rows
+
+        half = (width - 6 * mm) / 2
+        parties = Table([[
+            party('FROM', company_name, p_settings),
+            '',
+            party('BILL TO', getattr(client, 'clientName', ''), client),
+        ]], colWidths=[half, 6 * mm, half])
+        parties.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOX', (0, 0), (0, 0), 0.5, slate200),
+            ('BOX', (2, 0), (2, 0), 0.5, slate200),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        story += [parties, Spacer(1, 8 * mm)]
+
+        # Items
+        rows = [[text('Item', strong), text('Quantity', right_strong), text('Amount', right_strong)]]
+        for product in products:
+            rows.append([
+                text(product.title, strong),
+                text(product.quantity, right),
+                text(f"{product.currency} {product.price}", right),
+            ])
+        rows.append(['', text('Total', ParagraphStyle('total_label', parent=right, textColor=slate600)),
+                     text(context.get('invoiceTotal', ''), ParagraphStyle('total', parent=right_strong, fontSize=11))])
+        items = Table(rows, colWidths=[width * 0.55, width * 0.2, width * 0.25], repeatRows=1)
+        items.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), slate50),
+            ('BOX', (0, 0), (-1, -1), 0.5, slate200),
+            ('LINEBELOW', (0, 0), (-1, -2), 0.25, slate200),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story += [items, Spacer(1, 8 * mm)]
+
+        # Bank Details
+        banks = [b for b in (context.get('bank_detail') or {}).values() if b]
+        story.append(text('BANK DETAILS', label))
+        if banks:
+            cards = []
+            for bank in banks:
+                cards.append([
+                    text(f"{bank.currency} Account", strong),
+                    text(f"Bank: {bank.bank_name}"),
+                    text(f"Account Name: {bank.account_name or company_name}"),
+                    text(f"Account #: {bank.account_number}"),
+                ])
+            per_row = 3
+            grid = [cards[i:i + per_row] for i in range(0, len(cards), per_row)]
+            grid[-1] += [''] * (per_row - len(grid[-1]))
+            bank_table = Table(grid, colWidths=[width / per_row] * per_row)
+            bank_table.setStyle(TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.white),
+                ('BOX', (0, 0), (-1, -1), 0.5, slate200),
+                ('LEFTPADDING', (0, 0), (-1, -1), 8),
+                ('TOPPADDING', (0, 0), (-1, -1), 6),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ]))
+            story += [Spacer(1, 3 * mm), bank_table]
+        story += [Spacer(1, 3 * mm),
+                  text(f"Please include invoice reference #{invoice.number} with your payment.", muted),
+                  Spacer(1, 8 * mm)]
+
+        # Notes
+        if invoice.notes:
+            story += [text('NOTES', label), Spacer(1, 2 * mm)]
+            story += [text(line, base) for line in invoice.notes.splitlines()]
+            story.append(Spacer(1, 8 * mm))
+
+        # Footer
+        generated = invoice.date_created.strftime('%b %d, %Y') if invoice.date_created else ''
+        footer = Table([[text(f"Thank you for choosing {company_name}.", muted),
+                         text(f"Generated on {generated}", ParagraphStyle('fr', parent=muted, alignment=2))]],
+                       colWidths=[width / 2, width / 2])
+        footer.setStyle(TableStyle([
+            ('LINEABOVE', (0, 0), (-1, 0), 0.5, slate200),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]))
+        story.append(footer)
+
+        doc.build(story)
+        return buf.getvalue()
+
+
+RENDERERS = {
+    PdfkitRenderer.name: PdfkitRenderer,
+    ReportLabRenderer.name: ReportLabRenderer,
+}
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_renderer(name=None):
+    """
+    Return the renderer selected by ``INVOICE_PDF_RENDERER`` (or ``name``):
+    a key of ``RENDERERS`` or a dotted path to a ``BaseRenderer`` subclass.
+    """
+    name = name or getattr(django_settings, 'INVOICE_PDF_RENDERER', PdfkitRenderer.name)
+    renderer = _renderers.get(name)
+    if renderer is None:
+        with _renderers_lock:
+            renderer = _renderers.get(name)
+            if renderer is None:
+                cls = RENDERERS.get(name) or import_string(name)
+                renderer = _renderers[name] = cls()
+    return renderer
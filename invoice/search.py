@@ -0,0 +1,198 @@
+import re
+
+from django.db import connection as db_connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import escape
+
+from .bulk import insert_rows
+from .models import Client, Invoice, Product, SearchDocument
+
+
+# FTS5 table (SQLite) kept in step with DOC_TABLE by triggers; see migration 0009
+FTS_TABLE = 'invoice_search_fts'
+DOC_TABLE = SearchDocument._meta.db_table
+
+# highlight markers returned by the engines, turned into <mark> after escaping
+_START, _STOP = '\x02', '\x03'
+
+
+# --- helper: what gets indexed for each object ---
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def document_values(kind, fields):
+    """(title, body) of the document for an object of ``kind``, from its field values."""
+    if kind == 'client':
+        return fields.get('clientName') or '', _join(fields.get('emailAddress'), fields.get('taxNumber'))
+    if kind == 'invoice':
+        return _join(fields.get('number'), fields.get('title')), fields.get('notes') or ''
+    return fields.get('title') or '', fields.get('description') or ''
+
+
+def document_for(obj):
+    """(kind, title, body, slug) for a Client, Invoice or Product."""
+    if isinstance(obj, Client):
+        kind, slug = 'client', None
+    elif isinstance(obj, Invoice):
+        kind, slug = 'invoice', obj.slug
+    elif isinstance(obj, Product):
+        kind, slug = 'product', None
+        if Product.invoice.is_cached(obj):
+            slug = obj.invoice.slug if obj.invoice else None
+        elif obj.invoice_id:
+            slug = Invoice.objects.filter(pk=obj.invoice_id).values_list('slug', flat=True).first()
+    else:
+        raise TypeError(f'not searchable: {obj!r}')
+    title, body = document_values(kind, vars(obj))
+    return kind, title, body, slug
+
+
+def index_object(obj):
+    kind, title, body, slug = document_for(obj)
+    values = {'title': title[:300], 'body': body, 'slug': slug, 'last_updated': timezone.now()}
+    if not SearchDocument.objects.filter(kind=kind, object_id=obj.pk).update(**values):
+        SearchDocument.objects.create(kind=kind, object_id=obj.pk, **values)
+
+
+def index_documents(documents):
+    """
+    Index new objects in one batch, for bulk insert paths that send no
+    signals. ``documents`` are (kind, object_id, field values, slug) tuples.
+    """
+    now = timezone.now()
+    rows = []
+    for kind, object_id, fields, slug in documents:
+        title, body = document_values(kind, fields)
+        rows.append((kind, object_id, title[:300], body, slug, None))
+    columns = ['kind', 'object_id', 'title', 'body', 'slug', 'last_updated']
+
+    with transaction.atomic():
+        if db_connection.vendor != 'sqlite':
+            stamp = db_connection.ops.adapt_datetimefield_value(now)
+            insert_rows(SearchDocument, columns, [row[:-1] + (stamp,) for row in rows])
+            return
+        # unstamped rows skip the per-row FTS triggers (migration 0010); index them in one statement
+        last_id = SearchDocument.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        insert_rows(SearchDocument, columns, rows)
+        with db_connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, title, body) SELECT id, title, body FROM {DOC_TABLE} "
+                           f"WHERE id > %s AND last_updated IS NULL", [last_id])
+        SearchDocument.objects.filter(id__gt=last_id, last_updated__isnull=True).update(last_updated=now)
+
+
+def remove_object(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def remove_objects(kind, object_ids):
+    """remove_object for a batch, in one statement."""
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+def relink_invoice_products(invoice):
+    """Point the invoice's line-item documents at its (possibly new) slug."""
+    product_ids = Product.objects.filter(invoice_id=invoice.pk).values('id')
+    SearchDocument.objects.filter(kind='product', object_id__in=product_ids).exclude(slug=invoice.slug) \
+        .update(slug=invoice.slug)
+
+
+def _reindex(chunk_size):
+    SearchDocument.objects.all().delete()
+    written = 0
+    sources = [
+        ('client', Client.objects.values('id', 'clientName', 'emailAddress', 'taxNumber'), None),
+        ('invoice', Invoice.objects.values('id', 'number', 'title', 'notes', 'slug'), 'slug'),
+        ('product', Product.objects.values('id', 'title', 'description', 'invoice__slug'), 'invoice__slug'),
+    ]
+    for kind, rows, slug_field in sources:
+        last_id = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_id).order_by('pk')[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]['id']
+            index_documents([(kind, row['id'], row, row[slug_field] if slug_field else None) for row in chunk])
+            written += len(chunk)
+    return written
+
+
+def rebuild_index(chunk_size=2000):
+    """
+    Recreate every SearchDocument from the source tables, in one
+    transaction so searches keep seeing the old index until it commits.
+    Returns the number of documents written.
+    """
+    with transaction.atomic():
+        written = _reindex(chunk_size)
+
+    if db_connection.vendor == 'sqlite':
+        with db_connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    elif db_connection.vendor == 'postgresql':
+        with db_connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {DOC_TABLE}")
+    return written
+
+
+# --- helper: querying ---
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:8]
+
+
+def _highlight(text):
+    """Escape ``text`` and turn the engine's highlight markers into <mark> tags."""
+    return escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def search(query, kind=None, limit=20, offset=0):
+    """
+    Ranked search over clients, invoices and line items. Every word must
+    match, as a prefix. Returns dicts with kind, object_id, title, slug,
+    snippet (safe HTML) and rank, best match first.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    vendor = db_connection.vendor
+    kind_sql = ' AND d.kind = %s' if kind else ''
+    kind_params = [kind] if kind else []
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.slug,
+                   snippet({FTS_TABLE}, -1, %s, %s, '…', 16),
+                   bm25({FTS_TABLE}, 10.0, 1.0) AS rank
+            FROM {FTS_TABLE} JOIN {DOC_TABLE} d ON d.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s{kind_sql}
+            ORDER BY rank LIMIT %s OFFSET %s"""
+        params = [_START, _STOP, match, *kind_params, limit, offset]
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.slug,
+                   ts_headline('simple', d.body, q, %s),
+                   ts_rank_cd(d.search_vector, q) + similarity(d.title, %s) AS rank
+            FROM {DOC_TABLE} d, to_tsquery('simple', %s) q
+            WHERE (d.search_vector @@ q OR d.title %% %s){kind_sql}
+            ORDER BY rank DESC LIMIT %s OFFSET %s"""
+        options = f'StartSel={_START}, StopSel={_STOP}, MaxWords=20, MinWords=5'
+        params = [options, query, tsquery, query, *kind_params, limit, offset]
+    else:
+        documents = SearchDocument.objects.all()
+        for term in terms:
+            documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        if kind:
+            documents = documents.filter(kind=kind)
+        return [{'kind': d.kind, 'object_id': d.object_id, 'title': d.title, 'slug': d.slug,
+                 'snippet': escape(d.body[:160]), 'rank': 0}
+                for d in documents.order_by('kind', 'title')[offset:offset + limit]]
+
+    with db_connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [{'kind': row[0], 'object_id': row[1], 'title': row[2], 'slug': row[3],
+             'snippet': _highlight(row[4]), 'rank': row[5]} for row in rows]
@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .company import company_settings
+from .images import build_derivatives
+from .models import BankDetail, Client, Invoice, Product, Settings
+from .search import index_object, relink_invoice_products, remove_object
+from .stats import CLIENTS, apply_invoice_change, bump, invoice_buckets
+from .totals import refresh_invoices
+
+
+# --- invoice totals: keep Invoice.subtotal/total/currency/line_count in step with its products ---
+@receiver(post_init, sender=Product)
+def remember_product_invoice(sender, instance, **kwargs):
+    instance._loaded_invoice_id = instance.invoice_id
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    # a product moved to another invoice changes the totals of both
+    invoice_ids = {instance.invoice_id, getattr(instance, '_loaded_invoice_id', None)} - {None}
+    if invoice_ids:
+        refresh_invoices(invoice_ids)
+    instance._loaded_invoice_id = instance.invoice_id
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # also fires for the cascade from deleting the invoice, when there is nothing left to update
+    if instance.invoice_id:
+        refresh_invoices([instance.invoice_id])
+
+
+# --- dashboard stats: StatCounter rows follow invoice and client changes ---
+@receiver(pre_save, sender=Invoice)
+def invoice_saving(sender, instance, update_fields=None, **kwargs):
+    # the stored row, not the (possibly stale) instance, is what the counters hold
+    stored = Invoice.objects.filter(pk=instance.pk).values('status', *Invoice.TOTAL_FIELDS).first() \
+        if instance.pk else None
+    instance._stats_before = (stored['status'], stored['currency'] or '', stored['total']) if stored else None
+    if stored and update_fields is not None and 'total' not in update_fields:
+        # the totals are not written (Invoice.save): take the stored ones, so the instance and counters agree
+        for name in Invoice.TOTAL_FIELDS:
+            setattr(instance, name, stored[name])
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, **kwargs):
+    after = (instance.status, instance.currency or '', instance.total)
+    apply_invoice_change(getattr(instance, '_stats_before', None), after)
+
+
+@receiver(pre_delete, sender=Invoice)
+def invoice_deleting(sender, instance, **kwargs):
+    apply_invoice_change(invoice_buckets([instance.pk]).get(instance.pk), None)
+
+
+@receiver(post_save, sender=Client)
+def client_saved(sender, instance, created, **kwargs):
+    if created:
+        bump(CLIENTS, count=1)
+
+
+@receiver(post_delete, sender=Client)
+def client_deleted(sender, instance, **kwargs):
+    bump(CLIENTS, count=-1)
+
+
+# --- search: SearchDocument rows follow clients, invoices and line items ---
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Product)
+def searchable_saved(sender, instance, **kwargs):
+    index_object(instance)
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_indexed(sender, instance, created, **kwargs):
+    index_object(instance)
+    if not created:
+        relink_invoice_products(instance)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Product)
+def searchable_deleted(sender, instance, **kwargs):
+    remove_object(sender.__name__.lower(), instance.pk)
+
+
+# --- logos: build the resized derivatives when a logo is uploaded ---
+@receiver(post_save, sender=Client)
+def client_logo_saved(sender, instance, **kwargs):
+    build_derivatives(instance.clientLogo)
+
+
+@receiver(post_save, sender=Settings)
+def company_logo_saved(sender, instance, **kwargs):
+    build_derivatives(instance.companyLogo)
+
+
+# --- company settings cache: every worker reloads once the change commits ---
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+@receiver(post_save, sender=BankDetail)
+@receiver(post_delete, sender=BankDetail)
+def company_settings_changed(sender, **kwargs):
+    company_settings.rows = None  # this process re-reads right away, inside the transaction
+    transaction.on_commit(company_settings.invalidate)
@@ -0,0 +1,130 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Client, Invoice, StatCounter
+
+
+# metrics kept in StatCounter
+CLIENTS = 'clients'
+INVOICES = 'invoices'
+
+OUTSTANDING_STATUSES = ('CURRENT', 'EMAIL_SENT', 'OVERDUE')
+
+
+def bump(metric, status='', currency='', count=0, amount=Decimal('0')):
+    """Add ``count``/``amount`` to one counter row, creating it on first use."""
+    if not count and not amount:
+        return
+    rows = StatCounter.objects.filter(metric=metric, status=status, currency=currency)
+    changes = {'count': F('count') + count, 'amount': F('amount') + amount, 'last_updated': timezone.now()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            StatCounter.objects.create(metric=metric, status=status, currency=currency,
+                                       count=count, amount=amount, last_updated=timezone.now())
+    except IntegrityError:
+        # another writer created the row first
+        rows.update(**changes)
+
+
+def invoice_buckets(invoice_ids):
+    """{invoice id: (status, currency, total)} as currently stored."""
+    return {pk: (status, currency or '', total)
+            for pk, status, currency, total in Invoice.objects.filter(pk__in=list(invoice_ids))
+            .values_list('pk', 'status', 'currency', 'total')}
+
+
+def apply_invoice_change(before, after):
+    """
+    Move one invoice between counter buckets. ``before``/``after`` are
+    (status, currency, total) tuples, or None when the invoice did not exist
+    before or no longer exists after.
+    """
+    if before == after:
+        return
+    if before is not None:
+        status, currency, total = before
+        bump(INVOICES, status, currency, -1, -Decimal(total))
+    if after is not None:
+        status, currency, total = after
+        bump(INVOICES, status, currency, 1, Decimal(total))
+
+
+def compute_stats():
+    """The counters as they should be, straight from the tables: {(metric, status, currency): (count, amount)}."""
+    expected = {(CLIENTS, '', ''): (Client.objects.count(), Decimal('0.00'))}
+    rows = (Invoice.objects.values('status', 'currency').annotate(n=Count('id'), amount=Sum('total'))
+            .order_by())
+    for row in rows:
+        key = (INVOICES, row['status'], row['currency'] or '')
+        count, amount = expected.get(key, (0, Decimal('0.00')))
+        expected[key] = (count + row['n'], amount + (row['amount'] or Decimal('0.00')))
+    return expected
+
+
+def reconcile_stats(dry_run=False):
+    """
+    Compare every counter with the tables and repair drift in one
+    transaction. Returns [(key, stored (count, amount), actual (count, amount))].
+    """
+    drift = []
+    with transaction.atomic():
+        expected = compute_stats()
+        stored = {(c.metric, c.status, c.currency): c for c in StatCounter.objects.select_for_update()}
+        for key in set(expected) | set(stored):
+            want = expected.get(key, (0, Decimal('0.00')))
+            counter = stored.get(key)
+            have = (counter.count, counter.amount) if counter else (0, Decimal('0.00'))
+            if have != want:
+                drift.append((key, have, want))
+                if dry_run:
+                    continue
+                if counter is None:
+                    counter = StatCounter(metric=key[0], status=key[1], currency=key[2])
+                counter.count, counter.amount = want
+                counter.last_updated = timezone.now()
+                counter.save()
+    return drift
+
+
+def dashboard_stats():
+    """
+    Everything the dashboard shows, from the StatCounter rows alone: a single
+    small query whose cost does not depend on how many invoices exist.
+    """
+    stats = {
+        'clients': 0,
+        'invoices': 0,
+        'paid': 0,
+        'outstanding': 0,
+        'overdue': 0,
+        'by_currency': {},
+    }
+    for counter in StatCounter.objects.all():
+        if counter.metric == CLIENTS:
+            stats['clients'] += counter.count
+            continue
+        if counter.metric != INVOICES or not counter.count:
+            # a bucket whose invoices are all gone keeps its row, at zero
+            continue
+        stats['invoices'] += counter.count
+        currency = stats['by_currency'].setdefault(counter.currency or '—', {
+            'outstanding': Decimal('0.00'), 'overdue': Decimal('0.00'), 'revenue': Decimal('0.00'),
+        })
+        if counter.status == 'PAID':
+            stats['paid'] += counter.count
+            currency['revenue'] += counter.amount
+        elif counter.status in OUTSTANDING_STATUSES:
+            stats['outstanding'] += counter.count
+            currency['outstanding'] += counter.amount
+            if counter.status == 'OVERDUE':
+                stats['overdue'] += counter.count
+                currency['overdue'] += counter.amount
+    # lineless invoices (no currency yet) count above but have no amounts to show
+    stats['by_currency'] = {currency: amounts for currency, amounts in sorted(stats['by_currency'].items())
+                            if any(amounts.values())}
+    return stats
@@ -0,0 +1,15 @@
+from django import template
+
+from invoice.images import logo_url as _logo_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def logo_url(field_file, spec='thumb'):
+    """
+    URL of a resized logo, e.g. ``{% logo_url p_settings.companyLogo 'thumb' %}``;
+    the original's URL if the derivative can't be built.
+    """
+    return _logo_url(field_file, spec)
@@ -1,3 +1,1039 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+import openpyxl
+from django.apps import apps as django_apps
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, transaction
+from django.forms import fields_for_model
+from django.test import (
+    AsyncClient, Client as DjangoClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.client import RequestFactory
+from django.utils import timezone
+
+from invoicing.asgi import DisconnectCancellation
+
+from . import api, mailer, metrics, pdf, pdf_cache, sequences
+from .autocomplete import ClientPickerForm
+from .imports import error_report_path, expire_error_reports, import_records
+from .lines import apply_line_operations
+from .management.commands import bench_endpoints
+from .models import (
+    BankDetail, Client, Invoice, InvoiceSequence, OutboundEmail, Product, SearchDocument, Settings, StatCounter,
+)
+from .overdue import sweep_overdue
+from .renderers import ReportLabRenderer, get_renderer
+from .search import search
+from .sequences import allocate_invoice_number, create_invoice
+from .stats import compute_stats, dashboard_stats
+from .totals import MAX_TOTAL, refresh_invoices
+from .views import viewDocumentInvoiceAsync
+
+try:
+    import psycopg2
+except ImportError:  # the pool tests need the driver, not a server
+    psycopg2 = None
+
+
+def stored_stats():
+    return {(c.metric, c.status, c.currency): (c.count, c.amount)
+            for c in StatCounter.objects.all() if c.count or c.amount}
+
+
+def expected_stats():
+    return {key: value for key, value in compute_stats().items() if any(value)}
+
+
+def fake_wkhtmltopdf(test, seconds=0):
+    """A stand-in converter that reads stdin, sleeps ``seconds`` and prints a PDF header."""
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'wkhtmltopdf')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\ncat > /dev/null\nsleep {seconds}\nprintf "%%PDF-1.4 fake\\n"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('api', password='secret')
+        cls.client_row = Client.objects.create(clientName='Acme', emailAddress='acme@example.com', country='NG')
+        for i in range(30):
+            invoice = Invoice.objects.create(number=f'INV-{i:03}', title='Work', client=cls.client_row,
+                                             status='PAID' if i % 2 else 'CURRENT')
+            for _ in range(3):
+                Product.objects.create(title='Line', quantity=2, price=5, currency='USD', invoice=invoice)
+
+    def get(self, view, query='', headers=None, **kwargs):
+        """Call an API view directly, so only its own queries are counted (not the session's)."""
+        request = RequestFactory().get(f'/invoice/api/v1/test?{query}', **(headers or {}))
+        request.user = self.user
+        response = view(request, **kwargs)
+        if response.status_code != 304:
+            response.data = json.loads(response.content)
+        return response
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get('/invoice/api/v1/invoices')
+        self.assertEqual(response.status_code, 401)
+
+    def test_list_pages_with_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/invoice/api/v1/invoices', {'limit': 20})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([row['number'] for row in body['data']][:2], ['INV-029', 'INV-028'])
+        self.assertIsNone(body['previous'])
+
+        body = self.client.get(body['next']).json()
+        self.assertEqual(len(body['data']), 10)
+        self.assertEqual(body['data'][-1]['number'], 'INV-000')
+        self.assertIsNone(body['next'])
+
+    def test_sparse_fields_and_embedded_products(self):
+        body = self.get(api.invoiceList, 'fields=number,total,client&include=products&limit=2').data
+        row = body['data'][0]
+        self.assertEqual(set(row), {'slug', 'number', 'total', 'client', 'products'})
+        self.assertEqual(row['total'], '30.00')
+        self.assertEqual(row['client'], {'slug': self.client_row.slug, 'clientName': 'Acme',
+                                         'emailAddress': 'acme@example.com'})
+        self.assertEqual(len(row['products']), 3)
+        self.assertEqual(row['products'][0]['currency'], 'USD')
+
+    def test_filters(self):
+        body = self.get(api.invoiceList, 'status=PAID&limit=200').data
+        self.assertEqual(len(body['data']), 15)
+        self.assertTrue(all(row['status'] == 'PAID' for row in body['data']))
+
+        invoice = Invoice.objects.get(number='INV-005')
+        body = self.get(api.productList, f'invoice={invoice.slug}').data
+        self.assertEqual(len(body['data']), 3)
+        self.assertEqual(body['data'][0]['invoice'], {'slug': invoice.slug, 'number': 'INV-005'})
+
+        body = self.get(api.clientList, 'country=ng').data
+        self.assertEqual(body['data'][0]['country'], 'NG')
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(api.invoiceList, 'fields=nope').status_code, 400)
+        self.assertEqual(self.get(api.invoiceList, 'include=clients').status_code, 400)
+        self.assertEqual(self.get(api.invoiceList, 'limit=0').status_code, 400)
+        self.assertEqual(self.get(api.invoiceList, 'cursor=garbage').status_code, 400)
+        self.assertEqual(self.get(api.invoiceList, 'due_from=tomorrow').status_code, 400)
+        self.assertEqual(self.get(api.invoiceDetail, slug='missing').status_code, 404)
+
+    def test_detail(self):
+        invoice = Invoice.objects.get(number='INV-007')
+        body = self.get(api.invoiceDetail, 'include=products', slug=invoice.slug).data
+        self.assertEqual(body['data']['number'], 'INV-007')
+        self.assertEqual(body['data']['line_count'], 3)
+
+    def test_conditional_get(self):
+        response = self.get(api.invoiceList, 'include=products&limit=5')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.get(api.invoiceList, 'include=products&limit=5', headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # changing a line item on the page changes the validator
+        Product.objects.filter(invoice__number='INV-029').first().save()
+        response = self.get(api.invoiceList, 'include=products&limit=5', headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # and so does deleting one
+        etag = response['ETag']
+        Product.objects.filter(invoice__number='INV-028').first().delete()
+        response = self.get(api.invoiceList, 'include=products&limit=5', headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_line_change_changes_validator_without_include(self):
+        # the totals change but the invoice's last_updated does not
+        response = self.get(api.invoiceList, 'limit=5')
+        etag = response['ETag']
+        invoice = Invoice.objects.get(number='INV-029')
+        Product.objects.create(title='Extra', quantity=1, price=10, currency='USD', invoice=invoice)
+        response = self.get(api.invoiceList, 'limit=5', headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['data'][0]['total'], '40.00')
+
+        response = self.get(api.invoiceDetail, slug=invoice.slug)
+        etag = response['ETag']
+        Product.objects.filter(invoice=invoice, title='Extra').delete()
+        response = self.get(api.invoiceDetail, slug=invoice.slug, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['total'], '30.00')
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for limit in (1, 5, 30):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(3):
+                    self.get(api.invoiceList, f'include=products&limit={limit}')
+                with self.assertNumQueries(2):
+                    self.get(api.invoiceList, f'fields=number,client&limit={limit}')
+                with self.assertNumQueries(2):
+                    self.get(api.productList, f'limit={limit}')
+                with self.assertNumQueries(2):
+                    self.get(api.clientList, f'limit={limit}')
+        invoice = Invoice.objects.first()
+        with self.assertNumQueries(3):
+            self.get(api.invoiceDetail, 'include=products', slug=invoice.slug)
+
+
+@override_settings(METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram('test_seconds', 'A test.', ['view'], buckets=(0.1, 1))
+        metrics.REGISTRY.remove(histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(histogram.exposition(), [
+            '# HELP test_seconds A test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+            'test_seconds_sum{view="a\\"b"} 5.550000',
+            'test_seconds_count{view="a\\"b"} 3',
+        ])
+
+    def test_requests_are_recorded_by_url_name(self):
+        user = User.objects.create_user('metrics', password='secret')
+        self.client.force_login(user)
+        before = metrics.REQUEST_QUERIES._series.get(('api-invoices',), [0] * 13)[-2]
+        self.client.get('/invoice/api/v1/invoices')
+        self.assertEqual(metrics.REQUEST_QUERIES._series[('api-invoices',)][-2], before + 1)
+        self.assertIn(('api-invoices', 'GET', '2xx'), metrics.REQUEST_SECONDS._series)
+        self.assertIn(('api-invoices',), metrics.QUERY_SECONDS._series)
+
+    def test_endpoint_access(self):
+        user = User.objects.create_user('metrics', password='secret')
+        self.client.force_login(user)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/invoice/metrics').status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/invoice/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE invoice_request_duration_seconds histogram', response.content)
+
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.client.logout()
+            with self.assertLogs('django.request', 'WARNING'):
+                self.assertEqual(self.client.get('/invoice/metrics').status_code, 403)
+            response = self.client.get('/invoice/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            # staff sessions are still let in alongside the scraper token
+            self.client.force_login(user)
+            self.assertEqual(self.client.get('/invoice/metrics').status_code, 200)
+
+
+class StatsTests(TestCase):
+    def assertStatsCurrent(self):
+        self.assertEqual(stored_stats(), expected_stats())
+
+    def test_counters_follow_every_change(self):
+        acme = Client.objects.create(clientName='Acme')
+        self.assertStatsCurrent()
+        first = Invoice.objects.create(number='S-1', client=acme)
+        second = Invoice.objects.create(number='S-2', client=acme, status='PAID')
+        line = Product.objects.create(title='A', quantity=2, price=5, currency='USD', invoice=first)
+        Product.objects.create(title='B', quantity=1, price=7, currency='EUR', invoice=second)
+        self.assertStatsCurrent()
+
+        # update: status, amount, currency and a line moving between invoices
+        first.status = 'OVERDUE'
+        first.save()
+        line.price = 9
+        line.save()
+        Product.objects.filter(pk=line.pk).update(currency='EUR')
+        refresh_invoices([first.pk])
+        line.refresh_from_db()
+        line.invoice = second
+        line.save()
+        self.assertStatsCurrent()
+
+        # delete: a line, an invoice with its lines (cascade), a queryset, then the client
+        Product.objects.create(title='C', quantity=1, price=3, currency='USD', invoice=first)
+        line.delete()
+        self.assertStatsCurrent()
+        second.delete()
+        self.assertFalse(Product.objects.filter(invoice_id=second.pk).exists())
+        self.assertStatsCurrent()
+        Invoice.objects.create(number='S-3', client=acme)
+        Invoice.objects.filter(client=acme).delete()
+        acme.delete()
+        self.assertStatsCurrent()
+        self.assertEqual(stored_stats(), {})
+
+    def test_dashboard_skips_empty_currency_rows(self):
+        acme = Client.objects.create(clientName='Acme')
+        paid = Invoice.objects.create(number='D-1', client=acme, status='PAID')
+        Product.objects.create(title='A', quantity=1, price=5, currency='USD', invoice=paid)
+        gone = Invoice.objects.create(number='D-2', client=acme, status='PAID')
+        Product.objects.create(title='B', quantity=1, price=7, currency='EUR', invoice=gone)
+        gone.delete()
+        Invoice.objects.create(number='D-3', client=acme)  # no lines, so no currency
+
+        stats = dashboard_stats()
+        self.assertEqual((stats['invoices'], stats['paid']), (2, 1))
+        self.assertEqual(list(stats['by_currency']), ['USD'])
+        self.assertEqual(stats['by_currency']['USD']['revenue'], Decimal('5.00'))
+
+
+@override_settings(INVOICE_NUMBER_BLOCK=1, INVOICE_NUMBER_FORMAT='INV-{year}-{number:05d}')
+class InvoiceNumberTests(TestCase):
+    def test_numbers_are_consecutive_within_a_year(self):
+        year = timezone.localdate().year
+        first, second = create_invoice(title='A'), create_invoice(title='B')
+        self.assertEqual([first.number, second.number], [f'INV-{year}-00001', f'INV-{year}-00002'])
+
+        # a rolled back insert hands its number back
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            create_invoice(title='C')
+            raise RuntimeError
+        self.assertEqual(create_invoice(title='D').number, f'INV-{year}-00003')
+
+    def test_a_new_year_restarts_the_sequence(self):
+        self.assertEqual([allocate_invoice_number(2025), allocate_invoice_number(2025)],
+                         ['INV-2025-00001', 'INV-2025-00002'])
+        self.assertEqual(allocate_invoice_number(2026), 'INV-2026-00001')
+        self.assertEqual(allocate_invoice_number(2025), 'INV-2025-00003')
+
+    @override_settings(INVOICE_NUMBER_BLOCK=10)
+    def test_blocks_are_handed_out_in_order(self):
+        self.addCleanup(setattr, sequences, '_block', sequences._Block())
+        sequences._block = sequences._Block()
+        self.assertEqual([allocate_invoice_number(2025) for _ in range(3)],
+                         ['INV-2025-00001', 'INV-2025-00002', 'INV-2025-00003'])
+        self.assertEqual(allocate_invoice_number(2026), 'INV-2026-00001')
+        self.assertEqual(InvoiceSequence.objects.get(year=2025).last_number, 10)
+
+
+class OverdueSweepTests(TestCase):
+    def test_only_past_due_outstanding_invoices_move(self):
+        today = date(2026, 3, 10)
+        due = {
+            'current_late': ('CURRENT', today - timedelta(days=1)),
+            'sent_late': ('EMAIL_SENT', today - timedelta(days=30)),
+            'current_due_today': ('CURRENT', today),
+            'paid_late': ('PAID', today - timedelta(days=1)),
+            'current_by_terms': ('CURRENT', None),
+            'current_within_terms': ('CURRENT', None),
+        }
+        invoices = {}
+        for name, (status, due_date) in due.items():
+            invoice = invoices[name] = Invoice.objects.create(number=name, status=status, dueDate=due_date,
+                                                              paymentTerms='14 days')
+            Product.objects.create(title='A', quantity=1, price=10, currency='USD', invoice=invoice)
+        # without a dueDate, due 14 days after the day they were created
+        for name, days in (('current_by_terms', 15), ('current_within_terms', 14)):
+            created = timezone.make_aware(datetime.combine(today - timedelta(days=days), datetime.min.time()))
+            Invoice.objects.filter(pk=invoices[name].pk).update(date_created=created)
+
+        self.assertEqual(sweep_overdue(today, dry_run=True)[0], 3)
+        self.assertEqual(sweep_overdue(today, chunk_size=2)[0], 3)
+        self.assertEqual({name: Invoice.objects.get(pk=invoice.pk).status for name, invoice in invoices.items()}, {
+            'current_late': 'OVERDUE', 'sent_late': 'OVERDUE', 'current_due_today': 'CURRENT',
+            'paid_late': 'PAID', 'current_by_terms': 'OVERDUE', 'current_within_terms': 'CURRENT',
+        })
+        self.assertEqual(stored_stats(), expected_stats())
+        self.assertEqual(sweep_overdue(today)[0], 0)
+
+
+class SearchBackfillTests(TestCase):
+    def test_migration_indexes_existing_rows_like_a_rebuild(self):
+        backfill = importlib.import_module('invoice.migrations.0009_search_documents').backfill_documents
+        client = Client.objects.create(clientName='Henry Ltd', emailAddress='henry@example.com')
+        invoice = Invoice.objects.create(number='B-1', title='Retainer', notes='monthly')
+        Product.objects.create(title='Hosting', description='shared', currency='USD', invoice=invoice)
+
+        def documents():
+            return sorted(SearchDocument.objects.values_list('kind', 'object_id', 'title', 'body', 'slug'))
+
+        rebuilt = documents()
+
+        SearchDocument.objects.all().delete()
+        backfill(django_apps, None)
+        self.assertEqual(documents(), rebuilt)
+        self.assertEqual([hit['object_id'] for hit in search('hen', kind='client')], [client.pk])
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings = override_settings(PDF_CACHE_DIR=cache_dir, INVOICE_PDF_RENDERER='pdfkit')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        pdf_cache._cache = None
+        self.addCleanup(setattr, pdf_cache, '_cache', None)
+
+        self.client.force_login(User.objects.create_user('viewer', password='secret'))
+        Settings.objects.create(companyName='Co')
+        client = Client.objects.create(clientName='Acme', emailAddress='a@example.com')
+        self.invoice = Invoice.objects.create(number='C-1', client=client)
+        Product.objects.create(title='Design', quantity=2, price=3, invoice=self.invoice)
+        self.url = '/invoice/invoices/view-document/{}'.format(self.invoice.slug)
+
+    def test_rendered_once_and_revalidated_by_etag(self):
+        with mock.patch('invoice.renderers.render_pdf', return_value=b'%PDF-1.4 cached') as render:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'%PDF-1.4 cached')
+            etag = response['ETag']
+
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(self.url).content, b'%PDF-1.4 cached')
+            self.assertEqual(render.call_count, 1)
+
+            # a new line item changes the fingerprint: rendered again, under a new ETag
+            Product.objects.create(title='Hosting', quantity=1, price=1, invoice=self.invoice)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertEqual(render.call_count, 2)
+
+
+class ReportLabRendererTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings = override_settings(PDF_CACHE_DIR=cache_dir, INVOICE_PDF_RENDERER='reportlab')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        pdf_cache._cache = None
+        self.addCleanup(setattr, pdf_cache, '_cache', None)
+        self.client.force_login(User.objects.create_user('viewer', password='secret'))
+
+    def test_renders_in_process_without_wkhtmltopdf(self):
+        company = Settings.objects.create(companyName='Co', companyLogo='company_logos/missing.jpg', country='NG')
+        BankDetail.objects.create(company=company, bank_name='Bank', account_name='Co', account_number='1',
+                                  currency='NGN')
+        client = Client.objects.create(clientName='A & <b>Sons</b>', emailAddress='a@example.com')
+        invoice = Invoice.objects.create(number='R-1', client=client, notes='line one\nline <two>')
+        for i in range(60):
+            Product.objects.create(title=f'Item {i} & co', quantity=2, price=3, currency='NGN', invoice=invoice)
+
+        with mock.patch('invoice.renderers.render_pdf', side_effect=AssertionError('wkhtmltopdf was used')):
+            response = self.client.get('/invoice/invoices/view-document/{}'.format(invoice.slug))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        # 60 lines do not fit on one page
+        self.assertGreater(response.content.count(b'/Type /Page\n'), 1)
+
+    def test_renderer_selection(self):
+        renderer = get_renderer()
+        self.assertIsInstance(renderer, ReportLabRenderer)
+        self.assertIs(get_renderer('reportlab'), renderer)
+        self.assertNotEqual(renderer.version(), get_renderer('pdfkit').version())
+
+
+class PdfRenderServiceTests(SimpleTestCase):
+    def wait_until_busy(self, service, busy):
+        deadline = time.monotonic() + 5
+        while service.stats()['busy'] != busy:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_full_queue_rejects_and_slow_jobs_time_out(self):
+        service = pdf.PDFRenderService(workers=1, queue_size=1, timeout=5, submit_timeout=0.05,
+                                       wkhtmltopdf=fake_wkhtmltopdf(self, 0.5))
+        running = service.submit('<p>1</p>')
+        self.wait_until_busy(service, 1)
+        queued = service.submit('<p>2</p>')
+        with self.assertRaises(pdf.RenderQueueFull):
+            service.submit('<p>3</p>')
+        self.assertEqual(service.stats()['queue_depth'], 1)
+        self.assertTrue(running.result(5).startswith(b'%PDF'))
+        self.assertTrue(queued.result(5).startswith(b'%PDF'))
+
+        with self.assertRaises(pdf.RenderTimeout):
+            service.render('<p>slow</p>', timeout=0.1)
+        self.wait_until_busy(service, 0)
+        stats = service.stats()
+        self.assertEqual({key: stats[key] for key in ('completed', 'failed', 'rejected', 'timed_out', 'queue_depth')},
+                         {'completed': 2, 'failed': 1, 'rejected': 1, 'timed_out': 1, 'queue_depth': 0})
+
+    def test_service_counters_are_exported(self):
+        service = pdf.PDFRenderService(workers=1, queue_size=3, wkhtmltopdf=fake_wkhtmltopdf(self))
+        self.addCleanup(setattr, pdf, '_service', pdf._service)
+        pdf._service = service
+        service.render('<p>1</p>')
+        text = metrics.render_metrics()
+        self.assertIn('invoice_pdf_render_queue_size 3\n', text)
+        self.assertIn('invoice_pdf_render_queue_depth 0\n', text)
+        self.assertIn('invoice_pdf_render_jobs_total{outcome="completed"} 1\n', text)
+        self.assertIn('invoice_pdf_render_job_seconds_count{stage="convert"}', text)
+
+
+class AsyncDocumentViewTests(TransactionTestCase):
+    # the async views reach the database from sync_to_async's thread, which
+    # cannot see a TestCase's uncommitted transaction
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(WKHTMLTOPDF_CMD=fake_wkhtmltopdf(self, 0.1), PDF_CACHE_DIR=self.media_root,
+                                     INVOICE_PDF_RENDERER='pdfkit',
+                                     EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        pdf._async_configuration = None
+        self.addCleanup(setattr, pdf, '_async_configuration', None)
+        pdf_cache._cache = None
+        self.addCleanup(setattr, pdf_cache, '_cache', None)
+
+        company = Settings.objects.create(companyName='Co')
+        BankDetail.objects.create(company=company, bank_name='Bank', account_name='Co', account_number='1',
+                                  currency='NGN')
+        client = Client.objects.create(clientName='Acme', emailAddress='a@example.com')
+        self.invoice = Invoice.objects.create(number='A-1', client=client)
+        Product.objects.create(title='Design', quantity=2, price=3, invoice=self.invoice)
+
+    def test_pdf_response_and_revalidation(self):
+        response = asyncio.run(AsyncClient().get(
+            '/invoice/invoices/view-document-async/{}'.format(self.invoice.slug)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+        # Django 3.2's AsyncClient cannot send extra headers, so call the view directly
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(asyncio.run(viewDocumentInvoiceAsync(request, self.invoice.slug)).status_code, 304)
+
+    def test_email_is_queued(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = asyncio.run(AsyncClient().get(
+                '/invoice/invoices/email-document-async/{}'.format(self.invoice.slug)))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(OutboundEmail.objects.values_list('to_email', 'status')), [('a@example.com', 'PENDING')])
+
+
+class DisconnectCancellationTests(SimpleTestCase):
+    def test_disconnect_cancels_the_handler(self):
+        state = {}
+
+        async def app(scope, receive, send):
+            await receive()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+
+        async def run():
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}, {'type': 'http.disconnect'}]
+
+            async def receive():
+                if len(messages) == 1:
+                    await asyncio.sleep(0.1)
+                return messages.pop(0)
+            await asyncio.wait_for(DisconnectCancellation(app)({'type': 'http'}, receive, None), 2)
+
+        with self.assertLogs('invoicing.asgi', 'INFO'):
+            asyncio.run(run())
+        self.assertTrue(state.get('cancelled'))
+
+    def test_completed_request_is_not_cancelled(self):
+        sent = []
+
+        async def app(scope, receive, send):
+            await receive()
+            await send({'type': 'http.response.start', 'status': 200})
+
+        async def send(message):
+            sent.append(message)
+
+        async def run():
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            client_gone = asyncio.Event()
+
+            async def receive():
+                if not messages:
+                    await client_gone.wait()
+                return messages.pop(0)
+            await asyncio.wait_for(DisconnectCancellation(app)({'type': 'http'}, receive, send), 2)
+
+        asyncio.run(run())
+        self.assertEqual(sent, [{'type': 'http.response.start', 'status': 200}])
+
+
+class MailerTests(TestCase):
+    def test_delivery_only_moves_current_invoices(self):
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(b'%PDF-1.4')
+        self.addCleanup(os.remove, f.name)
+        invoices = {}
+        for status in ('CURRENT', 'OVERDUE', 'PAID'):
+            invoice = invoices[status] = Invoice.objects.create(number=status, status=status)
+            Product.objects.create(title='A', quantity=1, price=10, currency='USD', invoice=invoice)
+        jobs = [OutboundEmail.objects.create(invoice=invoice, to_email='a@example.com', attachment=f.name,
+                                             next_attempt_at=timezone.now())
+                for invoice in invoices.values()]
+
+        self.assertEqual(mailer.deliver_batch(jobs), (3, 0, 0))
+        self.assertEqual({status: Invoice.objects.get(pk=invoice.pk).status for status, invoice in invoices.items()},
+                         {'CURRENT': 'EMAIL_SENT', 'OVERDUE': 'OVERDUE', 'PAID': 'PAID'})
+        self.assertEqual(stored_stats(), expected_stats())
+
+
+class XlsxImportTests(TestCase):
+    def workbook(self, *rows):
+        workbook = openpyxl.Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        data = io.BytesIO()
+        workbook.save(data)
+        return data.getvalue()
+
+    def test_xlsx_rows_are_imported(self):
+        invoice = Invoice.objects.create(number='X-1')
+        data = self.workbook(['Invoice', 'Title', 'Quantity', 'Price', 'Currency'],
+                             ['X-1', 'Design', 2, 150.5, 'usd'],
+                             [None, None, None, None, None],
+                             ['X-1', 'Hosting', '1', '12', 'USD'],
+                             ['X-9', 'Nowhere', 1, 1, 'USD'])
+        report = io.StringIO()
+        result = import_records(io.BytesIO(data), 'lines.XLSX', 'products', error_report=report)
+        self.assertEqual((result.rows, result.created, result.errors), (3, 2, 1))
+        self.assertIn('5,"no invoice numbered ""X-9"""', report.getvalue())
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.total, invoice.line_count, invoice.currency), (Decimal('313.00'), 2, 'USD'))
+
+    def test_xlsx_upload(self):
+        self.client.force_login(User.objects.create_user('importer', password='secret'))
+        upload = SimpleUploadedFile('clients.xlsx', self.workbook(['clientName', 'emailAddress'],
+                                                                  ['Henry Ltd', 'accounts@henry.example']))
+        response = self.client.post('/invoice/clients/import', {'kind': 'clients', 'file': upload}, follow=True)
+        self.assertIn('Imported 1 of 1 rows', [str(m) for m in response.context['messages']][0])
+        self.assertTrue(Client.objects.filter(clientName='Henry Ltd', emailAddress='accounts@henry.example').exists())
+
+
+class ImportErrorReportTests(TestCase):
+    def setUp(self):
+        report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, report_dir)
+        settings = override_settings(IMPORT_REPORT_DIR=report_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('importer', password='secret')
+        self.client.force_login(self.user)
+
+    def upload(self):
+        upload = SimpleUploadedFile('clients.csv', b'clientName,emailAddress\nAcme,not-an-email\n')
+        response = self.client.post('/invoice/clients/import', {'kind': 'clients', 'file': upload}, follow=True)
+        warning = [str(m) for m in response.context['messages'] if 'rejected' in str(m)][0]
+        return warning.rsplit(' ', 1)[-1]
+
+    def test_report_is_served_to_the_uploader_only(self):
+        url = self.upload()
+        self.assertNotIn(django_settings.MEDIA_URL, url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'not-an-email', b''.join(response.streaming_content))
+        self.assertNotEqual(self.upload(), url)
+
+        self.client.force_login(User.objects.create_user('other', password='secret'))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_old_reports_expire(self):
+        name = self.upload().rsplit('/', 1)[-1]
+        path = error_report_path(name)
+        self.assertEqual(expire_error_reports(), 0)
+        os.utime(path, (0, 0))
+        self.assertEqual(expire_error_reports(), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+class ClientAutocompleteTests(TestCase):
+    url = '/invoice/clients/autocomplete'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.henry = Client.objects.create(clientName='Henry Ltd', emailAddress='accounts@henry.example')
+        Client.objects.create(clientName='Globex', emailAddress='henrietta@globex.example')
+        Client.objects.create(clientName='Initech')
+
+    def suggest(self, **query):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, 200)
+        return [row['clientName'] for row in response.json()['results']]
+
+    def test_requires_login(self):
+        response = self.client.get(self.url, {'q': 'hen'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login', response['Location'])
+
+    def test_suggestions(self):
+        self.client.force_login(User.objects.create_user('picker', password='secret'))
+        self.assertEqual(self.suggest(q=''), [])
+        self.assertEqual(self.suggest(q='h'), [])
+        self.assertEqual(sorted(self.suggest(q='hen')), ['Globex', 'Henry Ltd'])
+        self.assertEqual(self.suggest(q='henry ltd'), ['Henry Ltd'])
+        self.assertEqual(len(self.suggest(q='hen', limit='1')), 1)
+        self.assertEqual(self.suggest(q='initech'), ['Initech'])
+        self.assertEqual(self.suggest(q='nobody'), [])
+        response = self.client.get(self.url, {'q': 'hen'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'slug', 'clientName', 'emailAddress'})
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_picker_rejects_unknown_clients(self):
+        invoice = Invoice.objects.create(number='P-1')
+        for value in (self.henry.slug, str(self.henry.pk + 100), ''):
+            with self.subTest(client=value):
+                form = ClientPickerForm({'client': value}, instance=invoice)
+                self.assertFalse(form.is_valid())
+        form = ClientPickerForm({'client': self.henry.slug}, instance=invoice)
+        form.is_valid()
+        self.assertEqual(form.errors['client'], ['Choose a client from the suggestions.'])
+
+        form = ClientPickerForm({'client': self.henry.pk}, instance=invoice)
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).client_id, self.henry.pk)
+
+
+class InvoiceLinesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('lines', password='secret'))
+        self.invoice = Invoice.objects.create(number='B-1', title='Build')
+        self.kept = Product.objects.create(title='Design', quantity=2, price=100, currency='USD', invoice=self.invoice)
+        self.gone = Product.objects.create(title='Gadget', quantity=1, price=50, currency='USD', invoice=self.invoice)
+        self.url = '/invoice/invoices/{}/lines'.format(self.invoice.slug)
+
+    def post(self, payload, client=None, **extra):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return (client or self.client).post(self.url, body, content_type='application/json', **extra)
+
+    def lines(self):
+        return sorted(Product.objects.filter(invoice=self.invoice).values_list('title', 'quantity', 'price'))
+
+    def test_one_bad_operation_rejects_the_batch(self):
+        before = self.lines()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.post({
+                'add': [{'title': 'Hosting', 'quantity': 1, 'price': 10}, {'quantity': 1}],
+                'update': [{'slug': self.kept.slug, 'price': 'lots'}],
+                'delete': ['no-such-line'],
+            })
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(set(errors), {'add', 'update', 'delete'})
+        self.assertEqual(set(errors['add']), {'1'})
+        self.assertIn('title', errors['add']['1'])
+        self.assertIn('price', errors['update']['0'])
+        self.assertIn('slug', errors['delete']['0'])
+        self.assertEqual(self.lines(), before)
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).total, Decimal('250.00'))
+
+    def test_batch_is_applied_with_one_totals_refresh(self):
+        with mock.patch('invoice.lines.refresh_invoices', wraps=refresh_invoices) as refresh:
+            response = self.post({
+                'add': [{'title': 'Hosting', 'quantity': 3, 'price': 10, 'currency': 'USD'},
+                        {'title': 'Widget', 'description': 'blue', 'quantity': 1, 'price': 5, 'currency': 'USD'}],
+                'update': [{'slug': self.kept.slug, 'title': 'Redesign', 'price': 120}],
+                'delete': [self.gone.slug],
+            })
+        self.assertEqual(response.status_code, 200)
+        refresh.assert_called_once_with([self.invoice.pk])
+
+        self.assertEqual(self.lines(), [('Hosting', 3.0, 10.0), ('Redesign', 2.0, 120.0), ('Widget', 1.0, 5.0)])
+        data = response.json()
+        self.assertEqual(data['invoice'], {'slug': self.invoice.slug, 'subtotal': '275.00', 'total': '275.00',
+                                           'currency': 'USD', 'line_count': 3})
+        self.assertEqual([line['title'] for line in data['lines']], ['Redesign', 'Hosting', 'Widget'])
+        self.assertIn('Widget', data['html'])
+        self.assertNotIn('Gadget', data['html'])
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual((invoice.subtotal, invoice.total, invoice.line_count), (Decimal('275.00'),) * 2 + (3,))
+        self.assertEqual(stored_stats(), expected_stats())
+
+        # the search index follows: new and renamed lines are found, removed ones are not
+        def titles(query):
+            return [hit['title'] for hit in search(query, kind='product')]
+
+        self.assertEqual(titles('widget'), ['Widget'])
+        self.assertEqual(titles('redesign'), ['Redesign'])
+        self.assertEqual(titles('design'), [])
+        self.assertEqual(titles('gadget'), [])
+
+    def test_json_errors(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.post('{not json').status_code, 400)
+            self.assertEqual(self.post('[]').json(), {'error': 'Expected a JSON object'})
+            self.assertEqual(self.post({'add': {'title': 'x'}}).json(),
+                             {'error': 'add, update and delete must be lists'})
+            self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_csrf_is_enforced(self):
+        client = DjangoClient(enforce_csrf_checks=True)
+        client.force_login(User.objects.get(username='lines'))
+        payload = {'delete': [self.gone.slug]}
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            self.assertEqual(self.post(payload, client=client).status_code, 403)
+        self.assertEqual(len(self.lines()), 2)
+
+        token = 'a' * 32
+        client.cookies['csrftoken'] = token
+        self.assertEqual(self.post(payload, client=client, HTTP_X_CSRFTOKEN=token).status_code, 200)
+        self.assertEqual(len(self.lines()), 1)
+
+
+class InvoiceListTests(TestCase):
+    def test_client_filter_does_not_list_the_clients(self):
+        self.client.force_login(User.objects.create_user('lister', password='secret'))
+        acme = Client.objects.create(clientName='Acme Ltd')
+        Client.objects.create(clientName='Globex Corp')
+        Invoice.objects.create(number='L-1', client=acme)
+
+        response = self.client.get('/invoice/invoices', {'client': acme.pk})
+        self.assertContains(response, 'value="Acme Ltd"')
+        self.assertContains(response, 'name="client" id="filterClient" value="{}"'.format(acme.pk))
+        self.assertNotContains(response, 'Globex Corp')
+        self.assertNotContains(response, '<option value="{}"'.format(acme.pk))
+
+
+class ExportFilterTests(TestCase):
+    def test_bad_filters_are_rejected(self):
+        self.client.force_login(User.objects.create_user('export', password='secret'))
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/invoice/invoices/export.zip', {'due_from': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+        for command in ('export_invoices_zip', 'run_invoice_batch'):
+            with self.subTest(command=command), self.assertRaisesMessage(CommandError, 'YYYY-MM-DD'):
+                call_command(command, due_from='garbage', stdout=io.StringIO())
+
+
+class BenchEndpointsCompareTests(SimpleTestCase):
+    def compare(self, before, after, **options):
+        meta = {'invoices': 10, 'clients': 2, 'lines': 1, 'database': 'sqlite'}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'meta': meta, 'endpoints': before}, f)
+        self.addCleanup(os.remove, f.name)
+        options = {'baseline': f.name, 'metric': 'p50', 'threshold': 20, 'min_delta_ms': 2, 'normalize': False,
+                   **options}
+        command = bench_endpoints.Command(stdout=io.StringIO())
+        command.compare({'meta': meta, 'endpoints': after}, options)
+
+    def test_within_threshold(self):
+        self.compare({'GET dashboard': {'p50_ms': 10.0, 'queries': 3}},
+                     {'GET dashboard': {'p50_ms': 11.5, 'queries': 3}, 'GET new': {'p50_ms': 1.0, 'queries': 1}})
+        # slower by more than the threshold, but by less than min_delta_ms
+        self.compare({'GET api': {'p50_ms': 1.0, 'queries': 3}}, {'GET api': {'p50_ms': 2.0, 'queries': 3}})
+
+    def test_regressions(self):
+        with self.assertRaisesMessage(CommandError, 'GET dashboard'):
+            self.compare({'GET dashboard': {'p50_ms': 10.0, 'queries': 3}},
+                         {'GET dashboard': {'p50_ms': 15.0, 'queries': 3}})
+        with self.assertRaisesMessage(CommandError, 'GET invoices'):
+            self.compare({'GET invoices': {'p50_ms': 10.0, 'queries': 3}},
+                         {'GET invoices': {'p50_ms': 10.0, 'queries': 4}})
+
+    def test_normalize_divides_out_machine_drift(self):
+        before = {'GET a': {'p50_ms': 10.0, 'queries': 1}, 'GET b': {'p50_ms': 20.0, 'queries': 1},
+                  'GET c': {'p50_ms': 40.0, 'queries': 1}}
+        slower_machine = {key: {'p50_ms': value['p50_ms'] * 1.5, 'queries': 1} for key, value in before.items()}
+        self.compare(before, slower_machine, normalize=True)
+        slower_machine['GET c']['p50_ms'] = 90.0
+        with self.assertRaisesMessage(CommandError, 'GET c'):
+            self.compare(before, slower_machine, normalize=True)
+
+
+class InvoiceTotalsTests(TestCase):
+    def setUp(self):
+        self.invoice = Invoice.objects.create(number='T-1', title='Work')
+
+    def totals(self, invoice=None):
+        invoice = Invoice.objects.get(pk=(invoice or self.invoice).pk)
+        return invoice.total, invoice.line_count, invoice.currency
+
+    def test_line_items_keep_the_totals(self):
+        line = Product.objects.create(title='A', quantity=2, price=5, currency='USD', invoice=self.invoice)
+        Product.objects.create(title='B', quantity=1, price=2.5, currency='USD', invoice=self.invoice)
+        self.assertEqual(self.totals(), (Decimal('12.50'), 2, 'USD'))
+
+        line.price = 10
+        line.save()
+        self.assertEqual(self.totals(), (Decimal('22.50'), 2, 'USD'))
+
+        other = Invoice.objects.create(number='T-2', title='Other')
+        line.invoice = other
+        line.save()
+        self.assertEqual(self.totals(), (Decimal('2.50'), 1, 'USD'))
+        self.assertEqual(self.totals(other), (Decimal('20.00'), 1, 'USD'))
+
+        Product.objects.filter(invoice=self.invoice).delete()
+        self.assertEqual(self.totals(), (Decimal('0.00'), 0, None))
+
+    def test_stale_instance_does_not_overwrite_totals(self):
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        Product.objects.create(title='A', quantity=1, price=10, currency='USD', invoice=self.invoice)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.totals(), (Decimal('10.00'), 1, 'USD'))
+        self.assertEqual(stale.total, Decimal('10.00'))
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).title, 'Renamed')
+        self.assertEqual(stored_stats(), expected_stats())
+
+        client = Client.objects.create(clientName='Acme')
+        form = ClientPickerForm({'client': client.pk}, instance=Invoice.objects.get(pk=self.invoice.pk))
+        Product.objects.create(title='B', quantity=1, price=5, currency='USD', invoice=self.invoice)
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(self.totals(), (Decimal('15.00'), 2, 'USD'))
+
+    def test_totals_are_not_editable(self):
+        self.assertFalse(set(Invoice.TOTAL_FIELDS) & set(fields_for_model(Invoice)))
+
+    def test_lines_overflowing_the_total_are_rejected(self):
+        # one line at the field bounds always fits
+        self.assertLessEqual(Product.MAX_QUANTITY * Product.MAX_PRICE, MAX_TOTAL)
+        with self.assertRaises(ValidationError):
+            Product._meta.get_field('price').clean(Product.MAX_PRICE + 1, None)
+
+        with self.assertRaises(ValidationError):
+            Product.objects.create(title='Big', quantity=100000, price=1e9, currency='USD', invoice=self.invoice)
+        self.assertEqual(self.totals(), (Decimal('0.00'), 0, None))
+
+        Product.objects.create(title='A', quantity=Product.MAX_QUANTITY, price=Product.MAX_PRICE, currency='USD',
+                               invoice=self.invoice)
+        second = Product(title='B', quantity=Product.MAX_QUANTITY, price=Product.MAX_PRICE, currency='USD',
+                         invoice=self.invoice)
+        with self.assertRaisesMessage(ValidationError, 'past 999999999999.99'):
+            second.full_clean()
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.assertEqual(self.totals(), (Decimal('999999000000.00'), 1, 'USD'))
+
+        with self.assertRaisesMessage(ValueError, 'add up to more than'):
+            apply_line_operations(self.invoice, add=[{'title': 'C', 'quantity': 2, 'price': Product.MAX_PRICE}])
+        self.assertEqual(Product.objects.filter(invoice=self.invoice).count(), 1)
+
+
+class StubPgConnection:
+    """Just enough of a psycopg2 connection for the pool and its health checks."""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rolled_back = False
+        self.in_transaction = False
+
+    def cursor(self):
+        if self.broken:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        return mock.MagicMock()
+
+    def get_transaction_status(self):
+        from psycopg2 import extensions
+        return extensions.TRANSACTION_STATUS_INTRANS if self.in_transaction else extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rolled_back = True
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+@skipIf(psycopg2 is None, 'psycopg2 is not installed')
+class PostgresPoolTests(SimpleTestCase):
+    def setUp(self):
+        from invoicing.db.postgresql import base
+        self.base = base
+        self.opened = []
+
+    def connect(self):
+        conn = StubPgConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_checkout_reuses_idle_connections(self):
+        pool = self.base.ConnectionPool(self.connect, max_size=2)
+        conn = pool.get()
+        pool.put(conn)
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_exhausted_pool_waits_then_raises(self):
+        pool = self.base.ConnectionPool(self.connect, max_size=1, timeout=0.05)
+        conn = pool.get()
+        with self.assertRaisesMessage(OperationalError, 'connection pool exhausted'):
+            pool.get()
+        pool.put(conn)
+        self.assertIs(pool.get(), conn)
+
+    def test_broken_connection_is_evicted_on_checkout(self):
+        pool = self.base.ConnectionPool(self.connect, max_size=1)
+        broken = pool.get()
+        pool.put(broken)
+        broken.broken = True
+        conn = pool.get()
+        self.assertIsNot(conn, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_returned_connections_are_rolled_back_or_discarded(self):
+        pool = self.base.ConnectionPool(self.connect, max_size=1)
+        conn = pool.get()
+        conn.in_transaction = True
+        pool.put(conn)
+        self.assertTrue(conn.rolled_back)
+        self.assertIs(pool.get(), conn)
+
+        conn.close()
+        pool.put(conn)
+        self.assertIsNot(pool.get(), conn)
+
+    def wrapper(self):
+        wrapper = self.base.DatabaseWrapper({
+            'ENGINE': 'invoicing.db.postgresql', 'NAME': 'invoicing', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'AUTOCOMMIT': True, 'CONN_MAX_AGE': None, 'ATOMIC_REQUESTS': False,
+            'TIME_ZONE': None, 'HEALTH_CHECKS': True,
+        }, alias='pool-test')
+        wrapper.connection = self.connect()
+        wrapper.autocommit = True
+        return wrapper
+
+    def test_health_check_runs_once_per_request(self):
+        wrapper = self.wrapper()
+        with mock.patch.object(wrapper, 'is_usable', return_value=True) as is_usable:
+            for _request in range(2):
+                wrapper.close_if_unusable_or_obsolete()  # request_started
+                wrapper.close_if_health_check_failed()  # first query
+                wrapper.close_if_health_check_failed()  # later queries
+                wrapper.close_if_unusable_or_obsolete()  # request_finished
+        self.assertEqual(is_usable.call_count, 2)
+        self.assertIsNotNone(wrapper.connection)
+
+    def test_failed_health_check_closes_the_connection(self):
+        wrapper = self.wrapper()
+        conn = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, 'is_usable', return_value=False):
+            wrapper.close_if_health_check_failed()
+        self.assertIsNone(wrapper.connection)
+        self.assertTrue(conn.closed)
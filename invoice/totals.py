@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Invoice, Product
+from .stats import apply_invoice_change, invoice_buckets
+
+
+TOTAL_FIELDS = list(Invoice.TOTAL_FIELDS)
+
+CENT = Decimal('0.01')
+
+MAX_TOTAL = Invoice.MAX_TOTAL
+
+
+def check_totals_fit(invoice_ids):
+    """
+    Raise ValidationError if the line items of any of ``invoice_ids`` add up
+    to more than Invoice.total holds. Called before the totals are stored,
+    inside the transaction of the line item write, which it then undoes.
+    """
+    limit = float(MAX_TOTAL)
+    over = list(Product.objects.filter(invoice_id__in=list(invoice_ids)).values('invoice_id')
+                .annotate(amount=Sum(F('quantity') * F('price'), output_field=FloatField()))
+                .filter(Q(amount__gt=limit) | Q(amount__lt=-limit)).order_by().values_list('invoice_id', flat=True))
+    if over:
+        numbers = Invoice.objects.filter(pk__in=over).order_by('pk').values_list('number', flat=True)
+        raise ValidationError('The line items of invoice %(numbers)s add up to more than %(max)s.',
+                              code='total_overflow',
+                              params={'numbers': ', '.join(str(number) for number in numbers), 'max': MAX_TOTAL})
+
+
+def compute_invoice_totals(invoice_ids):
+    """
+    Totals for ``invoice_ids`` straight from their line items:
+    {invoice id: {'subtotal', 'total', 'currency', 'line_count'}}.
+
+    The currency is that of the last line item that has one, as the
+    invoice templates have always shown it. Invoices have no tax or
+    discount lines, so ``total`` equals ``subtotal``.
+    """
+    invoice_ids = list(invoice_ids)
+    totals = {pk: {'subtotal': Decimal('0.00'), 'total': Decimal('0.00'), 'currency': None, 'line_count': 0}
+              for pk in invoice_ids}
+    if not invoice_ids:
+        return totals
+
+    lines = (Product.objects.filter(invoice_id__in=invoice_ids).values('invoice_id')
+             .annotate(amount=Sum(F('quantity') * F('price'), output_field=FloatField()), count=Count('id'))
+             .order_by())
+    for row in lines:
+        amount = Decimal(str(row['amount'] or 0)).quantize(CENT)
+        totals[row['invoice_id']].update(subtotal=amount, total=amount, line_count=row['count'])
+
+    currencies = (Product.objects.filter(invoice_id__in=invoice_ids).exclude(currency='')
+                  .exclude(currency__isnull=True).order_by('invoice_id', 'id').values_list('invoice_id', 'currency'))
+    for invoice_id, currency in currencies:
+        totals[invoice_id]['currency'] = currency
+    return totals
+
+
+def recalculate_invoice_totals(invoice_ids):
+    """
+    Recompute and store the denormalized totals of ``invoice_ids``.
+
+    This is a single UPDATE with correlated subqueries over the line items,
+    so the signal handlers pay one query per change. Only the total columns
+    are written, so ``last_updated`` and the rest of the invoice stay as
+    they are. Ids of invoices that no longer exist match no rows. Sums
+    beyond MAX_TOTAL raise ValidationError (check_totals_fit).
+    """
+    check_totals_fit(invoice_ids)
+    lines = Product.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+    amount = Coalesce(Subquery(lines.annotate(amount=Sum(F('quantity') * F('price'), output_field=FloatField()))
+                               .values('amount')), Value(0.0))
+    amount = Cast(amount, DecimalField(max_digits=14, decimal_places=2))
+    count = Coalesce(Subquery(lines.annotate(count=Count('id')).values('count')), Value(0))
+    currency = Subquery(Product.objects.filter(invoice=OuterRef('pk')).exclude(currency='')
+                        .exclude(currency__isnull=True).order_by('-id').values('currency')[:1])
+    return Invoice.objects.filter(pk__in=list(invoice_ids)).update(
+        subtotal=amount, total=amount, currency=currency, line_count=count)
+
+
+def refresh_invoices(invoice_ids):
+    """Recalculate the totals of ``invoice_ids`` and move them between dashboard stats buckets."""
+    with transaction.atomic():
+        before = invoice_buckets(invoice_ids)
+        recalculate_invoice_totals(invoice_ids)
+        after = invoice_buckets(invoice_ids)
+        for pk in before:
+            apply_invoice_change(before[pk], after.get(pk))
@@ -1,5 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, metrics, views
+
+# under ASGI the async variants keep the event loop free while a PDF renders
+if settings.INVOICE_ASYNC_PDF_VIEWS:
+    document_view, email_view = views.viewDocumentInvoiceAsync, views.emailDocumentInvoiceAsync
+else:
+    document_view, email_view = views.viewDocumentInvoice, views.emailDocumentInvoice
 
 urlpatterns = [
 path('login',views.login, name='login'),
@@ -8,18 +15,39 @@ path('dashboard',views.dashboard, name='dashboard'),
 path('invoices',views.invoices, name='invoices'),
 path('products',views.products, name='products'),
 path('clients',views.clients, name='clients'),
+path('clients/import',views.importRecords, name='import-records'),
+path('clients/import/errors/<str:name>',views.importErrorReport, name='import-error-report'),
+path('clients/autocomplete',views.clientAutocomplete, name='client-autocomplete'),
+path('search',views.search, name='search'),
 
 #Create URL Paths
 path('invoices/create',views.createInvoice, name='create-invoice'),
 path('invoices/create-build/<slug:slug>',views.createBuildInvoice, name='create-build-invoice'),
+path('invoices/<slug:slug>/lines',views.invoiceLines, name='invoice-lines'),
 
 #Delete an invoice
 path('invoices/delete/<slug:slug>',views.deleteInvoice, name='delete-invoice'),
 
 #PDF and EMAIL Paths
 path('invoices/view-pdf/<slug:slug>',views.viewPDFInvoice, name='view-pdf-invoice'),
-path('invoices/view-document/<slug:slug>',views.viewDocumentInvoice, name='view-document-invoice'),
-path('invoices/email-document/<slug:slug>',views.emailDocumentInvoice, name='email-document-invoice'),
+path('invoices/view-document/<slug:slug>',document_view, name='view-document-invoice'),
+path('invoices/email-document/<slug:slug>',email_view, name='email-document-invoice'),
+path('invoices/view-document-async/<slug:slug>',views.viewDocumentInvoiceAsync, name='view-document-invoice-async'),
+path('invoices/email-document-async/<slug:slug>',views.emailDocumentInvoiceAsync, name='email-document-invoice-async'),
+path('invoices/export.zip',views.exportInvoicesZip, name='export-invoices-zip'),
+path('invoices/export.csv',views.exportInvoices, {'fmt': 'csv'}, name='export-invoices-csv'),
+path('invoices/export.jsonl',views.exportInvoices, {'fmt': 'jsonl'}, name='export-invoices-jsonl'),
+
+#JSON API
+path('api/v1/invoices',api.invoiceList, name='api-invoices'),
+path('api/v1/invoices/<slug:slug>',api.invoiceDetail, name='api-invoice'),
+path('api/v1/clients',api.clientList, name='api-clients'),
+path('api/v1/clients/<slug:slug>',api.clientDetail, name='api-client'),
+path('api/v1/products',api.productList, name='api-products'),
+path('api/v1/products/<slug:slug>',api.productDetail, name='api-product'),
+
+#Prometheus metrics (see invoice/metrics.py)
+path('metrics',metrics.metricsEndpoint, name='metrics'),
 
 #Company Settings Page
 path('company/settings',views.companySettings, name='company-settings'),
@@ -8,39 +8,36 @@ from .models import *
 from .functions import *
 
 from django.contrib.auth.models import User, auth
+from asgiref.sync import sync_to_async
 from random import randint
-from uuid import uuid4
 
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.core.exceptions import ValidationError
 
-import pdfkit
-from django.template.loader import get_template
+from django.template.loader import get_template, render_to_string
+from django.views.decorators.http import require_POST
+import json
 import os
-import shutil
-import platform
 
-
-# --- helper: find wkhtmltopdf executable (cross-platform) ---
-def find_wkhtmltopdf():
-    # 1) explicit setting in settings.py
-    cmd_from_settings = getattr(django_settings, "WKHTMLTOPDF_CMD", None)
-    if cmd_from_settings:
-        if os.path.exists(cmd_from_settings):
-            return cmd_from_settings
-
-    # 2) look on PATH
-    wk = shutil.which("wkhtmltopdf")
-    if wk:
-        return wk
-
-    # 3) common windows default
-    if platform.system() == "Windows":
-        common = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-        if os.path.exists(common):
-            return common
-
-    # not found
-    return None
+from .api import PRODUCTS
+from .autocomplete import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, ClientPickerForm, autocomplete_timeout, client_suggestions
+from .company import company_settings
+from .documents import PDF_OPTIONS, document_context, get_settings_for_invoice, save_client_invoice
+from .exports import export_columns, iter_invoice_rows, iter_invoice_zip
+from .filters import filter_invoices
+from .imports import COLUMNS as IMPORT_COLUMNS, error_report_owner, error_report_path, import_records, new_error_report
+from .lines import LineItemError, apply_line_operations
+from .pagination import InvalidCursor, KeysetPaginator, approximate_count
+from .pdf import PDFRenderError
+from .pdf_cache import get_pdf_cache, pdf_fingerprint
+from .renderers import get_renderer
+from .search import search as search_documents
+from .sequences import create_invoice
+from .stats import dashboard_stats
 
 
 #Anonymous required
@@ -92,22 +89,102 @@ def login(request):
 
 @login_required
 def dashboard(request):
-    clients = Client.objects.all().count()
-    invoices = Invoice.objects.all().count()
-    paidInvoices = Invoice.objects.filter(status='PAID').count()
+    # Counters maintained on write (invoice/stats.py); one small read regardless of data volume
+    stats = dashboard_stats()
 
     context = {
-        'clients': clients,
-        'invoices': invoices,
-        'paidInvoices': paidInvoices,
+        'clients': stats['clients'],
+        'invoices': stats['invoices'],
+        'paidInvoices': stats['paid'],
+        'unpaidInvoices': stats['outstanding'],
+        'overdueInvoices': stats['overdue'],
+        'currencyStats': stats['by_currency'],
     }
     return render(request, 'invoice/dashboard.html', context)
 
 
+# Columns the invoice table shows (plus the keyset ordering columns)
+INVOICE_LIST_FIELDS = ('number', 'title', 'dueDate', 'status', 'slug', 'date_created',
+                       'client', 'client__clientName', 'client__phoneNumber')
+
+
 @login_required
 def invoices(request):
-    invoices = Invoice.objects.all()
-    return render(request, 'invoice/invoices.html', {'invoices': invoices})
+    filters = {
+        'status': request.GET.get('status') or '',
+        'client': request.GET.get('client') or '',
+        'due_from': request.GET.get('due_from') or '',
+        'due_to': request.GET.get('due_to') or '',
+    }
+    try:
+        invoices = filter_invoices(**{key: value or None for key, value in filters.items()})
+    except ValidationError:
+        messages.error(request, 'Invalid due date filter')
+        filters['due_from'] = filters['due_to'] = ''
+        invoices = filter_invoices(status=filters['status'] or None, client=filters['client'] or None)
+
+    paginator = KeysetPaginator(invoices.select_related('client').only(*INVOICE_LIST_FIELDS), per_page=50)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page = paginator.page()
+    total, total_exact = approximate_count(invoices)
+
+    context = {
+        'invoices': page,
+        'page': page,
+        'total': total,
+        'total_exact': total_exact,
+        'filters': filters,
+        'filter_query': urlencode({key: value for key, value in filters.items() if value}),
+        'statuses': [value for value, _label in Invoice.STATUS],
+        # the filter's client box is an autocomplete; only the chosen client's name is looked up
+        'client_name': _client_name(filters['client']),
+    }
+    return render(request, 'invoice/invoices.html', context)
+
+
+# --- helper: the name shown for a client filter given as id or slug ---
+def _client_name(client):
+    if not client:
+        return ''
+    lookup = {'pk': int(client)} if client.isdigit() else {'slug': client}
+    return Client.objects.filter(**lookup).values_list('clientName', flat=True).first() or ''
+
+
+SEARCH_PER_PAGE = 20
+
+
+@login_required
+def search(request):
+    query = (request.GET.get('q') or '').strip()[:200]
+    kind = request.GET.get('kind') or None
+    if kind not in dict(SearchDocument.KINDS):
+        kind = None
+    try:
+        page = max(1, int(request.GET.get('page') or 1))
+    except ValueError:
+        page = 1
+
+    # one row past the page tells whether there is a next one
+    results = search_documents(query, kind=kind, limit=SEARCH_PER_PAGE + 1, offset=(page - 1) * SEARCH_PER_PAGE)
+    has_next = len(results) > SEARCH_PER_PAGE
+    results = results[:SEARCH_PER_PAGE]
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'query': query, 'page': page, 'has_next': has_next,
+                             'results': [dict(result, rank=float(result['rank'])) for result in results]})
+
+    context = {
+        'query': query,
+        'kind': kind or '',
+        'kinds': [value for value, _label in SearchDocument.KINDS],
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+        'search_query': urlencode({key: value for key, value in (('q', query), ('kind', kind)) if value}),
+    }
+    return render(request, 'invoice/search.html', context)
 
 
 @login_required
@@ -139,6 +216,61 @@ def clients(request):
     return render(request, 'invoice/clients.html', context)
 
 
+@login_required
+def importRecords(request):
+    kind = request.POST.get('kind') or 'clients'
+    upload = request.FILES.get('file')
+    back = 'products' if kind == 'products' else 'clients'
+    if request.method != 'POST' or upload is None or kind not in IMPORT_COLUMNS:
+        messages.error(request, 'Choose a CSV or XLSX file to import')
+        return redirect(back)
+
+    dry_run = bool(request.POST.get('dry_run'))
+    report_name = new_error_report(kind, request.user.pk)
+    report_path = error_report_path(report_name)
+    try:
+        with open(report_path, 'w', newline='', encoding='utf-8') as report:
+            result = import_records(upload, upload.name, kind, dry_run=dry_run, error_report=report)
+    except ValueError as e:
+        os.remove(report_path)
+        messages.error(request, str(e))
+        return redirect(back)
+
+    verb = 'Checked' if dry_run else 'Imported'
+    messages.success(request, '{} {} of {} rows in {:.1f}s ({:,.0f} rows/s)'.format(
+        verb, result.created, result.rows, result.seconds, result.rows_per_second))
+    if result.errors:
+        report_url = reverse('import-error-report', args=[report_name])
+        messages.warning(request, '{} rows were rejected; see {}'.format(result.errors, report_url))
+    else:
+        os.remove(report_path)
+    return redirect(back)
+
+
+@login_required
+def importErrorReport(request, name):
+    # only the user who uploaded the file gets its rejected rows
+    if error_report_owner(name) != request.user.pk:
+        raise Http404
+    try:
+        report = open(error_report_path(name), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(report, as_attachment=True, filename=name, content_type='text/csv')
+
+
+@login_required
+def clientAutocomplete(request):
+    try:
+        limit = min(max(int(request.GET.get('limit') or AUTOCOMPLETE_LIMIT), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    response = JsonResponse({'results': client_suggestions(request.GET.get('q', ''), limit)})
+    # lets the browser reuse a list while the user types back and forth
+    response['Cache-Control'] = 'private, max-age={}'.format(autocomplete_timeout())
+    return response
+
+
 @login_required
 def logout(request):
     auth.logout(request)
@@ -149,13 +281,9 @@ def logout(request):
 
 @login_required
 def createInvoice(request):
-    # create a blank invoice ....
-    number = 'INV-' + str(uuid4()).split('-')[1]
-    newInvoice = Invoice.objects.create(number=number)
-    newInvoice.save()
-
-    inv = Invoice.objects.get(number=number)
-    return redirect('create-build-invoice', slug=inv.slug)
+    # create a blank invoice with the next sequential number; save() sets the slug before the insert
+    newInvoice = create_invoice()
+    return redirect('create-build-invoice', slug=newInvoice.slug)
 
 
 def createBuildInvoice(request, slug):
@@ -168,14 +296,14 @@ def createBuildInvoice(request, slug):
     if request.method == 'GET':
         prod_form = ProductForm()
         inv_form = InvoiceForm(instance=invoice)
-        client_form = ClientSelectForm(initial_client=invoice.client)
+        client_form = ClientPickerForm(instance=invoice)
         context.update({'prod_form': prod_form, 'inv_form': inv_form, 'client_form': client_form})
         return render(request, 'invoice/create-invoice.html', context)
 
     if request.method == 'POST':
         prod_form = ProductForm(request.POST)
         inv_form = InvoiceForm(request.POST, instance=invoice)
-        client_form = ClientSelectForm(request.POST, initial_client=invoice.client, instance=invoice)
+        client_form = ClientPickerForm(request.POST, instance=invoice)
 
         if prod_form.is_valid():
             obj = prod_form.save(commit=False)
@@ -199,22 +327,36 @@ def createBuildInvoice(request, slug):
     return render(request, 'invoice/create-invoice.html', context)
 
 
-# --- helper: get settings for an invoice (dynamic) ---
-def get_settings_for_invoice(invoice):
+@login_required
+@require_POST
+def invoiceLines(request, slug):
     """
-    Attempt to find Settings linked to invoice.client.
-    Fall back to first Settings row, then None.
+    Apply a batch of line item changes, sent as JSON:
+    {"add": [{title, description, quantity, price, currency}, ...],
+     "update": [{"slug": ..., <fields to change>}, ...], "delete": [slug, ...]}.
+    Answers with the invoice totals, the lines, and the rows of the build
+    page's line item table to swap in.
     """
-    if invoice and hasattr(invoice, 'client') and invoice.client:
-        # Use companyName field on Settings model instead of clientName
-        client_field = getattr(invoice.client, 'companyName', None)  # <-- adjust if Client model uses companyName
-        if client_field:
-            p_settings = Settings.objects.filter(companyName=client_field).first()  # <-- updated here
-            if p_settings:
-                return p_settings
+    invoice = get_object_or_404(Invoice, slug=slug)
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('Expected a JSON object')
+        operations = {key: payload.get(key) or [] for key in ('add', 'update', 'delete')}
+        if not all(isinstance(value, list) for value in operations.values()):
+            raise ValueError('add, update and delete must be lists')
+        products = apply_line_operations(invoice, **operations)
+    except LineItemError as e:
+        return JsonResponse({'errors': e.errors}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'invoice': {name: getattr(invoice, name) for name in ('slug', 'subtotal', 'total', 'currency', 'line_count')},
+        'lines': [PRODUCTS.serialize(product, PRODUCTS.fields) for product in products],
+        'html': render_to_string('partials/line-items.html', {'invoice': invoice, 'products': products}, request),
+    })
 
-    # fallback to first settings row
-    return Settings.objects.first()
 
 def viewPDFInvoice(request, slug):
     invoice = get_object_or_404(Invoice, slug=slug)
@@ -226,29 +368,20 @@ def viewPDFInvoice(request, slug):
         messages.error(request, "Company settings not found. Please add settings in admin.")
         return redirect('invoices')
 
-    # Calculate the Invoice Total
-    invoiceCurrency = ''
-    invoiceTotal = 0.0
-    for x in products:
-        y = float(x.quantity) * float(x.price)
-        invoiceTotal += y
-        if getattr(x, 'currency', None):
-            invoiceCurrency = x.currency
-
     context = {
         'invoice': invoice,
         'products': products,
         'p_settings': p_settings,
-        'invoiceTotal': "{:.2f}".format(invoiceTotal),
-        'invoiceCurrency': invoiceCurrency,
+        'invoiceTotal': "{:.2f}".format(invoice.total),
+        'invoiceCurrency': invoice.currency or '',
     }
 
     return render(request, 'invoice/invoice-template.html', context)
 
 
 def viewDocumentInvoice(request, slug):
-    invoice = get_object_or_404(Invoice, slug=slug)
-    products = Product.objects.filter(invoice=invoice)
+    invoice = get_object_or_404(Invoice.objects.select_related('client'), slug=slug)
+    products = list(Product.objects.filter(invoice=invoice))
 
     # Get Client Settings dynamically
     p_settings = get_settings_for_invoice(invoice)
@@ -256,59 +389,82 @@ def viewDocumentInvoice(request, slug):
         messages.error(request, "Company settings not found. Please add settings in admin.")
         return redirect('invoices')
 
-    # Calculate the Invoice Total
-    invoiceTotal = sum(float(x.quantity) * float(x.price) for x in products)
+    renderer = get_renderer()
 
-    context = {
-        'invoice': invoice,
-        'products': products,
-        'p_settings': p_settings,
-        'invoiceTotal': "{:.2f}".format(invoiceTotal),
-    }
+    # Repeat views of an unchanged invoice are answered from the fingerprint alone
+    fingerprint = pdf_fingerprint(invoice, products, p_settings, renderer.version())
+    etag = '"{}"'.format(fingerprint)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
 
     # The name of your PDF file
     filename = '{}.pdf'.format(invoice.uniqueId)
 
-    # HTML file to be converted to PDF - inside your Django directory
-    template = get_template('invoice/pdf-template.html')
+    pdf_cache = get_pdf_cache()
+    file_content = pdf_cache.get(invoice, fingerprint)
+    if file_content is None:
+        context = document_context(invoice, products, p_settings)
 
-    # Render the HTML
-    html = template.render(context)
+        # Render with the configured engine (INVOICE_PDF_RENDERER)
+        try:
+            file_content = renderer.render(context, PDF_OPTIONS)
+        except PDFRenderError as e:
+            messages.error(request, f"PDF generation error: {e}")
+            return redirect('invoices')
 
-    # Options - Very Important
-    options = {
-        'encoding': 'UTF-8',
-        'javascript-delay': '10',
-        'enable-local-file-access': None,
-        'page-size': 'A4',
-        'custom-header': [('Accept-Encoding', 'gzip')],
-    }
+        pdf_cache.put(invoice, fingerprint, file_content)
 
-    wk_path = find_wkhtmltopdf()
-    if not wk_path:
-        messages.error(request,
-            "wkhtmltopdf not found. Install wkhtmltopdf and/or set WKHTMLTOPDF_CMD in settings.py.")
-        return redirect('invoices')
+    response = HttpResponse(file_content, content_type='application/pdf')
+    response['Content-Disposition'] = 'inline; filename={}'.format(filename)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
+
+@login_required
+def exportInvoicesZip(request):
     try:
-        config = pdfkit.configuration(wkhtmltopdf=wk_path)
-    except Exception as e:
-        messages.error(request, f"Error configuring PDF generator: {e}")
-        return redirect('invoices')
+        invoices = filter_invoices(
+            status=request.GET.getlist('status'),
+            due_from=request.GET.get('due_from'),
+            due_to=request.GET.get('due_to'),
+            client=request.GET.get('client'),
+        )
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    except ValidationError:
+        return HttpResponse('Dates must be given as YYYY-MM-DD', status=400, content_type='text/plain')
+
+    response = StreamingHttpResponse(iter_invoice_zip(invoices), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename=invoices-{}.zip'.format(timezone.now().strftime('%Y%m%d'))
+    return response
 
-    # IF you have CSS to add to template
-    css1 = os.path.join(django_settings.CSS_LOCATION, 'assets', 'css', 'bootstrap.min.css')
-    css2 = os.path.join(django_settings.CSS_LOCATION, 'assets', 'css', 'dashboard.css')
 
-    # Create the file (in-memory)
-    try:
-        file_content = pdfkit.from_string(html, False, configuration=config, options=options)
-    except Exception as e:
-        messages.error(request, f"PDF generation error: {e}")
-        return redirect('invoices')
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
 
-    response = HttpResponse(file_content, content_type='application/pdf')
-    response['Content-Disposition'] = 'inline; filename={}'.format(filename)
+
+@login_required
+def exportInvoices(request, fmt):
+    try:
+        columns = export_columns(','.join(request.GET.getlist('columns')))
+        invoices = filter_invoices(
+            status=request.GET.getlist('status'),
+            due_from=request.GET.get('due_from'),
+            due_to=request.GET.get('due_to'),
+            created_from=request.GET.get('created_from'),
+            created_to=request.GET.get('created_to'),
+            client=request.GET.get('client'),
+        )
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    except ValidationError:
+        return HttpResponse('Dates must be given as YYYY-MM-DD', status=400, content_type='text/plain')
+
+    response = StreamingHttpResponse(iter_invoice_rows(invoices, columns, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = 'attachment; filename=invoices-{}.{}'.format(timezone.now().strftime('%Y%m%d'), fmt)
+    # keep proxies (nginx) from holding the stream back until it is complete
+    response['X-Accel-Buffering'] = 'no'
     return response
 
 
@@ -322,60 +478,108 @@ def emailDocumentInvoice(request, slug):
         messages.error(request, "Company settings not found. Please add settings in admin.")
         return redirect('invoices')
 
-    invoiceTotal = sum(float(x.quantity) * float(x.price) for x in products)
+    context = document_context(invoice, products, p_settings)
 
-    context = {
-        'invoice': invoice,
-        'products': products,
-        'p_settings': p_settings,
-        'invoiceTotal': "{:.2f}".format(invoiceTotal),
-    }
+    # Save PDF
+    try:
+        file_content = get_renderer().render(context, PDF_OPTIONS)
+    except PDFRenderError as e:
+        messages.error(request, f"PDF save error: {e}")
+        return redirect('invoices')
 
-    filename = '{}.pdf'.format(invoice.uniqueId)
-    template = get_template('invoice/pdf-template.html')
-    html = template.render(context)
-
-    options = {
-        'encoding': 'UTF-8',
-        'javascript-delay': '1000',
-        'enable-local-file-access': None,
-        'page-size': 'A4',
-        'custom-header': [('Accept-Encoding', 'gzip')],
-    }
+    pdf_save_path = save_client_invoice(invoice, file_content)
 
-    wk_path = find_wkhtmltopdf()
-    if not wk_path:
-        messages.error(request,
-            "wkhtmltopdf not found. Install wkhtmltopdf and/or set WKHTMLTOPDF_CMD in settings.py.")
-        return redirect('invoices')
+    # queue the email for the worker; status flips to EMAIL_SENT once it is delivered
+    to_email = invoice.client.emailAddress if getattr(invoice.client, 'emailAddress', None) else None
+    from_client = p_settings.companyName if getattr(p_settings, 'companyName', None) else None
+    if not to_email:
+        messages.error(request, "This invoice's client has no email address")
+        return redirect('create-build-invoice', slug=slug)
 
-    try:
-        config = pdfkit.configuration(wkhtmltopdf=wk_path)
-    except Exception as e:
-        messages.error(request, f"Error configuring PDF generator: {e}")
-        return redirect('invoices')
+    queueInvoiceEmail(invoice, to_email, from_client, pdf_save_path)
 
-    # Save PDF
-    filepath = os.path.join(django_settings.MEDIA_ROOT, 'client_invoices')
-    os.makedirs(filepath, exist_ok=True)
-    pdf_save_path = os.path.join(filepath, filename)
+    messages.success(request, "Email queued for delivery to the client")
+    return redirect('create-build-invoice', slug=slug)
 
-    try:
-        pdfkit.from_string(html, pdf_save_path, configuration=config, options=options)
-    except Exception as e:
-        messages.error(request, f"PDF save error: {e}")
+
+###--------------------------- Async PDF and email views (for ASGI, see invoicing/asgi.py) ------------------ ###
+
+def _load_document(slug, renderer):
+    """
+    The invoice, its company settings, render context and PDF fingerprint,
+    for the async views. Built here on the sync thread because the context
+    and fingerprint read p_settings.bank_accounts, which is a query unless
+    the settings came from the prefetching company cache.
+    """
+    invoice = get_object_or_404(Invoice.objects.select_related('client'), slug=slug)
+    products = list(Product.objects.filter(invoice=invoice))
+    p_settings = get_settings_for_invoice(invoice)
+    if not p_settings:
+        return invoice, None, None, None
+    context = document_context(invoice, products, p_settings)
+    return invoice, p_settings, context, pdf_fingerprint(invoice, products, p_settings, renderer.version())
+
+
+async def viewDocumentInvoiceAsync(request, slug):
+    """
+    viewDocumentInvoice for ASGI: the database work runs on the sync
+    thread and wkhtmltopdf as an asyncio subprocess, so the worker's event
+    loop keeps serving other requests during the render.
+    """
+    renderer = get_renderer()
+    invoice, p_settings, context, fingerprint = await sync_to_async(_load_document)(slug, renderer)
+    if not p_settings:
+        await sync_to_async(messages.error)(request, "Company settings not found. Please add settings in admin.")
         return redirect('invoices')
 
-    # send the emails to client
+    etag = '"{}"'.format(fingerprint)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    pdf_cache = get_pdf_cache()
+    file_content = await sync_to_async(pdf_cache.get, thread_sensitive=False)(invoice, fingerprint)
+    if file_content is None:
+        try:
+            file_content = await renderer.render_async(context, PDF_OPTIONS)
+        except PDFRenderError as e:
+            await sync_to_async(messages.error)(request, f"PDF generation error: {e}")
+            return redirect('invoices')
+        await sync_to_async(pdf_cache.put, thread_sensitive=False)(invoice, fingerprint, file_content)
+
+    response = HttpResponse(file_content, content_type='application/pdf')
+    response['Content-Disposition'] = 'inline; filename={}.pdf'.format(invoice.uniqueId)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def emailDocumentInvoiceAsync(request, slug):
+    """
+    emailDocumentInvoice for ASGI. The PDF is rendered as in
+    viewDocumentInvoiceAsync; the email goes through the outbound queue
+    (send_queued_emails), so no SMTP conversation holds up the request.
+    """
+    renderer = get_renderer()
+    invoice, p_settings, context, _fingerprint = await sync_to_async(_load_document)(slug, renderer)
+    if not p_settings:
+        await sync_to_async(messages.error)(request, "Company settings not found. Please add settings in admin.")
+        return redirect('invoices')
     to_email = invoice.client.emailAddress if getattr(invoice.client, 'emailAddress', None) else None
-    from_client = p_settings.clientName if getattr(p_settings, 'clientName', None) else None
-    if to_email:
-        emailInvoiceClient(to_email, from_client, pdf_save_path)
+    from_client = p_settings.companyName if getattr(p_settings, 'companyName', None) else None
+    if not to_email:
+        await sync_to_async(messages.error)(request, "This invoice's client has no email address")
+        return redirect('create-build-invoice', slug=slug)
 
-    invoice.status = 'EMAIL_SENT'
-    invoice.save()
+    try:
+        file_content = await renderer.render_async(context, PDF_OPTIONS)
+    except PDFRenderError as e:
+        await sync_to_async(messages.error)(request, f"PDF save error: {e}")
+        return redirect('invoices')
 
-    messages.success(request, "Email sent to the client succesfully")
+    pdf_save_path = await sync_to_async(save_client_invoice, thread_sensitive=False)(invoice, file_content)
+    await sync_to_async(queueInvoiceEmail)(invoice, to_email, from_client, pdf_save_path)
+    await sync_to_async(messages.success)(request, "Email queued for delivery to the client")
     return redirect('create-build-invoice', slug=slug)
 
 
@@ -391,7 +595,7 @@ def deleteInvoice(request, slug):
 
 def companySettings(request):
     # return the primary settings (first) or redirect with message
-    company = Settings.objects.first()
+    company = company_settings.first()
     if not company:
         messages.error(request, "No company settings found. Please add one in admin.")
         return redirect('dashboard')
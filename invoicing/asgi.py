@@ -5,12 +5,79 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+
+Run with e.g. ``uvicorn invoicing.asgi:application --workers 2`` and
+INVOICE_ASYNC_PDF_VIEWS=1, so the PDF and email invoice links use the
+async views (invoice/views.py).
 """
 
+import asyncio
+import logging
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoicing.settings')
 
-application = get_asgi_application()
+logger = logging.getLogger(__name__)
+
+
+class DisconnectCancellation:
+    """
+    Cancels a request's handling when its client disconnects.
+
+    Django 3.2 stops listening to the client once it has read the request
+    body, so an abandoned PDF render would run to completion. This keeps
+    listening and cancels the request's task on ``http.disconnect``; an
+    async view is interrupted at its current await (render_pdf_async then
+    kills the converter). Sync views run in a thread and still finish.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def app_receive():
+            if body_read.is_set():
+                # from here on the watcher owns the real receive()
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body'):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        handler = asyncio.ensure_future(self.app(scope, app_receive, send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done():
+                handler.cancel()
+                logger.info("client disconnected, cancelled %s %s", scope.get('method'), scope.get('path'))
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    pass
+            else:
+                handler.result()
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+
+
+application = DisconnectCancellation(get_asgi_application())
@@ -0,0 +1,151 @@
+"""
+PostgreSQL backend with connection health checks and an optional
+in-process connection pool.
+
+ENGINE = 'invoicing.db.postgresql'. Extra keys in the DATABASES entry:
+
+    HEALTH_CHECKS  ping a reused connection once per request, before its first query;
+                   with a pool, when it is checked out (default True)
+    POOL           {'max_size': 10, 'timeout': 10, 'max_lifetime': 1800}, or None for no pool
+
+With a pool, Django's close() at the end of a request hands the connection
+back instead of closing it, so gunicorn threads reuse a bounded set of
+server connections rather than opening one per request. Keep CONN_MAX_AGE
+at 0 with a pool; the pool decides how long a connection lives.
+"""
+
+import queue
+import threading
+import time
+
+import psycopg2
+import psycopg2.extras
+from django.db import OperationalError
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, timeout=10, max_lifetime=1800, health_checks=True):
+        self.connect = connect
+        self.health_checks = health_checks
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.born = {}
+
+    def _usable(self, conn):
+        if conn.closed or time.monotonic() - self.born.get(id(conn), 0) > self.max_lifetime:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self.born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(f'connection pool exhausted (waited {self.timeout}s)')
+        try:
+            while True:
+                try:
+                    conn = self.idle.get_nowait()
+                except queue.Empty:
+                    conn = self.connect()
+                    self.born[id(conn)] = time.monotonic()
+                    return conn
+                if self._usable(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self.idle.put(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            self.slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def _pool(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        with _pools_lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                pool = _pools[self.alias] = ConnectionPool(
+                    lambda: psycopg2.connect(**conn_params),
+                    health_checks=self.settings_dict.get('HEALTH_CHECKS', True), **options)
+            return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        # the same session setup as the stock backend, on a pooled connection
+        connection = pool.get()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        pool = _pools.get(self.alias) if self.settings_dict.get('POOL') else None
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
+
+    # Django 3.2 has no CONN_HEALTH_CHECKS; as in 4.1, a reused connection is pinged once per
+    # request, before its first query, rather than at both the start and the end of the request
+    health_check_done = False
+
+    def connect(self):
+        super().connect()
+        # new, or checked out of the pool (which pings it): nothing left to check this request
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        after_error = self.connection is not None and self.errors_occurred
+        super().close_if_unusable_or_obsolete()
+        # after an error the connection was just pinged (and kept only if it answered)
+        self.health_check_done = after_error and self.connection is not None
+
+    def close_if_health_check_failed(self):
+        if self.connection is None or self.health_check_done:
+            return
+        self.health_check_done = True
+        if self.settings_dict.get('HEALTH_CHECKS', True) and not self.in_atomic_block and not self.is_usable():
+            self.close()
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
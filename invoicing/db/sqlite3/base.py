@@ -0,0 +1,35 @@
+"""
+SQLite backend tuned for a single-node install.
+
+ENGINE = 'invoicing.db.sqlite3'. Every new connection gets the PRAGMAs
+below (override them with a PRAGMAS dict in the DATABASES entry):
+- WAL, so readers no longer block the writer or each other;
+- synchronous=NORMAL, which is durable in WAL mode except for the last
+  transactions on power loss;
+- a memory-mapped read path;
+- a busy timeout, so a writer waits for the lock instead of failing at once.
+"""
+
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+    'cache_size': -64000,  # KiB
+}
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict.get('PRAGMAS', {})}
+        if self.is_in_memory_db():
+            pragmas.pop('journal_mode', None)
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
@@ -0,0 +1,39 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs natively under ASGI.
+
+    WhiteNoise 6.6 is sync-only, and Django runs a sync middleware, and
+    everything beneath it, through the one thread it keeps for sync code:
+    under ASGI that would put every request, async views included, in a
+    single queue. Requests that aren't for static files are passed straight
+    on; static files are still served by WhiteNoise, in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self._async_mode = asyncio.iscoroutinefunction(get_response)
+        if self._async_mode:
+            # tells Django this middleware returns a coroutine (as MiddlewareMixin does)
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self._async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)